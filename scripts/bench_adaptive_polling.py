@@ -0,0 +1,122 @@
+"""Benchmark: fixed-interval vs. ETA-driven (adaptive) task polling
+
+Runs --waves waves of --jobs video jobs on one token against a fake Sora
+client whose jobs take 60-240 simulated seconds and report linear progress
+(or none with --no-progress, so only the learned completion times guide
+polling). Time is compressed by --speedup. Reports upstream GETs per
+completed job and how late completion was noticed, for a fixed
+poll_interval (the previous behaviour) and for AdaptivePollSchedule.
+
+Usage:
+    python scripts/bench_adaptive_polling.py [--jobs 10] [--waves 3] [--speedup 100] [--no-progress]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.services.poll_schedule import AdaptivePollSchedule
+from src.services.poll_scheduler import PollScheduler
+from src.services.upstream_poller import UpstreamPoller
+
+POLL_INTERVAL = 2.5
+MAX_INTERVAL = 30
+
+
+class FakeSoraClient:
+    """Jobs are pending (with linear progress) until their duration has passed"""
+
+    def __init__(self, report_progress: bool):
+        self.report_progress = report_progress
+        self.jobs = {}
+        self.calls = Counter()
+
+    def add(self, task_id: str, duration: float):
+        self.jobs[task_id] = (time.monotonic(), duration)
+
+    def _progress(self, task_id: str) -> float:
+        started, duration = self.jobs[task_id]
+        return (time.monotonic() - started) / duration
+
+    async def get_pending_tasks(self, token, token_id=None):
+        self.calls["pending"] += 1
+        return [
+            {"id": task_id, "progress_pct": min(self._progress(task_id), 0.99) if self.report_progress else None}
+            for task_id in self.jobs if self._progress(task_id) < 1
+        ]
+
+    async def get_video_drafts(self, token, limit=15, token_id=None):
+        self.calls["drafts"] += 1
+        return {"items": [
+            {"task_id": task_id, "url": f"https://cdn.invalid/{task_id}.mp4"}
+            for task_id in self.jobs if self._progress(task_id) >= 1
+        ]}
+
+    async def get_image_tasks(self, token, limit=20, token_id=None):
+        self.calls["recent_tasks"] += 1
+        return {"task_responses": []}
+
+
+async def run(label: str, schedule: AdaptivePollSchedule, durations, report_progress: bool, speedup: float):
+    client = FakeSoraClient(report_progress)
+    # Wheel resolution compressed like the rest of the timeline
+    poller = UpstreamPoller(client, schedule, PollScheduler(resolution=0.05 / speedup))
+    lateness = []
+
+    async def job(task_id: str, duration: float, start_delay: float):
+        # Staggered starts, so jobs do not all share the same ticks
+        await asyncio.sleep(start_delay)
+        client.add(task_id, duration)
+        done_at = time.monotonic() + duration
+        watch = poller.watch("tok", 1, task_id, is_video=True, model="sora2-video")
+        try:
+            while True:
+                update = await watch.next_update()
+                if any(i["task_id"] == task_id for i in (update.drafts or {}).get("items", [])):
+                    lateness.append((time.monotonic() - done_at) * speedup)
+                    return
+        finally:
+            watch.close()
+
+    try:
+        for wave, wave_durations in enumerate(durations):
+            await asyncio.gather(*(job(f"task_{wave}_{i}", d, i * 3 / speedup)
+                                   for i, d in enumerate(wave_durations)))
+    finally:
+        await poller.stop()
+
+    jobs = sum(len(w) for w in durations)
+    total = sum(client.calls.values())
+    lateness.sort()
+    print(f"  {label:<9} upstream GETs {total:>5}   per job {total / jobs:>5.1f}   "
+          f"detection delay p50 {statistics.median(lateness):>5.1f}s  "
+          f"p95 {lateness[int(len(lateness) * 0.95) - 1]:>5.1f}s (simulated)")
+
+
+async def main(jobs: int, waves: int, speedup: float, report_progress: bool):
+    random.seed(11)
+    durations = [[random.uniform(60, 240) / speedup for _ in range(jobs)] for _ in range(waves)]
+    scale = 1 / speedup
+    print(f"{waves} waves x {jobs} video jobs on one token, 60-240s each, "
+          f"progress {'reported' if report_progress else 'not reported'}, speedup {speedup:g}x")
+    fixed = AdaptivePollSchedule(min_interval=POLL_INTERVAL * scale, max_interval=POLL_INTERVAL * scale, jitter=0)
+    await run("fixed", fixed, durations, report_progress, speedup)
+    adaptive = AdaptivePollSchedule(min_interval=POLL_INTERVAL * scale, max_interval=MAX_INTERVAL * scale)
+    await run("adaptive", adaptive, durations, report_progress, speedup)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--speedup", type=float, default=100)
+    parser.add_argument("--no-progress", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.jobs, args.waves, args.speedup, not args.no_progress))
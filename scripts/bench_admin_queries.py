@@ -0,0 +1,109 @@
+"""Benchmark: /api/tokens and /api/stats, per-token queries vs. set-based joins
+
+Seeds temporary databases with an increasing number of tokens and times the
+admin handlers. The "per-token" column reproduces the previous behaviour
+(one get_token_stats query per token); the "joined" column calls the route
+handlers, which pair registry tokens with one token_stats scan (a single
+LEFT JOIN when the registry is not loaded) and use a single SUM aggregate.
+
+Usage:
+    python scripts/bench_admin_queries.py [--sizes 100,1000,5000,20000] [--repeat 3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.api import admin
+from src.core.database import Database
+from src.services.token_manager import TokenManager
+
+
+async def seed(db: Database, count: int):
+    expiry = datetime.now() + timedelta(days=30)
+    async with db._write() as conn:
+        await conn.executemany("""
+            INSERT INTO tokens (token, email, username, name, expiry_time, is_active)
+            VALUES (?, ?, '', ?, ?, ?)
+        """, [
+            (f"bench-token-{i}", f"bench{i}@example.com", f"bench{i}", expiry, i % 10 != 0)
+            for i in range(count)
+        ])
+        await conn.execute("""
+            INSERT INTO token_stats (token_id, image_count, video_count, error_count,
+                                     today_image_count, today_video_count, today_error_count)
+            SELECT id, id % 7, id % 5, id % 3, id % 2, id % 2, 0 FROM tokens
+        """)
+        await conn.commit()
+
+
+async def per_token_tokens(db: Database) -> int:
+    tokens = await db.get_all_tokens()
+    for token in tokens:
+        await db.get_token_stats(token.id)
+    return len(tokens)
+
+
+async def per_token_stats(db: Database) -> int:
+    tokens = await db.get_all_tokens()
+    total_images = 0
+    for token in tokens:
+        stats = await db.get_token_stats(token.id)
+        if stats:
+            total_images += stats.image_count
+    return total_images
+
+
+async def best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def run_size(count: int, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path=os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        await seed(db, count)
+        token_manager = TokenManager(db)
+        await db.load_token_registry()
+        admin.set_dependencies(token_manager, None, db)
+
+        rows = await admin.get_tokens(token="bench")
+        stats = await admin.get_stats(token="bench")
+        assert len(rows) == count
+        assert stats["total_images"] == await per_token_stats(db)
+
+        result = {
+            "tokens_old": await best_of(repeat, lambda: per_token_tokens(db)),
+            "tokens_new": await best_of(repeat, lambda: admin.get_tokens(token="bench")),
+            "stats_old": await best_of(repeat, lambda: per_token_stats(db)),
+            "stats_new": await best_of(repeat, lambda: admin.get_stats(token="bench")),
+        }
+        await db.close()
+        return result
+
+
+async def main(sizes, repeat: int):
+    print(f"{'tokens':>7}  {'/api/tokens per-token':>22} {'joined':>10}  {'/api/stats per-token':>21} {'SUM':>10}")
+    for count in sizes:
+        r = await run_size(count, repeat)
+        print(f"{count:>7}  {r['tokens_old']:>19.1f} ms {r['tokens_new']:>7.1f} ms  "
+              f"{r['stats_old']:>18.1f} ms {r['stats_new']:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,5000,20000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main([int(s) for s in args.sizes.split(",")], args.repeat))
@@ -0,0 +1,131 @@
+"""Benchmark: warm BrowserPool vs. a fresh browser per sentinel token
+
+Serves a local stub page that defines window.SentinelSDK (loaded after a
+short delay, like the real SDK) and requests tokens concurrently, first by
+launching a new browser per token (the previous behaviour) and then through
+BrowserPool. Requires Playwright with Chromium installed; no network access
+is needed.
+
+Usage:
+    python scripts/bench_browser_pool.py [--requests 20] [--concurrency 4] [--sdk-delay-ms 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from playwright.async_api import async_playwright
+
+from src.services.browser_pool import BrowserPool, SDK_READY_JS, SDK_TOKEN_JS
+
+FLOW = "sora_2_create_task__auto"
+
+STUB_PAGE = """<!DOCTYPE html>
+<html><head><title>sentinel stub</title></head>
+<body>
+<script>
+  setTimeout(function () {
+    window.SentinelSDK = {
+      token: async function (flow, deviceId) {
+        await new Promise(function (r) { setTimeout(r, 20); });
+        return JSON.stringify({p: "gAAAAAstub", t: "stub", c: "stub", id: deviceId, flow: flow});
+      }
+    };
+  }, %d);
+</script>
+</body></html>
+"""
+
+
+def start_stub_server(sdk_delay_ms: int) -> ThreadingHTTPServer:
+    body = (STUB_PAGE % sdk_delay_ms).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Set-Cookie", "oai-did=stub-device-id; Path=/")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def cold_token(url: str) -> str:
+    """Previous behaviour: launch, load, wait for the SDK, get one token, close"""
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, args=["--no-sandbox", "--disable-dev-shm-usage"])
+        try:
+            page = await (await browser.new_context()).new_page()
+            await page.goto(url, wait_until="domcontentloaded")
+            await page.wait_for_function(SDK_READY_JS, polling=500)
+            return await page.evaluate(SDK_TOKEN_JS, [FLOW, "stub-device-id"])
+        finally:
+            await browser.close()
+
+
+async def run(label: str, requests: int, concurrency: int, get_token):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            token = await get_token()
+            latencies.append(time.perf_counter() - start)
+            assert token and json.loads(token)["flow"] == FLOW
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    total = time.perf_counter() - start
+    latencies.sort()
+    print(f"  {label:<6} {requests / total:>7.2f} tokens/s   p50 {statistics.median(latencies) * 1000:>8.1f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:>8.1f} ms")
+
+
+async def main(requests: int, concurrency: int, sdk_delay_ms: int):
+    server = start_stub_server(sdk_delay_ms)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    print(f"stub page {url} (SDK ready after {sdk_delay_ms} ms), {requests} tokens, concurrency {concurrency}")
+    try:
+        await run("cold", requests, concurrency, lambda: cold_token(url))
+
+        pool = BrowserPool(target_url=url, max_contexts=1, max_concurrent_per_context=concurrency,
+                           max_uses=requests * 2, health_check_interval=5)
+        try:
+            await run("pool", requests, concurrency, lambda: pool.get_token(FLOW))
+            stats = pool.get_stats()
+            print(f"  pool contexts created {stats['contexts_created']}, avg warmup {stats['avg_warmup_seconds']}s, "
+                  f"avg wait {stats['avg_wait_ms']} ms, max queued {stats['max_queued']}")
+
+            # Recycling: a tiny use limit forces the context to be replaced
+            pool.max_uses = 3
+            await run("recyc", 10, concurrency, lambda: pool.get_token(FLOW))
+            print(f"  retired {pool.get_stats()['contexts_retired']}")
+        finally:
+            await pool.stop()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--sdk-delay-ms", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.sdk_delay_ms))
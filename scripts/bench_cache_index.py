@@ -0,0 +1,74 @@
+"""Benchmark: directory-scan cache cleanup vs. CacheIndex expiry heap
+
+Creates --files small files in a temporary cache directory, 1% of them past
+their expiry. Times one cleanup pass of the previous FileCache
+(iterdir() + stat() of every file) against CacheIndex.pop_expired(), plus
+the one-off index rebuild done at startup and the cost of recording a new
+file under a byte budget (which evicts least recently used files).
+
+Usage:
+    python scripts/bench_cache_index.py [--files 20000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.services.cache_index import CacheIndex
+
+TTL = 3600
+
+
+def scan_expired(cache_dir: Path) -> list:
+    now = time.time()
+    return [p.name for p in cache_dir.iterdir() if p.is_file() and now - p.stat().st_mtime > TTL]
+
+
+def main(files: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp)
+        now = time.time()
+        for i in range(files):
+            path = cache_dir / f"{i:08x}.mp4"
+            path.write_bytes(b"x" * 1024)
+            if i % 100 == 0:
+                os.utime(path, (now - TTL * 2, now - TTL * 2))
+
+        start = time.perf_counter()
+        expired = scan_expired(cache_dir)
+        scan_ms = (time.perf_counter() - start) * 1000
+
+        index = CacheIndex(max_bytes=files * 1024, ttl=TTL)
+        start = time.perf_counter()
+        index.rebuild(cache_dir)
+        rebuild_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        popped = index.pop_expired()
+        pop_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        again = index.pop_expired()
+        idle_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        evicted = [name for i in range(1000) for name in index.add(f"new{i}.mp4", 10 * 1024)]
+        add_us = (time.perf_counter() - start) * 1e6 / 1000
+
+        print(f"{files} files, {len(expired)} expired")
+        print(f"  directory scan per cleanup      {scan_ms:>9.2f} ms")
+        print(f"  index rebuild (once at startup) {rebuild_ms:>9.2f} ms")
+        print(f"  heap pop of {len(popped):>5} expired        {pop_ms:>9.3f} ms")
+        print(f"  heap pop, nothing expired       {idle_ms:>9.3f} ms ({len(again)} files)")
+        print(f"  add under byte budget           {add_us:>9.2f} us/file ({len(evicted)} LRU evictions)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.files)
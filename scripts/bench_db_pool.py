@@ -0,0 +1,128 @@
+"""Benchmark: per-call SQLite connections vs. the pooled Database layer
+
+Measures per-call latency (p50/p99) and ops/sec for a typical token read
+and a token usage write, sequentially and with concurrent callers.
+
+Usage:
+    python scripts/bench_db_pool.py [--ops 2000] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+import aiosqlite
+
+from src.core.database import Database
+from src.core.models import Token
+from src.services.stats_buffer import TokenStatsDelta
+
+
+class PerCallDatabase:
+    """Baseline that opens a fresh connection per call (the previous behaviour)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    async def get_token(self, token_id: int):
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute("SELECT * FROM tokens WHERE id = ?", (token_id,))
+            row = await cursor.fetchone()
+            return Token(**dict(row)) if row else None
+
+    async def update_token_usage(self, token_id: int):
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                UPDATE tokens
+                SET last_used_at = CURRENT_TIMESTAMP, use_count = use_count + 1
+                WHERE id = ?
+            """, (token_id,))
+            await db.commit()
+
+    async def close(self):
+        pass
+
+
+def pooled_usage_write(db: Database):
+    """A usage write through the pooled layer (a one-token stats delta, as TokenStatsBuffer flushes)"""
+    async def update_token_usage(token_id: int):
+        last_used_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        await db.apply_token_stats_deltas([asdict(TokenStatsDelta(token_id=token_id, use_count=1,
+                                                                  last_used_at=last_used_at))])
+    return update_token_usage
+
+
+async def seed(db: Database, count: int) -> list:
+    ids = []
+    for i in range(count):
+        ids.append(await db.add_token(Token(
+            token=f"bench-token-{i}",
+            email=f"bench{i}@example.com",
+            name=f"bench{i}",
+            expiry_time=datetime.now() + timedelta(days=30),
+        )))
+    return ids
+
+
+async def run_ops(fn, ids: list, ops: int, concurrency: int) -> dict:
+    latencies = []
+    counter = iter(range(ops))
+
+    async def worker():
+        for n in counter:
+            start = time.perf_counter()
+            await fn(ids[n % len(ids)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "ops_per_sec": ops / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def report(label: str, result: dict):
+    print(f"  {label:<32} {result['ops_per_sec']:>10.0f} ops/s   "
+          f"p50 {result['p50_ms']:>7.3f} ms   p99 {result['p99_ms']:>7.3f} ms")
+
+
+async def main(ops: int, concurrency: int, tokens: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        pooled = Database(db_path=db_path)
+        await pooled.init_db()
+        ids = await seed(pooled, tokens)
+        baseline = PerCallDatabase(db_path)
+
+        impls = (("per-call connect", baseline, baseline.update_token_usage),
+                 ("pooled (WAL)", pooled, pooled_usage_write(pooled)))
+        for name, impl, update_token_usage in impls:
+            print(f"\n{name}")
+            for c in (1, concurrency):
+                report(f"get_token x{ops} (c={c})", await run_ops(impl.get_token, ids, ops, c))
+                report(f"update_token_usage x{ops} (c={c})", await run_ops(update_token_usage, ids, ops, c))
+
+        await pooled.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--tokens", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.ops, args.concurrency, args.tokens))
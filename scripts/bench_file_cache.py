@@ -0,0 +1,141 @@
+"""Benchmark: whole-body downloads vs. streamed FileCache downloads
+
+A local stub server returns --size-mb of video bytes per request. Each mode
+runs in its own process so peak RSS is measured separately:
+
+  legacy    the previous download_and_cache: response.content held in
+            memory, then written with a blocking write on the event loop
+  streamed  FileCache.download_and_cache: chunks written to a temp file in
+            a download thread, fsynced and renamed into the cache dir
+
+A ticker on the event loop measures how late 10 ms sleeps wake up (loop
+lag). Whole-body downloads need size x downloads of memory, so the legacy
+run defaults to fewer downloads; compare the per-download figures.
+
+Usage:
+    python scripts/bench_file_cache.py [--downloads 50] [--size-mb 200] [--legacy-downloads 5]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.core.config import config
+
+BLOCK = b"\x00\x00\x00\x18ftypmp42" + os.urandom(1024 * 1024 - 12)
+
+
+def start_stub_server(size: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            view = memoryview(BLOCK)
+            remaining = size
+            try:
+                while remaining > 0:
+                    n = min(remaining, len(BLOCK))
+                    self.wfile.write(view[:n])
+                    remaining -= n
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+async def legacy_download(url: str, cache_dir: str, i: int):
+    from src.services.http_pool import http_pool
+    async with http_pool.session(None) as session:
+        response = await session.get(url, timeout=600, impersonate="chrome")
+        path = os.path.join(cache_dir, f"{i}.mp4")
+        with open(path, "wb") as f:
+            f.write(response.content)
+    await asyncio.to_thread(os.unlink, path)
+
+
+async def run_mode(mode: str, url: str, downloads: int):
+    from src.services.file_cache import FileCache
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = FileCache(cache_dir=cache_dir, default_timeout=600)
+
+        async def streamed(i: int):
+            filename = await cache.download_and_cache(f"{url}?i={i}", "video")
+            await asyncio.to_thread(os.unlink, cache.get_cache_path(filename))
+
+        baseline = rss_mb()
+        tick = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        if mode == "legacy":
+            await asyncio.gather(*(legacy_download(url, cache_dir, i) for i in range(downloads)))
+        else:
+            await asyncio.gather(*(streamed(i) for i in range(downloads)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await tick
+        await cache.stop_cleanup_task()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    grown = max(peak - baseline, 0)
+    print(f"  {mode:<9} {downloads:>3} downloads in {elapsed:>6.1f}s   peak RSS +{grown:>7.0f} MB "
+          f"({grown / downloads:>6.1f} MB/download)   loop lag avg {sum(lags) / len(lags) * 1000:>6.1f} ms, "
+          f"max {max(lags) * 1000:>7.1f} ms", flush=True)
+
+
+def main(args):
+    if args.mode:
+        asyncio.run(run_mode(args.mode, args.url, args.downloads))
+        return
+    size = args.size_mb * 2**20
+    server = start_stub_server(size)
+    url = f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+    print(f"{args.size_mb} MB per download, chunk size {config.cache_download_chunk_size // 1024} KB")
+    try:
+        for mode, downloads in (("legacy", args.legacy_downloads), ("streamed", args.downloads)):
+            if downloads:
+                subprocess.run([sys.executable, __file__, "--mode", mode, "--url", url,
+                                "--downloads", str(downloads)], check=True)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--downloads", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--legacy-downloads", type=int, default=5)
+    parser.add_argument("--mode", choices=("legacy", "streamed"), help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    main(parser.parse_args())
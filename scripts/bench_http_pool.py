@@ -0,0 +1,109 @@
+"""Benchmark: shared HttpSessionPool vs. a new AsyncSession per request
+
+Serves a small JSON body from a local keep-alive HTTP/1.1 stub server and
+issues requests concurrently, first with a fresh AsyncSession per call (the
+previous behaviour) and then through HttpSessionPool. Reports throughput,
+latency and, for the pool, handshakes and the connection-reuse ratio. Also
+checks that Set-Cookie from one response is not sent with the next request.
+
+Usage:
+    python scripts/bench_http_pool.py [--requests 500] [--concurrency 20] [--latency-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from curl_cffi.requests import AsyncSession
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.services.http_pool import HttpSessionPool
+
+BODY = b'{"ok": true}'
+
+
+def start_stub_server(latency_ms: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency_ms / 1000)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(BODY)))
+            self.send_header("Set-Cookie", "session=leak; Path=/")
+            self.send_header("X-Got-Cookie", self.headers.get("Cookie", ""))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(label: str, requests: int, concurrency: int, get):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await get()
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+            assert "session=leak" not in response.headers.get("X-Got-Cookie", ""), "cookie leaked between requests"
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    total = time.perf_counter() - start
+    latencies.sort()
+    print(f"  {label:<8} {requests / total:>8.1f} req/s   p50 {statistics.median(latencies) * 1000:>7.1f} ms   "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:>7.1f} ms")
+
+
+async def main(requests: int, concurrency: int, latency_ms: int):
+    server = start_stub_server(latency_ms)
+    url = f"http://127.0.0.1:{server.server_address[1]}/me"
+    print(f"stub server {url}, {requests} requests, concurrency {concurrency}")
+    try:
+        async def fresh():
+            async with AsyncSession() as session:
+                return await session.get(url, impersonate="chrome", timeout=30)
+
+        await run("fresh", requests, concurrency, fresh)
+
+        pool = HttpSessionPool(max_clients=concurrency, max_connections_per_host=concurrency, idle_seconds=60)
+
+        async def pooled():
+            async with pool.session(None) as session:
+                return await session.get(url, impersonate="chrome", timeout=30)
+
+        try:
+            await run("pooled", requests, concurrency, pooled)
+            stats = pool.get_stats()
+            print(f"  pool handshakes {stats['handshakes']}, reuse ratio {stats['reuse_ratio']}, "
+                  f"sessions {stats['sessions_created']}")
+        finally:
+            await pool.stop()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.latency_ms))
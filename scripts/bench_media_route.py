@@ -0,0 +1,179 @@
+"""Benchmark: StaticFiles mount vs. the cached media route
+
+Writes --files content-addressed files of --size-mb into a temporary cache
+directory and serves it under /tmp with uvicorn, in a separate process,
+either through the previous app.mount("/tmp", StaticFiles(...)) or through
+the media route (MediaServer over a FileCache index). --clients threads
+then run, against each:
+
+  range      Range requests for --range-kb at random offsets, like a video
+             player seeking and buffering
+  full       whole-file GETs
+  revalidate conditional GETs with the ETag from a first response
+
+Every 206 body is checked against the file, and the caching headers of
+each server are printed.
+
+Usage:
+    python scripts/bench_media_route.py [--files 8] [--size-mb 32] [--clients 8] [--requests 800]
+"""
+import argparse
+import hashlib
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from curl_cffi.requests import Session
+
+
+def make_files(cache_dir: Path, files: int, size: int) -> dict:
+    contents = {}
+    for _ in range(files):
+        body = b"\x00\x00\x00\x18ftypmp42" + os.urandom(size - 12)
+        sha256 = hashlib.sha256(body).hexdigest()
+        filename = f"{sha256[:2]}/{sha256[2:4]}/{sha256}.mp4"
+        (cache_dir / filename).parent.mkdir(parents=True, exist_ok=True)
+        (cache_dir / filename).write_bytes(body)
+        contents[filename] = body
+    return contents
+
+
+def serve(mode: str, cache_dir: str, port: int):
+    import uvicorn
+    from fastapi import FastAPI
+    app = FastAPI()
+    if mode == "static":
+        from fastapi.staticfiles import StaticFiles
+        app.mount("/tmp", StaticFiles(directory=cache_dir), name="tmp")
+    else:
+        from src.api import media as media_routes
+        from src.services.file_cache import FileCache
+        from src.services.media_server import MediaServer
+        media_routes.set_media_server(MediaServer(FileCache(cache_dir=cache_dir)))
+        app.include_router(media_routes.router)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_server(mode: str, cache_dir: Path) -> tuple:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen([sys.executable, __file__, "--serve", mode, "--dir", str(cache_dir),
+                                "--port", str(port)])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}/tmp"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def run(label: str, base: str, jobs: list, clients: int, contents: dict) -> dict:
+    local = threading.local()
+    latencies, statuses = [], {}
+    sent = [0]
+    lock = threading.Lock()
+
+    def request(job):
+        filename, headers, expect = job
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = Session()
+        start = time.perf_counter()
+        response = session.get(f"{base}/{filename}", headers=headers, timeout=120)
+        elapsed = time.perf_counter() - start
+        body = response.content
+        if expect is not None and body != expect:
+            raise RuntimeError(f"{label}: wrong bytes for {filename} {headers}")
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            sent[0] += len(body)
+        return response
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(request, jobs))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": len(jobs) / elapsed,
+        "mbps": sent[0] / elapsed / 2**20,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "statuses": statuses,
+    }
+
+
+def bench(mode: str, cache_dir: Path, contents: dict, args) -> dict:
+    process, base = start_server(mode, cache_dir)
+    rng = random.Random(1)
+    range_size = args.range_kb * 1024
+    names = list(contents)
+    try:
+        with Session() as session:
+            first = session.get(f"{base}/{names[0]}", headers={"Range": "bytes=0-0"})
+            etags = {name: session.head(f"{base}/{name}").headers.get("etag") for name in names}
+        ranges = []
+        for _ in range(args.requests):
+            name = rng.choice(names)
+            offset = rng.randrange(0, len(contents[name]) - range_size)
+            ranges.append((name, {"Range": f"bytes={offset}-{offset + range_size - 1}"},
+                           contents[name][offset:offset + range_size]))
+        full = [(name, {}, None) for name in names * 2]
+        revalidate = [(name, {"If-None-Match": etags[name]}, None)
+                      for name in (rng.choice(names) for _ in range(args.requests))]
+        results = {
+            "range": run(f"{mode} range", base, ranges, args.clients, contents),
+            "full": run(f"{mode} full", base, full, args.clients, contents),
+            "revalidate": run(f"{mode} revalidate", base, revalidate, args.clients, contents),
+        }
+        results["headers"] = {key: first.headers.get(key) for key in ("etag", "cache-control", "accept-ranges")}
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(args):
+    if args.serve:
+        serve(args.serve, args.dir, args.port)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp) / "tmp"
+        cache_dir.mkdir()
+        contents = make_files(cache_dir, args.files, args.size_mb * 2**20)
+        print(f"{args.files} files of {args.size_mb} MB, {args.clients} clients, "
+              f"{args.requests} range requests of {args.range_kb} KB")
+        for mode in ("static", "media"):
+            results = bench(mode, cache_dir, contents, args)
+            print(f"  {mode}: {results.pop('headers')}")
+            for name, r in results.items():
+                print(f"    {name:<11} {r['rps']:>8.0f} req/s  {r['mbps']:>7.0f} MB/s   "
+                      f"p50 {r['p50']:>7.2f} ms   p99 {r['p99']:>7.2f} ms   statuses {r['statuses']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=800)
+    parser.add_argument("--range-kb", type=int, default=1024)
+    parser.add_argument("--serve", choices=("static", "media"), help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    main(parser.parse_args())
@@ -0,0 +1,153 @@
+"""Benchmark: per-task poll loops vs. the shared PollScheduler
+
+Starts --tasks video jobs spread over --tokens tokens at the same moment
+against a fake Sora client with --latency-ms per call. Some tokens answer
+429 for the first --throttle-ms. Compares the previous behaviour (every
+task sleeps poll_interval and calls upstream itself, failing on 429) with
+UpstreamPoller on the PollScheduler timer wheel (global in-flight cap,
+jittered intervals, throttled tokens paused). Reports peak concurrent
+upstream calls, the busiest 50 ms window, failed tasks and tick lag.
+
+Usage:
+    python scripts/bench_poll_scheduler.py [--tasks 500] [--tokens 50] [--interval-ms 100] [--max-inflight 8]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.services.poll_schedule import AdaptivePollSchedule
+from src.services.poll_scheduler import PollScheduler
+from src.services.upstream_poller import UpstreamPoller
+
+WINDOW = 0.05
+
+
+class FakeSoraClient:
+    """Jobs finish after their duration; throttled tokens answer 429 at first"""
+
+    def __init__(self, durations, latency: float, throttled, throttle_for: float):
+        self.durations = durations
+        self.latency = latency
+        self.throttled = throttled
+        self.started = time.monotonic()
+        self.throttle_until = self.started + throttle_for
+        self.inflight = 0
+        self.peak = 0
+        self.windows = Counter()
+        self.calls = 0
+
+    async def _call(self, token_id):
+        now = time.monotonic()
+        self.calls += 1
+        self.windows[int((now - self.started) / WINDOW)] += 1
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        try:
+            await asyncio.sleep(self.latency)
+            if token_id in self.throttled and now < self.throttle_until:
+                raise Exception('API request failed: 429 - {"error": {"code": "cf_shield_429"}}')
+        finally:
+            self.inflight -= 1
+
+    def _done(self, task_id) -> bool:
+        return time.monotonic() - self.started >= self.durations[task_id][1]
+
+    async def get_pending_tasks(self, token, token_id=None):
+        await self._call(token_id)
+        return [{"id": t, "progress_pct": None} for t, (owner, _) in self.durations.items()
+                if owner == token_id and not self._done(t)]
+
+    async def get_video_drafts(self, token, limit=15, token_id=None):
+        await self._call(token_id)
+        return {"items": [{"task_id": t, "url": f"https://cdn.invalid/{t}.mp4"}
+                          for t, (owner, _) in self.durations.items() if owner == token_id and self._done(t)]}
+
+    async def get_image_tasks(self, token, limit=20, token_id=None):
+        return {"task_responses": []}
+
+
+async def per_task_loops(client, interval: float) -> int:
+    failed = 0
+
+    async def job(task_id, token_id):
+        nonlocal failed
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                pending = await client.get_pending_tasks("tok", token_id=token_id)
+                if any(t["id"] == task_id for t in pending):
+                    continue
+                drafts = await client.get_video_drafts("tok", token_id=token_id)
+                if any(i["task_id"] == task_id for i in drafts["items"]):
+                    return
+            except Exception:
+                failed += 1  # CF shield/429 failed the task
+                return
+
+    await asyncio.gather(*(job(t, owner) for t, (owner, _) in client.durations.items()))
+    return failed
+
+
+async def scheduled(client, interval: float, max_inflight: int, throttle_for: float):
+    schedule = AdaptivePollSchedule(min_interval=interval, max_interval=interval * 4)
+    scheduler = PollScheduler(max_inflight=max_inflight, pause_seconds=throttle_for / 2,
+                              pause_max_seconds=throttle_for * 2, resolution=interval / 20)
+    poller = UpstreamPoller(client, schedule, scheduler)
+
+    async def job(task_id, token_id):
+        watch = poller.watch("tok", token_id, task_id, is_video=True)
+        try:
+            while True:
+                update = await watch.next_update()
+                if any(i["task_id"] == task_id for i in (update.drafts or {}).get("items", [])):
+                    return
+        finally:
+            watch.close()
+
+    try:
+        await asyncio.gather(*(job(t, owner) for t, (owner, _) in client.durations.items()))
+        return 0, scheduler.get_stats()
+    finally:
+        await poller.stop()
+
+
+async def main(tasks: int, tokens: int, interval_ms: int, latency_ms: int, max_inflight: int, throttle_ms: int):
+    random.seed(3)
+    interval = interval_ms / 1000
+    durations = {f"task_{i}": (i % tokens, random.uniform(interval * 5, interval * 30)) for i in range(tasks)}
+    throttled = set(range(0, tokens, 10))
+    throttle_for = throttle_ms / 1000
+    print(f"{tasks} tasks on {tokens} tokens, poll interval {interval_ms} ms, upstream latency {latency_ms} ms, "
+          f"{len(throttled)} tokens throttled for {throttle_ms} ms")
+
+    client = FakeSoraClient(durations, latency_ms / 1000, throttled, throttle_for)
+    failed = await per_task_loops(client, interval)
+    print(f"  per-task   calls {client.calls:>6}   peak in flight {client.peak:>4}   "
+          f"busiest 50ms {max(client.windows.values()):>4}   failed tasks {failed}")
+
+    client = FakeSoraClient(durations, latency_ms / 1000, throttled, throttle_for)
+    failed, stats = await scheduled(client, interval, max_inflight, throttle_for)
+    print(f"  scheduler  calls {client.calls:>6}   peak in flight {client.peak:>4}   "
+          f"busiest 50ms {max(client.windows.values()):>4}   failed tasks {failed}")
+    print(f"  tick lag avg {stats['avg_tick_lag_ms']} ms, max {stats['max_tick_lag_ms']} ms; "
+          f"timer lag avg {stats['avg_timer_lag_ms']} ms; throttle pauses {stats['throttle_pauses']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--interval-ms", type=int, default=100)
+    parser.add_argument("--latency-ms", type=int, default=10)
+    parser.add_argument("--max-inflight", type=int, default=8)
+    parser.add_argument("--throttle-ms", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.tokens, args.interval_ms, args.latency_ms, args.max_inflight,
+                     args.throttle_ms))
@@ -0,0 +1,103 @@
+"""Benchmark: process-pool PowSolver vs. the previous sequential solve on the event loop
+
+Solves a batch of sentinel proof-of-work challenges, first with the old
+loop (seed + full base64 config hashed per nonce, run directly in the
+event loop) and then through PowSolver. Reports solve latency and the
+worst event-loop stall seen by a 10 ms ticker while solving, and checks
+every solution against the difficulty.
+
+Usage:
+    python scripts/bench_pow_solver.py [--solves 10] [--difficulty 0001ff] [--workers 0]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.services.pow_solver import PowSolver
+from src.services.sora_client import POW_MAX_ITERATION, SoraClient
+from src.utils.pow import build_segments
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+def sequential_solve(seed: str, difficulty: str, config_list: list):
+    """Previous implementation: hash seed + full encoded config for every nonce"""
+    diff_len = len(difficulty) // 2
+    target = bytes.fromhex(difficulty)
+    part1, part2, part3, initial_j = build_segments(config_list)
+    for i in range(POW_MAX_ITERATION):
+        encoded = base64.b64encode(part1 + str(i).encode() + part2 + str(initial_j + (i + 29) // 30).encode() + part3)
+        if hashlib.sha3_512(seed.encode() + encoded).digest()[:diff_len] <= target:
+            return encoded.decode(), True
+    return "", False
+
+
+def verify(seed: str, difficulty: str, solution: str) -> bool:
+    diff_len = len(difficulty) // 2
+    return hashlib.sha3_512((seed + solution).encode()).digest()[:diff_len] <= bytes.fromhex(difficulty)
+
+
+async def measure(label: str, challenges, solve):
+    max_stall = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_stall
+        while running:
+            before = time.perf_counter()
+            await asyncio.sleep(0.01)
+            max_stall = max(max_stall, time.perf_counter() - before - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    latencies = []
+    for seed, difficulty, config_list in challenges:
+        start = time.perf_counter()
+        solution, ok = await solve(seed, difficulty, list(config_list))
+        latencies.append(time.perf_counter() - start)
+        assert ok and verify(seed, difficulty, solution), f"{label}: invalid solution for seed {seed}"
+    running = False
+    await tick
+
+    print(f"  {label:<10} p50 {statistics.median(latencies) * 1000:>8.1f} ms   max {max(latencies) * 1000:>8.1f} ms   "
+          f"max loop stall {max_stall * 1000:>8.1f} ms")
+
+
+async def main(solves: int, difficulty: str, workers: int):
+    random.seed(1)
+    challenges = [(format(random.random()), difficulty, SoraClient._get_pow_config(USER_AGENT)) for _ in range(solves)]
+    print(f"{solves} solves at difficulty {difficulty}")
+
+    async def old(seed, diff, config_list):
+        return sequential_solve(seed, diff, config_list)
+
+    await measure("sequential", challenges, old)
+
+    solver = PowSolver(POW_MAX_ITERATION, workers=workers or None, inline_max_expected=0)
+    try:
+        # Spawn the workers before timing
+        await solver.solve("warmup", "ff", list(challenges[0][2]))
+        await measure("pool", challenges, solver.solve)
+        stats = solver.get_stats()
+        print(f"  pool workers {stats['workers']}, avg iterations {stats['iterations']['avg']}, "
+              f"pool errors {stats['pool_errors']}")
+    finally:
+        solver.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--solves", type=int, default=10)
+    parser.add_argument("--difficulty", default="0001ff")
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args.solves, args.difficulty, args.workers))
@@ -0,0 +1,176 @@
+"""Benchmark: single GET vs. resumable, parallel Range downloads
+
+A local stub server serves --size-mb of random bytes, honouring Range
+headers (unless --no-range), limited to --conn-mbps per connection like a
+slow proxy. The first response that reaches --fail-at of the file has its
+connection dropped there. Compares:
+
+  single GET   the previous download: one GET, started over from zero
+               when it fails
+  ranged x1    RangeDownloader over one connection, resuming after the
+               last byte received
+  ranged xN    RangeDownloader fetching segments over --parallel
+               connections
+
+and checks every result against the SHA-256 of the served bytes.
+
+Usage:
+    python scripts/bench_range_download.py [--size-mb 64] [--conn-mbps 16] [--fail-at 0.9] [--parallel 4]
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from curl_cffi.requests import Session
+from src.services.range_downloader import RangeDownloader
+
+WRITE_SIZE = 64 * 1024
+
+
+class StubState:
+    def __init__(self, body: bytes, conn_bps: float, fail_at: int, ranges: bool):
+        self.body = body
+        self.conn_bps = conn_bps
+        self.fail_at = fail_at
+        self.ranges = ranges
+        self.failed = False
+        self.sent = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def start_stub_server(state: StubState) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            size = len(state.body)
+            start, end = 0, size - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            with state.lock:
+                state.requests += 1
+            if match and state.ranges:
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+                if state.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            pos = start
+            began = time.monotonic()
+            try:
+                while pos <= end:
+                    n = min(WRITE_SIZE, end - pos + 1)
+                    with state.lock:
+                        drop = not state.failed and pos < state.fail_at <= pos + n
+                        if drop:
+                            state.failed = True
+                    if drop:
+                        n = state.fail_at - pos
+                    self.wfile.write(state.body[pos:pos + n])
+                    pos += n
+                    with state.lock:
+                        state.sent += n
+                    if drop:
+                        self.close_connection = True
+                        self.connection.shutdown(2)
+                        return
+                    ahead = (pos - start) / state.conn_bps - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def single_get(url: str, path: str) -> tuple:
+    """The previous behaviour: one GET, started over from zero after a failure"""
+    requests = 0
+    while True:
+        requests += 1
+        digest = hashlib.sha256()
+        try:
+            with open(path, "wb") as f, Session() as session:
+                def on_data(data: bytes):
+                    digest.update(data)
+                    f.write(data)
+
+                session.get(url, timeout=600, content_callback=on_data)
+            return digest.hexdigest(), requests, 0
+        except Exception:
+            if requests >= 3:
+                raise
+
+
+def ranged(url: str, path: str, parallel: int, segment_size: int) -> tuple:
+    result = RangeDownloader(parallel_segments=parallel, segment_size=segment_size, progress_timeout=10,
+                             impersonate=None).download(url, path)
+    return result.sha256, result.requests, result.resumes
+
+
+def run(label: str, state: StubState, url: str, download, *args):
+    state.failed, state.sent, state.requests = False, 0, 0
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        sha256, requests, resumes = download(url, os.path.join(tmp, "video.mp4"), *args)
+        elapsed = time.perf_counter() - start
+    size = len(state.body)
+    ok = sha256 == hashlib.sha256(state.body).hexdigest()
+    print(f"  {label:<14} {elapsed:>6.2f}s   {size / elapsed / 2**20:>6.1f} MB/s   requests {requests:>3}   "
+          f"resumes {resumes}   transferred {state.sent / size:>5.0%} of file   sha256 {'ok' if ok else 'MISMATCH'}")
+
+
+def main(size_mb: int, conn_mbps: float, fail_at: float, parallel: int, segment_mb: int, no_range: bool):
+    body = os.urandom(size_mb * 2**20)
+    state = StubState(body, conn_mbps * 2**20, int(len(body) * fail_at), not no_range)
+    server = start_stub_server(state)
+    url = f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+    print(f"{size_mb} MB file, {conn_mbps:g} MB/s per connection, connection dropped once at {fail_at:.0%}"
+          f"{', no Range support' if no_range else ''}")
+    segment_size = segment_mb * 2**20
+    try:
+        run("single GET", state, url, single_get)
+        run("ranged x1", state, url, ranged, 1, segment_size)
+        run(f"ranged x{parallel}", state, url, ranged, parallel, segment_size)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--conn-mbps", type=float, default=16)
+    parser.add_argument("--fail-at", type=float, default=0.9)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--segment-mb", type=int, default=8)
+    parser.add_argument("--no-range", action="store_true")
+    args = parser.parse_args()
+    main(args.size_mb, args.conn_mbps, args.fail_at, args.parallel, args.segment_mb, args.no_range)
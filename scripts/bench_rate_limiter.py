@@ -0,0 +1,125 @@
+"""Benchmark: unthrottled Sora calls vs. UpstreamRateLimiter
+
+A local stub server answers 429 once one access token has had
+--upstream-rps requests per second accepted to /backend/nf/pending/v2 (a sliding
+one-second window). --tokens tokens each poll it with --concurrency
+workers for --seconds, first with no limiter (the previous behaviour) and
+then through UpstreamRateLimiter. The configured poll rate is --poll-rate,
+normally above what the stub allows, so the limiter has to tune itself down
+from the 429s it sees.
+
+Usage:
+    python scripts/bench_rate_limiter.py [--tokens 5] [--seconds 10] [--upstream-rps 1.5] [--poll-rate 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.core.config import config
+from src.services.http_pool import HttpSessionPool
+from src.services.rate_limiter import UpstreamRateLimiter
+
+BODY = b'{"items": []}'
+THROTTLED = b'{"error": {"code": "too_many_requests", "message": "Too many requests"}}'
+
+
+def start_stub_server(upstream_rps: float) -> ThreadingHTTPServer:
+    windows = defaultdict(deque)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            token = self.headers.get("Authorization", "")
+            now = time.monotonic()
+            with lock:
+                window = windows[token]
+                while window and now - window[0] > 1:
+                    window.popleft()
+                throttled = len(window) >= upstream_rps
+                if not throttled:
+                    window.append(now)
+            body = THROTTLED if throttled else BODY
+            self.send_response(429 if throttled else 200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run(label: str, url: str, tokens: int, concurrency: int, seconds: float, limiter):
+    pool = HttpSessionPool(max_clients=tokens * concurrency, max_connections_per_host=tokens * concurrency)
+    statuses = Counter()
+    last_second = Counter()
+    deadline = time.monotonic() + seconds
+
+    async def worker(token_id: int):
+        token = f"token-{token_id}"
+        while time.monotonic() < deadline:
+            async with pool.session(None) as session:
+                get = lambda: session.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=30)
+                if limiter is None:
+                    response = await get()
+                else:
+                    response = await limiter.send(token, token_id, url, get)
+            if time.monotonic() > deadline:
+                break
+            statuses[response.status_code] += 1
+            if deadline - time.monotonic() < 1:
+                last_second[response.status_code] += 1
+
+    try:
+        await asyncio.gather(*(worker(t) for t in range(tokens) for _ in range(concurrency)))
+    finally:
+        await pool.stop()
+    ok, throttled = statuses[200], statuses[429]
+    print(f"  {label:<10} ok {ok:>6}   429 {throttled:>6}   429 ratio {throttled / max(ok + throttled, 1):>6.1%}   "
+          f"429 in last second {last_second[429]:>4}")
+
+
+async def main(tokens: int, concurrency: int, seconds: float, upstream_rps: float, poll_rate: float):
+    server = start_stub_server(upstream_rps)
+    url = f"http://127.0.0.1:{server.server_address[1]}/backend/nf/pending/v2"
+    print(f"{tokens} tokens x {concurrency} workers for {seconds:g}s; upstream allows {upstream_rps:g} req/s per token, "
+          f"limiter configured for {poll_rate:g} req/s")
+    try:
+        await run("unlimited", url, tokens, concurrency, seconds, None)
+        config._config.setdefault("rate_limit", {})["poll"] = {"rate": poll_rate, "burst": 2}
+        config._config["rate_limit"].update(global_rate=1000, global_burst=1000, recovery_seconds=30)
+        limiter = UpstreamRateLimiter(enabled=True)
+        await run("limited", url, tokens, concurrency, seconds, limiter)
+        stats = limiter.get_stats()
+        rates = [b["rate"] for b in stats["throttled_buckets"]]
+        print(f"  limiter waits {stats['delayed']}, avg {stats['avg_wait_ms']} ms; "
+              f"tuned poll rates {min(rates, default=poll_rate):.2f}-{max(rates, default=poll_rate):.2f} req/s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--upstream-rps", type=float, default=1.5)
+    parser.add_argument("--poll-rate", type=float, default=2)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.concurrency, args.seconds, args.upstream_rps, args.poll_rate))
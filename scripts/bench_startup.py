@@ -0,0 +1,101 @@
+"""Benchmark: database startup time with the versioned migration registry
+
+Times the database part of application startup (init_db, config rows,
+config snapshot, token registry) for three cases:
+
+    fresh        new database file, every migration runs
+    unversioned  existing database with user_version 0 (pre-registry
+                 release), every migration runs against existing tables
+    current      existing database already at the latest schema version,
+                 no migration runs
+
+Usage:
+    python scripts/bench_startup.py [--tokens 1000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.core.config import config
+from src.core.database import Database
+from src.core.migrations import SCHEMA_VERSION
+
+
+async def startup(db_path: str) -> float:
+    """Run the database steps of src.main.startup_event; returns elapsed ms"""
+    start = time.perf_counter()
+    db = Database(db_path=db_path)
+    is_first_startup = not db.db_exists()
+    await db.init_db()
+    if is_first_startup:
+        await db.init_config_from_toml(config.get_raw_config(), is_first_startup=True)
+    else:
+        await db.check_and_migrate_db(config.get_raw_config())
+    await db.load_config_snapshot()
+    await db.load_token_registry()
+    elapsed = (time.perf_counter() - start) * 1000
+    await db.close()
+    return elapsed
+
+
+async def seed(db_path: str, count: int):
+    db = Database(db_path=db_path)
+    await db.init_db()
+    expiry = datetime.now() + timedelta(days=30)
+    async with db._write() as conn:
+        await conn.executemany("""
+            INSERT INTO tokens (token, email, username, name, expiry_time)
+            VALUES (?, ?, '', ?, ?)
+        """, [(f"bench-token-{i}", f"bench{i}@example.com", f"bench{i}", expiry) for i in range(count)])
+        await conn.commit()
+    await db.close()
+
+
+async def set_user_version(db_path: str, version: int):
+    db = Database(db_path=db_path)
+    async with db._write() as conn:
+        await conn.execute(f"PRAGMA user_version = {version}")
+        await conn.commit()
+    await db.close()
+
+
+def report(label: str, samples: list):
+    print(f"  {label:<12} median {statistics.median(samples):>8.2f} ms   "
+          f"min {min(samples):>8.2f} ms   max {max(samples):>8.2f} ms")
+
+
+async def main(tokens: int, repeat: int):
+    print(f"schema v{SCHEMA_VERSION}, {tokens} tokens, {repeat} runs each")
+    with tempfile.TemporaryDirectory() as tmp:
+        fresh = []
+        for i in range(repeat):
+            fresh.append(await startup(os.path.join(tmp, f"fresh{i}.db")))
+        report("fresh", fresh)
+
+        db_path = os.path.join(tmp, "existing.db")
+        await seed(db_path, tokens)
+
+        unversioned = []
+        for _ in range(repeat):
+            await set_user_version(db_path, 0)
+            unversioned.append(await startup(db_path))
+        report("unversioned", unversioned)
+
+        current = [await startup(db_path) for _ in range(repeat)]
+        report("current", current)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.repeat))
@@ -0,0 +1,92 @@
+"""Benchmark: LoadBalancer.select_token with SQLite vs. the in-memory token registry
+
+Seeds a temporary database with N tokens (default 10k) and times
+select_token for image, video and default selection, first with the
+registry unloaded (every call queries SQLite) and then with it loaded.
+
+Usage:
+    python scripts/bench_token_registry.py [--tokens 10000] [--calls 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.core.database import Database
+from src.services.load_balancer import LoadBalancer
+from src.services.token_manager import TokenManager
+
+
+async def seed(db: Database, count: int):
+    expiry = datetime.now() + timedelta(days=30)
+    async with db._write() as conn:
+        await conn.executemany("""
+            INSERT INTO tokens (token, email, username, name, expiry_time, is_active, sora2_supported,
+                                image_enabled, video_enabled)
+            VALUES (?, ?, '', ?, ?, ?, ?, 1, 1)
+        """, [
+            (f"bench-token-{i}", f"bench{i}@example.com", f"bench{i}", expiry, i % 10 != 0, i % 2 == 0)
+            for i in range(count)
+        ])
+        await conn.execute("INSERT INTO token_stats (token_id) SELECT id FROM tokens")
+        await conn.commit()
+
+
+async def time_calls(load_balancer: LoadBalancer, calls: int, **kwargs) -> dict:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        token = await load_balancer.select_token(**kwargs)
+        latencies.append(time.perf_counter() - start)
+        assert token is not None
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "calls_per_sec": calls / sum(latencies),
+    }
+
+
+async def main(tokens: int, calls: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(db_path=os.path.join(tmp, "bench.db"))
+        await db.init_db()
+        await seed(db, tokens)
+        load_balancer = LoadBalancer(TokenManager(db))
+
+        scenarios = {
+            "image": {"for_image_generation": True},
+            "video": {"for_video_generation": True},
+            "default": {},
+        }
+
+        for label in ("sqlite", "registry"):
+            if label == "registry":
+                start = time.perf_counter()
+                await db.load_token_registry()
+                print(f"\nregistry load: {len(db.token_registry)} tokens in "
+                      f"{(time.perf_counter() - start) * 1000:.1f} ms")
+            print(f"\n{label} ({tokens} tokens)")
+            for name, kwargs in scenarios.items():
+                result = await time_calls(load_balancer, calls, **kwargs)
+                print(f"  select_token[{name:<7}] {result['calls_per_sec']:>9.1f} calls/s   "
+                      f"p50 {result['p50_ms']:>8.3f} ms   p99 {result['p99_ms']:>8.3f} ms")
+
+        check = await db.check_token_registry()
+        print(f"\nconsistency check: consistent={check['consistent']}")
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=10000)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.calls))
@@ -0,0 +1,123 @@
+"""Benchmark: upstream status calls with independent polling vs. UpstreamPoller
+
+Simulates --tokens tokens with --jobs concurrent video jobs each against a
+fake Sora client whose jobs finish after a random number of ticks. Counts
+upstream GETs (pending, drafts) when every job polls on its own (the
+previous behaviour) and when all jobs of a token share one poller.
+
+Usage:
+    python scripts/bench_upstream_poller.py [--tokens 3] [--jobs 5] [--interval-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+# Add src to path
+sys.path.append(os.getcwd())
+
+from src.services.poll_schedule import AdaptivePollSchedule
+from src.services.poll_scheduler import PollScheduler
+from src.services.upstream_poller import UpstreamPoller
+
+
+class FakeSoraClient:
+    """Each job is pending for its duration (in ticks), then appears in drafts"""
+
+    def __init__(self, durations, interval: float):
+        self.durations = durations
+        self.interval = interval
+        self.started = time.monotonic()
+        self.calls = Counter()
+
+    def _progress(self, ticks: int) -> float:
+        return (time.monotonic() - self.started) / (ticks * self.interval)
+
+    async def get_pending_tasks(self, token, token_id=None):
+        self.calls["pending"] += 1
+        return [
+            {"id": task_id, "progress_pct": self._progress(ticks)}
+            for task_id, (owner, ticks) in self.durations.items()
+            if owner == token_id and self._progress(ticks) < 1
+        ]
+
+    async def get_video_drafts(self, token, limit=15, token_id=None):
+        self.calls["drafts"] += 1
+        return {"items": [
+            {"task_id": task_id, "url": f"https://cdn.invalid/{task_id}.mp4"}
+            for task_id, (owner, ticks) in self.durations.items()
+            if owner == token_id and self._progress(ticks) >= 1
+        ]}
+
+    async def get_image_tasks(self, token, limit=20, token_id=None):
+        self.calls["recent_tasks"] += 1
+        return {"task_responses": []}
+
+
+def make_jobs(tokens: int, jobs: int):
+    random.seed(7)
+    return {f"task_{t}_{j}": (t, random.randint(5, 30)) for t in range(tokens) for j in range(jobs)}
+
+
+async def independent(durations, interval: float) -> Counter:
+    client = FakeSoraClient(durations, interval)
+
+    async def job(task_id, token_id):
+        while True:
+            await asyncio.sleep(interval)
+            pending = await client.get_pending_tasks("tok", token_id=token_id)
+            if any(t["id"] == task_id for t in pending):
+                continue
+            drafts = await client.get_video_drafts("tok", token_id=token_id)
+            if any(i["task_id"] == task_id for i in drafts["items"]):
+                return
+
+    await asyncio.gather(*(job(task_id, owner) for task_id, (owner, _) in durations.items()))
+    return client.calls
+
+
+async def shared(durations, interval: float) -> Counter:
+    client = FakeSoraClient(durations, interval)
+    # Fixed interval, as in the previous behaviour
+    schedule = AdaptivePollSchedule(min_interval=interval, max_interval=interval, jitter=0)
+    poller = UpstreamPoller(client, schedule, PollScheduler(resolution=interval / 20))
+
+    async def job(task_id, token_id):
+        watch = poller.watch("tok", token_id, task_id, is_video=True)
+        try:
+            while True:
+                update = await watch.next_update()
+                if any(t["id"] == task_id for t in update.pending_tasks):
+                    continue
+                if any(i["task_id"] == task_id for i in (update.drafts or {}).get("items", [])):
+                    return
+        finally:
+            watch.close()
+
+    try:
+        await asyncio.gather(*(job(task_id, owner) for task_id, (owner, _) in durations.items()))
+    finally:
+        await poller.stop()
+    return client.calls
+
+
+async def main(tokens: int, jobs: int, interval_ms: int):
+    durations = make_jobs(tokens, jobs)
+    print(f"{tokens} tokens x {jobs} concurrent video jobs, 5-30 ticks each")
+    for label, calls in (("independent", await independent(durations, interval_ms / 1000)),
+                         ("shared", await shared(durations, interval_ms / 1000))):
+        total = sum(calls.values())
+        print(f"  {label:<12} upstream GETs {total:>6}   pending {calls['pending']:>6}   drafts {calls['drafts']:>6}   "
+              f"per job {total / len(durations):>6.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=5)
+    parser.add_argument("--interval-ms", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.jobs, args.interval_ms))
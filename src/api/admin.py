@@ -12,6 +12,11 @@ from ..core.config import config
 from ..services.token_manager import TokenManager
 from ..services.proxy_manager import ProxyManager
 from ..services.concurrency_manager import ConcurrencyManager
+from ..services.retention import RetentionManager
+from ..services.task_progress import TaskProgressFlusher
+from ..services.media_server import MediaServer
+from ..services.http_pool import http_pool
+from ..services.rate_limiter import rate_limiter
 from ..core.database import Database
 from ..core.models import Token, AdminConfig, ProxyConfig
 
@@ -24,19 +29,27 @@ db: Database = None
 generation_handler = None
 concurrency_manager: ConcurrencyManager = None
 scheduler = None
+retention_manager: RetentionManager = None
+task_progress_flusher: TaskProgressFlusher = None
+media_server: MediaServer = None
 
 # Store active admin tokens (in production, use Redis or database)
 active_admin_tokens = set()
 
-def set_dependencies(tm: TokenManager, pm: ProxyManager, database: Database, gh=None, cm: ConcurrencyManager = None, sched=None):
+def set_dependencies(tm: TokenManager, pm: ProxyManager, database: Database, gh=None, cm: ConcurrencyManager = None, sched=None,
+                     rm: RetentionManager = None, tpf: TaskProgressFlusher = None, ms: MediaServer = None):
     """Set dependencies"""
-    global token_manager, proxy_manager, db, generation_handler, concurrency_manager, scheduler
+    global token_manager, proxy_manager, db, generation_handler, concurrency_manager, scheduler, retention_manager
+    global task_progress_flusher, media_server
     token_manager = tm
     proxy_manager = pm
     db = database
     generation_handler = gh
     concurrency_manager = cm
     scheduler = sched
+    retention_manager = rm
+    task_progress_flusher = tpf
+    media_server = ms
 
 def verify_admin_token(authorization: str = Header(None)):
     """Verify admin token from Authorization header"""
@@ -202,11 +215,9 @@ async def logout(token: str = Depends(verify_admin_token)):
 @router.get("/api/tokens")
 async def get_tokens(token: str = Depends(verify_admin_token)) -> List[dict]:
     """Get all tokens with statistics"""
-    tokens = await token_manager.get_all_tokens()
     result = []
 
-    for token in tokens:
-        stats = await db.get_token_stats(token.id)
+    for token, stats in await db.get_all_tokens_with_stats():
         result.append({
             "id": token.id,
             "token": token.token,  # 完整的Access Token
@@ -247,6 +258,18 @@ async def get_tokens(token: str = Depends(verify_admin_token)) -> List[dict]:
 
     return result
 
+@router.get("/api/tokens/registry/check")
+async def check_token_registry(repair: bool = False, token: str = Depends(verify_admin_token)):
+    """Compare the in-memory token registry with the database (optionally reload it)"""
+    try:
+        result = await db.check_token_registry()
+        if repair and not result["consistent"]:
+            await db.load_token_registry()
+            result["repaired"] = True
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/api/tokens")
 async def add_token(request: AddTokenRequest, token: str = Depends(verify_admin_token)):
     """Add a new Access Token"""
@@ -1031,44 +1054,59 @@ async def update_watermark_free_config(
 @router.get("/api/stats")
 async def get_stats(token: str = Depends(verify_admin_token)):
     """Get system statistics"""
-    tokens = await token_manager.get_all_tokens()
+    totals = await db.get_token_stats_totals()
     active_tokens = await token_manager.get_active_tokens()
 
-    total_images = 0
-    total_videos = 0
-    total_errors = 0
-    today_images = 0
-    today_videos = 0
-    today_errors = 0
-
-    for token in tokens:
-        stats = await db.get_token_stats(token.id)
-        if stats:
-            total_images += stats.image_count
-            total_videos += stats.video_count
-            total_errors += stats.error_count
-            today_images += stats.today_image_count
-            today_videos += stats.today_video_count
-            today_errors += stats.today_error_count
-
     return {
-        "total_tokens": len(tokens),
+        "total_tokens": totals["total_tokens"],
         "active_tokens": len(active_tokens),
-        "total_images": total_images,
-        "total_videos": total_videos,
-        "today_images": today_images,
-        "today_videos": today_videos,
-        "total_errors": total_errors,
-        "today_errors": today_errors
+        "total_images": totals["total_images"],
+        "total_videos": totals["total_videos"],
+        "today_images": totals["today_images"],
+        "today_videos": totals["today_videos"],
+        "total_errors": totals["total_errors"],
+        "today_errors": totals["today_errors"]
+    }
+
+@router.get("/api/stats/flush")
+async def get_stats_flush_metrics(token: str = Depends(verify_admin_token)):
+    """Get write-behind buffer metrics (token stats and task progress)"""
+    return {
+        "success": True,
+        "metrics": token_manager.stats_buffer.get_stats(),
+        "task_progress": task_progress_flusher.get_stats() if task_progress_flusher else db.task_state.get_stats()
     }
 
 # Logs endpoints
 @router.get("/api/logs")
-async def get_logs(limit: int = 100, token: str = Depends(verify_admin_token)):
-    """Get recent logs with token email and task progress"""
-    from src.utils.timezone import convert_utc_to_local
-
-    logs = await db.get_recent_logs(limit)
+async def get_logs(
+    limit: int = 100,
+    cursor: Optional[int] = None,
+    token_id: Optional[int] = None,
+    operation: Optional[str] = None,
+    status_code: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    task_id: Optional[str] = None,
+    token: str = Depends(verify_admin_token)
+):
+    """Get logs (newest first) with token email and task progress
+
+    Pass the id of the last returned log as `cursor` to fetch the next page.
+    `since`/`until` accept ISO datetimes; values without an offset are UTC.
+    """
+    from src.utils.timezone import convert_utc_to_local, convert_to_utc_timestamp
+
+    logs = await db.query_logs(
+        limit=min(max(limit, 1), 1000),
+        cursor=cursor,
+        token_id=token_id,
+        operation=operation,
+        status_code=status_code,
+        since=convert_to_utc_timestamp(since),
+        until=convert_to_utc_timestamp(until),
+        task_id=task_id
+    )
     result = []
     for log in logs:
         # Convert UTC time to local timezone
@@ -1090,12 +1128,10 @@ async def get_logs(limit: int = 100, token: str = Depends(verify_admin_token)):
             "task_id": log.get("task_id")
         }
 
-        # If task_id exists, get task progress and status
-        if log.get("task_id"):
-            task = await db.get_task(log.get("task_id"))
-            if task:
-                log_data["progress"] = task.progress
-                log_data["task_status"] = task.status
+        # Task progress and status come from the joined tasks row
+        if log.get("task_status") is not None:
+            log_data["progress"] = log.get("progress")
+            log_data["task_status"] = log.get("task_status")
 
         result.append(log_data)
 
@@ -1110,6 +1146,115 @@ async def clear_logs(token: str = Depends(verify_admin_token)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Browser pool endpoints
+@router.get("/api/browser-pool/stats")
+async def get_browser_pool_stats(token: str = Depends(verify_admin_token)):
+    """Get warm browser pool metrics (contexts, queue depth, recycling)"""
+    return {
+        "success": True,
+        "stats": generation_handler.sora_client.browser_pool.get_stats()
+    }
+
+# HTTP session pool endpoints
+@router.get("/api/http-pool/stats")
+async def get_http_pool_stats(token: str = Depends(verify_admin_token)):
+    """Get shared HTTP session metrics (handshakes, connection reuse ratio)"""
+    return {
+        "success": True,
+        "stats": http_pool.get_stats()
+    }
+
+# Rate limiter endpoints
+@router.get("/api/rate-limit/stats")
+async def get_rate_limit_stats(token: str = Depends(verify_admin_token)):
+    """Get upstream rate limiter metrics (waits, throttled responses, backed-off buckets)"""
+    return {
+        "success": True,
+        "stats": rate_limiter.get_stats()
+    }
+
+# Sentinel cache endpoints
+@router.get("/api/sentinel-cache/stats")
+async def get_sentinel_cache_stats(token: str = Depends(verify_admin_token)):
+    """Get sentinel token prefetch metrics (hit/miss, served token age, stock per key)"""
+    return {
+        "success": True,
+        "stats": generation_handler.sora_client.sentinel_cache.get_stats()
+    }
+
+# File cache endpoints
+@router.get("/api/file-cache/stats")
+async def get_file_cache_stats(token: str = Depends(verify_admin_token)):
+    """Get media download metrics (cache hits, downloads, deduplicated concurrent downloads)"""
+    return {
+        "success": True,
+        "stats": generation_handler.file_cache.get_stats()
+    }
+
+# Media serving endpoints
+@router.get("/api/media/stats")
+async def get_media_stats(token: str = Depends(verify_admin_token)):
+    """Get cached media serving metrics (responses by status, bytes sent, zero-copy sends)"""
+    return {
+        "success": True,
+        "stats": media_server.get_stats()
+    }
+
+@router.get("/api/job-queue/stats")
+async def get_job_queue_stats(token: str = Depends(verify_admin_token)):
+    """Get durable background job queue metrics (queued/running jobs, recoveries, sweeps)"""
+    return {
+        "success": True,
+        "stats": {
+            **generation_handler.job_queue.get_stats(),
+            "jobs": await db.get_job_counts()
+        }
+    }
+
+# Upstream poller endpoints
+@router.get("/api/poller/stats")
+async def get_poller_stats(token: str = Depends(verify_admin_token)):
+    """Get shared task polling metrics (ticks, upstream calls, fan-out per call)"""
+    return {
+        "success": True,
+        "stats": generation_handler.upstream_poller.get_stats()
+    }
+
+# PoW solver endpoints
+@router.get("/api/pow/stats")
+async def get_pow_stats(token: str = Depends(verify_admin_token)):
+    """Get proof-of-work solver metrics (latency and iteration histograms)"""
+    return {
+        "success": True,
+        "stats": generation_handler.sora_client.pow_solver.get_stats()
+    }
+
+# Retention endpoints
+@router.get("/api/retention/stats")
+async def get_retention_stats(token: str = Depends(verify_admin_token)):
+    """Get retention metrics (rows pruned, bytes reclaimed, time spent) and database size"""
+    try:
+        return {"success": True, "stats": await retention_manager.get_stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/retention/run")
+async def run_retention(token: str = Depends(verify_admin_token)):
+    """Run the retention job now"""
+    try:
+        return {"success": True, "result": await retention_manager.run_once()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/retention/enable-incremental-vacuum")
+async def enable_incremental_vacuum(token: str = Depends(verify_admin_token)):
+    """Convert a database created before incremental vacuum support (runs a full VACUUM)"""
+    try:
+        await db.enable_incremental_vacuum()
+        return {"success": True, "storage": await db.get_storage_info()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Cache config endpoints
 @router.post("/api/cache/config")
 async def update_cache_timeout(
@@ -1191,8 +1336,10 @@ async def get_cache_config(token: str = Depends(verify_admin_token)):
             "enabled": config.cache_enabled,
             "timeout": config.cache_timeout,
             "base_url": config.cache_base_url,  # 返回实际配置的值，可能为空字符串
-            "effective_base_url": config.cache_base_url or f"http://{config.server_host}:{config.server_port}"  # 实际生效的值
-        }
+            "effective_base_url": config.cache_base_url or f"http://{config.server_host}:{config.server_port}",  # 实际生效的值
+            "max_bytes": config.cache_max_bytes
+        },
+        "usage": generation_handler.file_cache.index.get_stats()
     }
 
 @router.post("/api/cache/enabled")
@@ -1421,37 +1568,34 @@ async def cancel_task(task_id: str, token: str = Depends(verify_admin_token)):
         await db.update_task(task_id, "failed", 0, error_message="用户手动取消任务")
 
         # Update request log if exists
-        logs = await db.get_recent_logs(limit=1000)
-        for log in logs:
-            if log.get("task_id") == task_id and log.get("status_code") == -1:
-                import time
-                from datetime import datetime
-
-                # Calculate duration
-                created_at = log.get("created_at")
-                if created_at:
-                    # If created_at is a string, parse it
-                    if isinstance(created_at, str):
-                        try:
-                            created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                            duration = time.time() - created_at.timestamp()
-                        except:
-                            duration = 0
-                    # If it's already a datetime object
-                    elif isinstance(created_at, datetime):
+        log = await db.get_processing_log_for_task(task_id)
+        if log:
+            import time
+
+            # Calculate duration
+            created_at = log.get("created_at")
+            if created_at:
+                # If created_at is a string, parse it
+                if isinstance(created_at, str):
+                    try:
+                        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
                         duration = time.time() - created_at.timestamp()
-                    else:
+                    except:
                         duration = 0
+                # If it's already a datetime object
+                elif isinstance(created_at, datetime):
+                    duration = time.time() - created_at.timestamp()
                 else:
                     duration = 0
+            else:
+                duration = 0
 
-                await db.update_request_log(
-                    log.get("id"),
-                    response_body='{"error": "用户手动取消任务"}',
-                    status_code=499,
-                    duration=duration
-                )
-                break
+            await db.update_request_log(
+                log.get("id"),
+                response_body='{"error": "用户手动取消任务"}',
+                status_code=499,
+                duration=duration
+            )
 
         return {"success": True, "message": "任务已取消"}
     except HTTPException:
@@ -0,0 +1,18 @@
+"""Media routes - cached images and videos"""
+from fastapi import APIRouter, Request
+from ..services.media_server import MediaServer
+
+router = APIRouter()
+
+# Dependency injection will be set up in main.py
+media_server: MediaServer = None
+
+def set_media_server(server: MediaServer):
+    """Set media server instance"""
+    global media_server
+    media_server = server
+
+@router.api_route("/tmp/{filename:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_cached_media(filename: str, request: Request):
+    """Serve a cached file (ETag, If-None-Match, Range)"""
+    return await media_server.serve(filename, request)
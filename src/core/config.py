@@ -149,6 +149,56 @@ class Config:
             self._config["cache"] = {}
         self._config["cache"]["enabled"] = enabled
 
+    @property
+    def cache_max_bytes(self) -> int:
+        """Get disk budget of the file cache in bytes (0 = unlimited)"""
+        return self._config.get("cache", {}).get("max_bytes", 10737418240)
+
+    @property
+    def cache_download_chunk_size(self) -> int:
+        """Get bytes buffered per cache download before each write to disk"""
+        return self._config.get("cache", {}).get("download_chunk_size", 1048576)
+
+    @property
+    def cache_download_workers(self) -> int:
+        """Get max concurrent cache downloads (each runs in its own thread)"""
+        return self._config.get("cache", {}).get("download_workers", 16)
+
+    @property
+    def cache_download_segment_size(self) -> int:
+        """Get bytes fetched per HTTP Range request of a cache download"""
+        return self._config.get("cache", {}).get("download_segment_size", 8388608)
+
+    @property
+    def cache_download_parallel_segments(self) -> int:
+        """Get max connections one cache download fetches segments over"""
+        return self._config.get("cache", {}).get("download_parallel_segments", 4)
+
+    @property
+    def cache_download_retries(self) -> int:
+        """Get retries per segment of a cache download, each resuming after the last byte received"""
+        return self._config.get("cache", {}).get("download_retries", 5)
+
+    @property
+    def cache_download_progress_timeout(self) -> float:
+        """Get seconds a cache download request may stay below 1 KB/s before it is retried"""
+        return self._config.get("cache", {}).get("download_progress_timeout", 30)
+
+    @property
+    def cache_download_segment_timeout(self) -> float:
+        """Get max seconds for one ranged segment request of a cache download"""
+        return self._config.get("cache", {}).get("download_segment_timeout", 120)
+
+    @property
+    def cache_media_cache_control(self) -> str:
+        """Get Cache-Control header of cached media responses"""
+        return self._config.get("cache", {}).get("media_cache_control", "public, max-age=31536000, immutable")
+
+    @property
+    def cache_media_chunk_size(self) -> int:
+        """Get bytes read per chunk when sending cached media without zero-copy support"""
+        return self._config.get("cache", {}).get("media_chunk_size", 1048576)
+
     @property
     def image_timeout(self) -> int:
         """Get image generation timeout in seconds"""
@@ -258,5 +308,229 @@ class Config:
             self._config["pow_proxy"] = {}
         self._config["pow_proxy"]["pow_proxy_url"] = url
 
+    @property
+    def stats_flush_interval_ms(self) -> int:
+        """Get token stats write-behind flush interval in milliseconds"""
+        return self._config.get("stats", {}).get("flush_interval_ms", 1000)
+
+    @property
+    def stats_flush_max_events(self) -> int:
+        """Get number of pending stats events that triggers an early flush"""
+        return self._config.get("stats", {}).get("flush_max_events", 500)
+
+    @property
+    def task_progress_flush_interval_ms(self) -> int:
+        """Get interval for writing buffered task progress in milliseconds"""
+        return self._config.get("stats", {}).get("task_progress_flush_interval_ms", 2000)
+
+    @property
+    def pow_workers(self) -> int:
+        """Get number of PoW worker processes (0 = one per CPU)"""
+        return self._config.get("pow", {}).get("workers", 0)
+
+    @property
+    def pow_inline_max_expected(self) -> int:
+        """Get expected hash count below which PoW is solved inline instead of in worker processes"""
+        return self._config.get("pow", {}).get("inline_max_expected", 1000)
+
+    @property
+    def http_pool_max_clients(self) -> int:
+        """Get maximum concurrent requests per shared HTTP session"""
+        return self._config.get("http_pool", {}).get("max_clients", 20)
+
+    @property
+    def http_pool_max_connections_per_host(self) -> int:
+        """Get maximum open connections per upstream host per shared HTTP session"""
+        return self._config.get("http_pool", {}).get("max_connections_per_host", 8)
+
+    @property
+    def http_pool_idle_seconds(self) -> float:
+        """Get seconds after which an unused HTTP session and its connections are closed"""
+        return self._config.get("http_pool", {}).get("idle_seconds", 300)
+
+    @property
+    def poll_min_interval(self) -> float:
+        """Get shortest delay between status polls of a task (0 = sora.poll_interval)"""
+        return self._config.get("polling", {}).get("min_interval", 0)
+
+    @property
+    def poll_max_interval(self) -> float:
+        """Get longest delay between status polls of a task"""
+        return self._config.get("polling", {}).get("max_interval", 30)
+
+    @property
+    def poll_eta_fraction(self) -> float:
+        """Get the fraction of a task's estimated remaining time to wait before the next poll"""
+        return self._config.get("polling", {}).get("eta_fraction", 0.3)
+
+    @property
+    def poll_jitter(self) -> float:
+        """Get relative random spread applied to poll delays"""
+        return self._config.get("polling", {}).get("jitter", 0.15)
+
+    @property
+    def poll_max_inflight(self) -> int:
+        """Get maximum concurrent upstream status polls across all tokens"""
+        return self._config.get("polling", {}).get("max_inflight", 8)
+
+    @property
+    def poll_throttle_pause_seconds(self) -> float:
+        """Get how long a token's polling pauses after a 429/Cloudflare response"""
+        return self._config.get("polling", {}).get("throttle_pause_seconds", 30)
+
+    @property
+    def poll_throttle_pause_max_seconds(self) -> float:
+        """Get the longest pause after repeated 429/Cloudflare responses"""
+        return self._config.get("polling", {}).get("throttle_pause_max_seconds", 300)
+
+    @property
+    def rate_limit_enabled(self) -> bool:
+        """Get whether Sora API calls are rate limited per access token"""
+        return self._config.get("rate_limit", {}).get("enabled", True)
+
+    @property
+    def rate_limit_global_rate(self) -> float:
+        """Get requests per second allowed across all tokens (0 = no global limit)"""
+        return self._config.get("rate_limit", {}).get("global_rate", 0)
+
+    @property
+    def rate_limit_global_burst(self) -> float:
+        """Get burst size of the global rate limit bucket"""
+        return self._config.get("rate_limit", {}).get("global_burst", 20)
+
+    @property
+    def rate_limit_min_fraction(self) -> float:
+        """Get the lowest fraction of a configured rate that throttling may reduce it to"""
+        return self._config.get("rate_limit", {}).get("min_fraction", 0.1)
+
+    @property
+    def rate_limit_recovery_seconds(self) -> float:
+        """Get seconds for a throttled rate to climb back from zero to its configured value"""
+        return self._config.get("rate_limit", {}).get("recovery_seconds", 120)
+
+    @property
+    def rate_limit_classes(self) -> dict:
+        """Get per-endpoint-class overrides ({class: {"rate": ..., "burst": ...}})"""
+        section = self._config.get("rate_limit", {})
+        return {key: value for key, value in section.items() if isinstance(value, dict)}
+
+    @property
+    def job_queue_workers(self) -> int:
+        """Get maximum background polling jobs run at once (0 = no limit)"""
+        return self._config.get("job_queue", {}).get("workers", 0)
+
+    @property
+    def job_queue_lease_seconds(self) -> float:
+        """Get how long a background job may go without progress before it counts as stuck"""
+        return self._config.get("job_queue", {}).get("lease_seconds", 600)
+
+    @property
+    def job_queue_heartbeat_seconds(self) -> float:
+        """Get interval between lease renewals of running background jobs"""
+        return self._config.get("job_queue", {}).get("heartbeat_seconds", 30)
+
+    @property
+    def job_queue_sweep_seconds(self) -> float:
+        """Get interval between sweeps for stuck and expired background jobs"""
+        return self._config.get("job_queue", {}).get("sweep_seconds", 60)
+
+    @property
+    def job_queue_max_attempts(self) -> int:
+        """Get how many times a background job is leased before its task is failed"""
+        return self._config.get("job_queue", {}).get("max_attempts", 5)
+
+    @property
+    def sentinel_cache_enabled(self) -> bool:
+        """Get whether sentinel tokens are prefetched in the background"""
+        return self._config.get("sentinel_cache", {}).get("enabled", True)
+
+    @property
+    def sentinel_cache_ttl_seconds(self) -> float:
+        """Get how long a prefetched sentinel token may be used"""
+        return self._config.get("sentinel_cache", {}).get("ttl_seconds", 180)
+
+    @property
+    def sentinel_cache_max_stock(self) -> int:
+        """Get maximum number of prefetched tokens per (proxy, user agent, flow)"""
+        return self._config.get("sentinel_cache", {}).get("max_stock", 4)
+
+    @property
+    def sentinel_cache_idle_seconds(self) -> float:
+        """Get seconds without demand after which a key is no longer refilled"""
+        return self._config.get("sentinel_cache", {}).get("idle_seconds", 600)
+
+    @property
+    def sentinel_cache_refill_concurrency(self) -> int:
+        """Get maximum number of background token generations at once"""
+        return self._config.get("sentinel_cache", {}).get("refill_concurrency", 2)
+
+    @property
+    def browser_pool_target_url(self) -> str:
+        """Get page the browser pool loads to obtain SentinelSDK"""
+        return self._config.get("browser_pool", {}).get("target_url", "https://sora.chatgpt.com")
+
+    @property
+    def browser_pool_max_contexts(self) -> int:
+        """Get maximum number of warm browser contexts (one per proxy)"""
+        return self._config.get("browser_pool", {}).get("max_contexts", 4)
+
+    @property
+    def browser_pool_max_concurrent_per_context(self) -> int:
+        """Get maximum concurrent sentinel token calls per context"""
+        return self._config.get("browser_pool", {}).get("max_concurrent_per_context", 4)
+
+    @property
+    def browser_pool_max_uses(self) -> int:
+        """Get number of tokens after which a context is recycled"""
+        return self._config.get("browser_pool", {}).get("max_uses", 200)
+
+    @property
+    def browser_pool_max_heap_growth_mb(self) -> int:
+        """Get JS heap growth (MB) after which a context is recycled"""
+        return self._config.get("browser_pool", {}).get("max_heap_growth_mb", 256)
+
+    @property
+    def browser_pool_acquire_timeout(self) -> float:
+        """Get seconds a caller waits for a free browser context"""
+        return self._config.get("browser_pool", {}).get("acquire_timeout", 90)
+
+    @property
+    def browser_pool_sdk_timeout(self) -> float:
+        """Get seconds allowed for page load/SentinelSDK readiness and token calls"""
+        return self._config.get("browser_pool", {}).get("sdk_timeout", 60)
+
+    @property
+    def browser_pool_health_check_interval(self) -> float:
+        """Get seconds between browser context health checks"""
+        return self._config.get("browser_pool", {}).get("health_check_interval", 60)
+
+    @property
+    def retention_enabled(self) -> bool:
+        """Get whether the request_logs/tasks retention job runs"""
+        return self._config.get("retention", {}).get("enabled", False)
+
+    @property
+    def retention_interval_seconds(self) -> int:
+        """Get interval between retention runs in seconds"""
+        return self._config.get("retention", {}).get("interval_seconds", 3600)
+
+    @property
+    def retention_batch_size(self) -> int:
+        """Get number of rows deleted per write transaction"""
+        return self._config.get("retention", {}).get("batch_size", 500)
+
+    @property
+    def retention_vacuum_pages(self) -> int:
+        """Get max pages released per incremental vacuum (0 = all free pages)"""
+        return self._config.get("retention", {}).get("vacuum_pages", 0)
+
+    def get_retention_policy(self, table: str) -> dict:
+        """Get retention policy for a table: max_age_days and max_rows (0 = unlimited)"""
+        section = self._config.get("retention", {})
+        return {
+            "max_age_days": section.get(f"{table}_max_age_days", 30),
+            "max_rows": section.get(f"{table}_max_rows", 100000),
+        }
+
 # Global config instance
 config = Config()
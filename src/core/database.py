@@ -1,43 +1,130 @@
 """Database storage layer"""
+import asyncio
 import aiosqlite
 import json
-from datetime import datetime
-from typing import Optional, List
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, List, Tuple
 from pathlib import Path
-from .models import Token, TokenStats, Task, RequestLog, AdminConfig, ProxyConfig, WatermarkFreeConfig, CacheConfig, GenerationConfig, TokenRefreshConfig
+from .models import Token, TokenStats, Task, BackgroundJob, RequestLog, AdminConfig, ProxyConfig, WatermarkFreeConfig, CacheConfig, GenerationConfig, TokenRefreshConfig, CallLogicConfig, PowProxyConfig, ConfigSnapshot
+from .token_registry import TokenRegistry
+from .task_state import TaskStateTable
+from .migrations import MIGRATIONS, SCHEMA_VERSION
 
 class Database:
-    """SQLite database manager"""
-
-    def __init__(self, db_path: str = None):
+    """SQLite database manager
+
+    Keeps long-lived connections instead of opening one per call:
+    a single writer connection serialized by a lock, plus a small pool
+    of read-only connections. WAL mode lets readers run concurrently
+    with the writer.
+    """
+
+    # Number of pooled read connections
+    READER_POOL_SIZE = 4
+    # Prepared statement cache size per connection (sqlite3 default is 128)
+    CACHED_STATEMENTS = 256
+    # How long a connection waits on a locked database before failing (ms)
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, db_path: str = None, reader_pool_size: int = None):
         if db_path is None:
             # Store database in data directory
             data_dir = Path(__file__).parent.parent.parent / "data"
             data_dir.mkdir(exist_ok=True)
             db_path = str(data_dir / "hancat.db")
         self.db_path = db_path
+        self._reader_pool_size = reader_pool_size or self.READER_POOL_SIZE
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_queue: Optional[asyncio.Queue] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+        # In-memory copy of the tokens table, written through on every token mutation
+        self.token_registry = TokenRegistry()
+        self.task_state = TaskStateTable()
+        # Immutable config snapshot, swapped whenever a config table is written
+        self._config_snapshot: Optional[ConfigSnapshot] = None
 
     def db_exists(self) -> bool:
         """Check if database file exists"""
         return Path(self.db_path).exists()
 
-    async def _table_exists(self, db, table_name: str) -> bool:
-        """Check if a table exists in the database"""
-        cursor = await db.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-            (table_name,)
-        )
-        result = await cursor.fetchone()
-        return result is not None
-
-    async def _column_exists(self, db, table_name: str, column_name: str) -> bool:
-        """Check if a column exists in a table"""
+    # Connection management
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        """Open a configured connection"""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=self.CACHED_STATEMENTS)
+        conn.row_factory = aiosqlite.Row
+        await conn.execute(f"PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS}")
+        if not read_only:
+            # auto_vacuum only takes effect on a database without tables (or after
+            # VACUUM), so it must be set before anything else writes the header
+            await conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # journal_mode is persistent in the file, synchronous is per connection
+            await conn.execute("PRAGMA journal_mode = WAL")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        if read_only:
+            await conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    async def _ensure_open(self):
+        """Lazily open the writer and reader pool on first use"""
+        if self._writer is not None:
+            return
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            # Writer first so WAL is enabled before readers attach
+            writer = await self._connect()
+            readers = [await self._connect(read_only=True) for _ in range(self._reader_pool_size)]
+            queue: asyncio.Queue = asyncio.Queue()
+            for conn in readers:
+                queue.put_nowait(conn)
+            self._write_lock = asyncio.Lock()
+            self._readers = readers
+            self._reader_queue = queue
+            self._writer = writer
+
+    @asynccontextmanager
+    async def _read(self):
+        """Borrow a pooled read connection"""
+        await self._ensure_open()
+        conn = await self._reader_queue.get()
         try:
-            cursor = await db.execute(f"PRAGMA table_info({table_name})")
-            columns = await cursor.fetchall()
-            return any(col[1] == column_name for col in columns)
-        except:
-            return False
+            yield conn
+        finally:
+            self._reader_queue.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _write(self):
+        """Acquire the single writer connection
+
+        Callers commit explicitly; anything left uncommitted on error is
+        rolled back so the shared connection is never handed on mid-transaction.
+        """
+        await self._ensure_open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+                raise
+
+    async def close(self):
+        """Close all pooled connections"""
+        if self._writer is None:
+            return
+        async with self._write_lock:
+            writer, self._writer = self._writer, None
+            readers, self._readers = self._readers, []
+            self._reader_queue = None
+            for conn in readers:
+                await conn.close()
+            await writer.close()
 
     async def _ensure_config_rows(self, db, config_dict: dict = None):
         """Ensure all config tables have their default rows
@@ -46,10 +133,14 @@ class Database:
             db: Database connection
             config_dict: Configuration dictionary from setting.toml (optional)
         """
+        # One round trip to find which config tables are still empty
+        cursor = await db.execute("SELECT " + ", ".join(
+            f"EXISTS(SELECT 1 FROM {table}) AS {table}" for table in self._CONFIG_TABLES.values()
+        ))
+        present = dict(await cursor.fetchone())
+
         # Ensure admin_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM admin_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["admin_config"]:
             # Get admin credentials from config_dict if provided, otherwise use defaults
             admin_username = "admin"
             admin_password = "admin"
@@ -77,9 +168,7 @@ class Database:
             """, (admin_username, admin_password, api_key, error_ban_threshold, task_retry_enabled, task_max_retries, auto_disable_on_401))
 
         # Ensure proxy_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM proxy_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["proxy_config"]:
             # Get proxy config from config_dict if provided, otherwise use defaults
             proxy_enabled = False
             proxy_url = None
@@ -97,9 +186,7 @@ class Database:
             """, (proxy_enabled, proxy_url))
 
         # Ensure watermark_free_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM watermark_free_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["watermark_free_config"]:
             # Get watermark-free config from config_dict if provided, otherwise use defaults
             watermark_free_enabled = False
             parse_method = "third_party"
@@ -125,9 +212,7 @@ class Database:
             """, (watermark_free_enabled, parse_method, custom_parse_url, custom_parse_token, fallback_on_failure))
 
         # Ensure cache_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM cache_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["cache_config"]:
             # Get cache config from config_dict if provided, otherwise use defaults
             cache_enabled = False
             cache_timeout = 600
@@ -147,9 +232,7 @@ class Database:
             """, (cache_enabled, cache_timeout, cache_base_url))
 
         # Ensure generation_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM generation_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["generation_config"]:
             # Get generation config from config_dict if provided, otherwise use defaults
             image_timeout = 300
             video_timeout = 3000
@@ -165,9 +248,7 @@ class Database:
             """, (image_timeout, video_timeout))
 
         # Ensure token_refresh_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM token_refresh_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["token_refresh_config"]:
             # Get token refresh config from config_dict if provided, otherwise use defaults
             at_auto_refresh_enabled = False
 
@@ -181,9 +262,7 @@ class Database:
             """, (at_auto_refresh_enabled,))
 
         # Ensure call_logic_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM call_logic_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["call_logic_config"]:
             # Get call logic config from config_dict if provided, otherwise use defaults
             call_mode = "default"
             polling_mode_enabled = False
@@ -205,9 +284,7 @@ class Database:
             """, (call_mode, polling_mode_enabled))
 
         # Ensure pow_proxy_config has a row
-        cursor = await db.execute("SELECT COUNT(*) FROM pow_proxy_config")
-        count = await cursor.fetchone()
-        if count[0] == 0:
+        if not present["pow_proxy_config"]:
             # Get POW proxy config from config_dict if provided, otherwise use defaults
             pow_proxy_enabled = False
             pow_proxy_url = None
@@ -226,325 +303,58 @@ class Database:
 
 
     async def check_and_migrate_db(self, config_dict: dict = None):
-        """Check database integrity and perform migrations if needed
+        """Ensure config rows exist on an existing database
+
+        Schema changes are applied by init_db through the migration registry.
 
         Args:
             config_dict: Configuration dictionary from setting.toml (optional)
                         Used to initialize new tables with values from setting.toml
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            print("Checking database integrity and performing migrations...")
-
-            # Check and add missing columns to tokens table
-            if await self._table_exists(db, "tokens"):
-                columns_to_add = [
-                    ("sora2_supported", "BOOLEAN"),
-                    ("sora2_invite_code", "TEXT"),
-                    ("sora2_redeemed_count", "INTEGER DEFAULT 0"),
-                    ("sora2_total_count", "INTEGER DEFAULT 0"),
-                    ("sora2_remaining_count", "INTEGER DEFAULT 0"),
-                    ("sora2_cooldown_until", "TIMESTAMP"),
-                    ("image_enabled", "BOOLEAN DEFAULT 1"),
-                    ("video_enabled", "BOOLEAN DEFAULT 1"),
-                    ("image_concurrency", "INTEGER DEFAULT -1"),
-                    ("video_concurrency", "INTEGER DEFAULT -1"),
-                    ("client_id", "TEXT"),
-                    ("proxy_url", "TEXT"),
-                    ("is_expired", "BOOLEAN DEFAULT 0"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "tokens", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE tokens ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to tokens table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Check and add missing columns to token_stats table
-            if await self._table_exists(db, "token_stats"):
-                columns_to_add = [
-                    ("consecutive_error_count", "INTEGER DEFAULT 0"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "token_stats", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE token_stats ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to token_stats table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Check and add missing columns to admin_config table
-            if await self._table_exists(db, "admin_config"):
-                columns_to_add = [
-                    ("admin_username", "TEXT DEFAULT 'admin'"),
-                    ("admin_password", "TEXT DEFAULT 'admin'"),
-                    ("api_key", "TEXT DEFAULT 'han1234'"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "admin_config", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE admin_config ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to admin_config table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Check and add missing columns to watermark_free_config table
-            if await self._table_exists(db, "watermark_free_config"):
-                columns_to_add = [
-                    ("parse_method", "TEXT DEFAULT 'third_party'"),
-                    ("custom_parse_url", "TEXT"),
-                    ("custom_parse_token", "TEXT"),
-                    ("fallback_on_failure", "BOOLEAN DEFAULT 1"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "watermark_free_config", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE watermark_free_config ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to watermark_free_config table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
-            # Check and add missing columns to request_logs table
-            if await self._table_exists(db, "request_logs"):
-                columns_to_add = [
-                    ("task_id", "TEXT"),
-                    ("updated_at", "TIMESTAMP"),
-                ]
-
-                for col_name, col_type in columns_to_add:
-                    if not await self._column_exists(db, "request_logs", col_name):
-                        try:
-                            await db.execute(f"ALTER TABLE request_logs ADD COLUMN {col_name} {col_type}")
-                            print(f"  ✓ Added column '{col_name}' to request_logs table")
-                        except Exception as e:
-                            print(f"  ✗ Failed to add column '{col_name}': {e}")
-
+        async with self._write() as db:
             # Ensure all config tables have their default rows
             # Pass config_dict if available to initialize from setting.toml
             await self._ensure_config_rows(db, config_dict)
-
             await db.commit()
-            print("Database migration check completed.")
-
-    async def init_db(self):
-        """Initialize database tables - creates all tables and ensures data integrity"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Tokens table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS tokens (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    token TEXT UNIQUE NOT NULL,
-                    email TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    st TEXT,
-                    rt TEXT,
-                    client_id TEXT,
-                    proxy_url TEXT,
-                    remark TEXT,
-                    expiry_time TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    cooled_until TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_used_at TIMESTAMP,
-                    use_count INTEGER DEFAULT 0,
-                    plan_type TEXT,
-                    plan_title TEXT,
-                    subscription_end TIMESTAMP,
-                    sora2_supported BOOLEAN,
-                    sora2_invite_code TEXT,
-                    sora2_redeemed_count INTEGER DEFAULT 0,
-                    sora2_total_count INTEGER DEFAULT 0,
-                    sora2_remaining_count INTEGER DEFAULT 0,
-                    sora2_cooldown_until TIMESTAMP,
-                    image_enabled BOOLEAN DEFAULT 1,
-                    video_enabled BOOLEAN DEFAULT 1,
-                    image_concurrency INTEGER DEFAULT -1,
-                    video_concurrency INTEGER DEFAULT -1,
-                    is_expired BOOLEAN DEFAULT 0
-                )
-            """)
-
-            # Token stats table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS token_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    token_id INTEGER NOT NULL,
-                    image_count INTEGER DEFAULT 0,
-                    video_count INTEGER DEFAULT 0,
-                    error_count INTEGER DEFAULT 0,
-                    last_error_at TIMESTAMP,
-                    today_image_count INTEGER DEFAULT 0,
-                    today_video_count INTEGER DEFAULT 0,
-                    today_error_count INTEGER DEFAULT 0,
-                    today_date DATE,
-                    consecutive_error_count INTEGER DEFAULT 0,
-                    FOREIGN KEY (token_id) REFERENCES tokens(id)
-                )
-            """)
-
-            # Tasks table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS tasks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    task_id TEXT UNIQUE NOT NULL,
-                    token_id INTEGER NOT NULL,
-                    model TEXT NOT NULL,
-                    prompt TEXT NOT NULL,
-                    status TEXT NOT NULL DEFAULT 'processing',
-                    progress FLOAT DEFAULT 0,
-                    result_urls TEXT,
-                    error_message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    FOREIGN KEY (token_id) REFERENCES tokens(id)
-                )
-            """)
-
-            # Request logs table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS request_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    token_id INTEGER,
-                    task_id TEXT,
-                    operation TEXT NOT NULL,
-                    request_body TEXT,
-                    response_body TEXT,
-                    status_code INTEGER NOT NULL,
-                    duration FLOAT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP,
-                    FOREIGN KEY (token_id) REFERENCES tokens(id)
-                )
-            """)
-
-            # Admin config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS admin_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    admin_username TEXT DEFAULT 'admin',
-                    admin_password TEXT DEFAULT 'admin',
-                    api_key TEXT DEFAULT 'han1234',
-                    error_ban_threshold INTEGER DEFAULT 3,
-                    task_retry_enabled BOOLEAN DEFAULT 1,
-                    task_max_retries INTEGER DEFAULT 3,
-                    auto_disable_on_401 BOOLEAN DEFAULT 1,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Proxy config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS proxy_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    proxy_enabled BOOLEAN DEFAULT 0,
-                    proxy_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Watermark-free config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS watermark_free_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    watermark_free_enabled BOOLEAN DEFAULT 0,
-                    parse_method TEXT DEFAULT 'third_party',
-                    custom_parse_url TEXT,
-                    custom_parse_token TEXT,
-                    fallback_on_failure BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Cache config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS cache_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    cache_enabled BOOLEAN DEFAULT 0,
-                    cache_timeout INTEGER DEFAULT 600,
-                    cache_base_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Generation config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS generation_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    image_timeout INTEGER DEFAULT 300,
-                    video_timeout INTEGER DEFAULT 3000,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
-            # Token refresh config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS token_refresh_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    at_auto_refresh_enabled BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
 
-            # Call logic config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS call_logic_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    call_mode TEXT DEFAULT 'default',
-                    polling_mode_enabled BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+    async def init_db(self) -> List[int]:
+        """Bring the schema up to date by running pending migrations
 
-            # POW proxy config table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS pow_proxy_config (
-                    id INTEGER PRIMARY KEY DEFAULT 1,
-                    pow_proxy_enabled BOOLEAN DEFAULT 0,
-                    pow_proxy_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+        Migrations are tracked in PRAGMA user_version and all pending steps run
+        in a single transaction, so a failed upgrade leaves the file untouched.
 
-            # Create indexes
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_task_id ON tasks(task_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_task_status ON tasks(status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_token_active ON tokens(is_active)")
-
-            # Migration: Add daily statistics columns if they don't exist
-            if not await self._column_exists(db, "token_stats", "today_image_count"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_image_count INTEGER DEFAULT 0")
-            if not await self._column_exists(db, "token_stats", "today_video_count"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_video_count INTEGER DEFAULT 0")
-            if not await self._column_exists(db, "token_stats", "today_error_count"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_error_count INTEGER DEFAULT 0")
-            if not await self._column_exists(db, "token_stats", "today_date"):
-                await db.execute("ALTER TABLE token_stats ADD COLUMN today_date DATE")
-
-            # Migration: Add retry_count column to tasks table if it doesn't exist
-            if not await self._column_exists(db, "tasks", "retry_count"):
-                await db.execute("ALTER TABLE tasks ADD COLUMN retry_count INTEGER DEFAULT 0")
-
-            # Migration: Add task retry config columns to admin_config table if they don't exist
-            if not await self._column_exists(db, "admin_config", "task_retry_enabled"):
-                await db.execute("ALTER TABLE admin_config ADD COLUMN task_retry_enabled BOOLEAN DEFAULT 1")
-            if not await self._column_exists(db, "admin_config", "task_max_retries"):
-                await db.execute("ALTER TABLE admin_config ADD COLUMN task_max_retries INTEGER DEFAULT 3")
-            if not await self._column_exists(db, "admin_config", "auto_disable_on_401"):
-                await db.execute("ALTER TABLE admin_config ADD COLUMN auto_disable_on_401 BOOLEAN DEFAULT 1")
+        Returns:
+            Versions that were applied (empty when the schema is current)
+        """
+        async with self._write() as db:
+            cursor = await db.execute("PRAGMA user_version")
+            current = (await cursor.fetchone())[0]
+            if current > SCHEMA_VERSION:
+                print(f"⚠ Database schema v{current} is newer than this release (v{SCHEMA_VERSION})")
+                return []
+
+            pending = [m for m in MIGRATIONS if m.version > current]
+            if not pending:
+                return []
+
+            # DDL does not open a transaction implicitly, so start one explicitly
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                for migration in pending:
+                    await migration.apply(db)
+                    print(f"  ✓ Schema migration v{migration.version}: {migration.description}")
+                await db.execute(f"PRAGMA user_version = {pending[-1].version}")
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            return [m.version for m in pending]
 
-            await db.commit()
+    async def get_schema_version(self) -> int:
+        """Get the applied schema version"""
+        async with self._read() as db:
+            cursor = await db.execute("PRAGMA user_version")
+            return (await cursor.fetchone())[0]
 
     async def init_config_from_toml(self, config_dict: dict, is_first_startup: bool = True):
         """
@@ -555,7 +365,7 @@ class Database:
             is_first_startup: If True, initialize all config rows from setting.toml.
                             If False (upgrade mode), only ensure missing config rows exist with default values.
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             if is_first_startup:
                 # First startup: Initialize all config tables with values from setting.toml
                 await self._ensure_config_rows(db, config_dict)
@@ -565,10 +375,55 @@ class Database:
 
             await db.commit()
 
+    # Token registry
+    async def _sync_token(self, db, token_id: int):
+        """Write the committed tokens row through to the in-memory registry"""
+        cursor = await db.execute("SELECT * FROM tokens WHERE id = ?", (token_id,))
+        row = await cursor.fetchone()
+        if row:
+            self.token_registry.put(Token(**dict(row)))
+        else:
+            self.token_registry.remove(token_id)
+
+    async def load_token_registry(self) -> int:
+        """Load all tokens into the in-memory registry
+
+        Returns:
+            Number of tokens loaded
+        """
+        tokens = await self.get_all_tokens()
+        self.token_registry.load(tokens)
+        return len(tokens)
+
+    async def check_token_registry(self) -> dict:
+        """Compare the in-memory registry with the tokens table"""
+        db_tokens = {token.id: token for token in await self.get_all_tokens()}
+        registry = self.token_registry
+        mismatched = {}
+        for token_id, db_token in db_tokens.items():
+            cached = registry.get(token_id)
+            if cached is None:
+                continue
+            cached_data = cached.model_dump()
+            fields = [name for name, value in db_token.model_dump().items() if cached_data.get(name) != value]
+            if fields:
+                mismatched[token_id] = fields
+        registry_ids = {token.id for token in registry.get_all()}
+        return {
+            "consistent": not mismatched and registry_ids == set(db_tokens),
+            "loaded": registry.loaded,
+            "version": registry.version,
+            "db_count": len(db_tokens),
+            "registry_count": len(registry_ids),
+            "missing_in_registry": sorted(set(db_tokens) - registry_ids),
+            "missing_in_db": sorted(registry_ids - set(db_tokens)),
+            "mismatched": mismatched
+        }
+
     # Token operations
     async def add_token(self, token: Token) -> int:
         """Add a new token"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             cursor = await db.execute("""
                 INSERT INTO tokens (token, email, username, name, st, rt, client_id, proxy_url, remark, expiry_time, is_active,
                                    plan_type, plan_title, subscription_end, sora2_supported, sora2_invite_code,
@@ -591,13 +446,13 @@ class Database:
                 INSERT INTO token_stats (token_id) VALUES (?)
             """, (token_id,))
             await db.commit()
+            await self._sync_token(db, token_id)
 
             return token_id
     
     async def get_token(self, token_id: int) -> Optional[Token]:
         """Get token by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._read() as db:
             cursor = await db.execute("SELECT * FROM tokens WHERE id = ?", (token_id,))
             row = await cursor.fetchone()
             if row:
@@ -606,8 +461,7 @@ class Database:
     
     async def get_token_by_value(self, token: str) -> Optional[Token]:
         """Get token by value"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._read() as db:
             cursor = await db.execute("SELECT * FROM tokens WHERE token = ?", (token,))
             row = await cursor.fetchone()
             if row:
@@ -616,8 +470,7 @@ class Database:
 
     async def get_token_by_email(self, email: str) -> Optional[Token]:
         """Get token by email"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._read() as db:
             cursor = await db.execute("SELECT * FROM tokens WHERE email = ?", (email,))
             row = await cursor.fetchone()
             if row:
@@ -626,8 +479,7 @@ class Database:
     
     async def get_active_tokens(self) -> List[Token]:
         """Get all active tokens (enabled, not cooled down, not expired)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._read() as db:
             cursor = await db.execute("""
                 SELECT * FROM tokens
                 WHERE is_active = 1
@@ -640,87 +492,84 @@ class Database:
     
     async def get_all_tokens(self) -> List[Token]:
         """Get all tokens"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._read() as db:
             cursor = await db.execute("SELECT * FROM tokens ORDER BY created_at DESC")
             rows = await cursor.fetchall()
             return [Token(**dict(row)) for row in rows]
     
-    async def update_token_usage(self, token_id: int):
-        """Update token usage"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                UPDATE tokens 
-                SET last_used_at = CURRENT_TIMESTAMP, use_count = use_count + 1
-                WHERE id = ?
-            """, (token_id,))
-            await db.commit()
-    
     async def update_token_status(self, token_id: int, is_active: bool):
         """Update token status"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE tokens SET is_active = ? WHERE id = ?
             """, (is_active, token_id))
             await db.commit()
+            await self._sync_token(db, token_id)
 
     async def mark_token_expired(self, token_id: int):
         """Mark token as expired and disable it"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE tokens SET is_expired = 1, is_active = 0 WHERE id = ?
             """, (token_id,))
             await db.commit()
+            await self._sync_token(db, token_id)
 
     async def clear_token_expired(self, token_id: int):
         """Clear token expired flag"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE tokens SET is_expired = 0 WHERE id = ?
             """, (token_id,))
             await db.commit()
+            await self._sync_token(db, token_id)
 
     async def update_token_sora2(self, token_id: int, supported: bool, invite_code: Optional[str] = None,
                                 redeemed_count: int = 0, total_count: int = 0, remaining_count: int = 0):
         """Update token Sora2 support info"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE tokens
                 SET sora2_supported = ?, sora2_invite_code = ?, sora2_redeemed_count = ?, sora2_total_count = ?, sora2_remaining_count = ?
                 WHERE id = ?
             """, (supported, invite_code, redeemed_count, total_count, remaining_count, token_id))
             await db.commit()
+            await self._sync_token(db, token_id)
 
     async def update_token_sora2_remaining(self, token_id: int, remaining_count: int):
         """Update token Sora2 remaining count"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE tokens SET sora2_remaining_count = ? WHERE id = ?
             """, (remaining_count, token_id))
             await db.commit()
+            await self._sync_token(db, token_id)
 
     async def update_token_sora2_cooldown(self, token_id: int, cooldown_until: Optional[datetime]):
         """Update token Sora2 cooldown time"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE tokens SET sora2_cooldown_until = ? WHERE id = ?
             """, (cooldown_until, token_id))
             await db.commit()
+            await self._sync_token(db, token_id)
 
     async def update_token_cooldown(self, token_id: int, cooled_until: datetime):
         """Update token cooldown"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE tokens SET cooled_until = ? WHERE id = ?
             """, (cooled_until, token_id))
             await db.commit()
+            await self._sync_token(db, token_id)
     
     async def delete_token(self, token_id: int):
         """Delete token"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("DELETE FROM token_stats WHERE token_id = ?", (token_id,))
             await db.execute("DELETE FROM tokens WHERE id = ?", (token_id,))
             await db.commit()
+            await self._sync_token(db, token_id)
 
     async def update_token(self, token_id: int,
                           token: Optional[str] = None,
@@ -738,7 +587,7 @@ class Database:
                           image_concurrency: Optional[int] = None,
                           video_concurrency: Optional[int] = None):
         """Update token (AT, ST, RT, client_id, proxy_url, remark, expiry_time, subscription info, image_enabled, video_enabled)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Build dynamic update query
             updates = []
             params = []
@@ -804,157 +653,177 @@ class Database:
                 query = f"UPDATE tokens SET {', '.join(updates)} WHERE id = ?"
                 await db.execute(query, params)
                 await db.commit()
+                await self._sync_token(db, token_id)
 
     # Token stats operations
     async def get_token_stats(self, token_id: int) -> Optional[TokenStats]:
         """Get token statistics"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self._read() as db:
             cursor = await db.execute("SELECT * FROM token_stats WHERE token_id = ?", (token_id,))
             row = await cursor.fetchone()
             if row:
                 return TokenStats(**dict(row))
             return None
     
-    async def increment_image_count(self, token_id: int):
-        """Increment image generation count"""
-        from datetime import date
-        async with aiosqlite.connect(self.db_path) as db:
-            today = str(date.today())
-            # Get current stats
-            cursor = await db.execute("SELECT today_date FROM token_stats WHERE token_id = ?", (token_id,))
-            row = await cursor.fetchone()
+    async def get_all_tokens_with_stats(self) -> List[Tuple[Token, Optional[TokenStats]]]:
+        """Get all tokens paired with their statistics without per-token queries
 
-            # If date changed, reset today's count
-            if row and row[0] != today:
-                await db.execute("""
-                    UPDATE token_stats
-                    SET image_count = image_count + 1,
-                        today_image_count = 1,
-                        today_date = ?
-                    WHERE token_id = ?
-                """, (today, token_id))
-            else:
-                # Same day, just increment both
-                await db.execute("""
-                    UPDATE token_stats
-                    SET image_count = image_count + 1,
-                        today_image_count = today_image_count + 1,
-                        today_date = ?
-                    WHERE token_id = ?
-                """, (today, token_id))
-            await db.commit()
+        Uses the already-built Token objects from the registry plus one scan of
+        token_stats when the registry is loaded, otherwise a single LEFT JOIN.
+        """
+        if self.token_registry.loaded:
+            tokens = sorted(
+                self.token_registry.get_all(),
+                key=lambda t: t.created_at or datetime.min,
+                reverse=True
+            )
+            async with self._read() as db:
+                cursor = await db.execute("SELECT * FROM token_stats")
+                rows = await cursor.fetchall()
+            stats_by_token = {}
+            for row in rows:
+                # Keep the first row per token, matching get_token_stats
+                stats_by_token.setdefault(row["token_id"], row)
+            return [
+                (token, TokenStats(**dict(stats_by_token[token.id])) if token.id in stats_by_token else None)
+                for token in tokens
+            ]
+
+        async with self._read() as db:
+            cursor = await db.execute("""
+                SELECT t.*,
+                       s.id AS s_id, s.image_count AS s_image_count, s.video_count AS s_video_count,
+                       s.error_count AS s_error_count, s.last_error_at AS s_last_error_at,
+                       s.today_image_count AS s_today_image_count, s.today_video_count AS s_today_video_count,
+                       s.today_error_count AS s_today_error_count, s.today_date AS s_today_date,
+                       s.consecutive_error_count AS s_consecutive_error_count
+                FROM tokens t
+                LEFT JOIN token_stats s ON s.token_id = t.id
+                ORDER BY t.created_at DESC
+            """)
+            rows = await cursor.fetchall()
 
-    async def increment_video_count(self, token_id: int):
-        """Increment video generation count"""
-        from datetime import date
-        async with aiosqlite.connect(self.db_path) as db:
-            today = str(date.today())
-            # Get current stats
-            cursor = await db.execute("SELECT today_date FROM token_stats WHERE token_id = ?", (token_id,))
+        result = []
+        for row in rows:
+            token_fields = {}
+            stats_fields = {}
+            for key in row.keys():
+                if key.startswith("s_"):
+                    stats_fields[key[2:]] = row[key]
+                else:
+                    token_fields[key] = row[key]
+            token = Token(**token_fields)
+            stats = None
+            if stats_fields["id"] is not None:
+                stats = TokenStats(token_id=token.id, **stats_fields)
+            result.append((token, stats))
+        return result
+
+    async def get_token_stats_totals(self) -> dict:
+        """Get token count and summed statistics across all tokens in one query"""
+        async with self._read() as db:
+            cursor = await db.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM tokens) AS total_tokens,
+                    COALESCE(SUM(s.image_count), 0) AS total_images,
+                    COALESCE(SUM(s.video_count), 0) AS total_videos,
+                    COALESCE(SUM(s.error_count), 0) AS total_errors,
+                    COALESCE(SUM(s.today_image_count), 0) AS today_images,
+                    COALESCE(SUM(s.today_video_count), 0) AS today_videos,
+                    COALESCE(SUM(s.today_error_count), 0) AS today_errors
+                FROM token_stats s
+                JOIN tokens t ON t.id = s.token_id
+            """)
             row = await cursor.fetchone()
+            return dict(row)
 
-            # If date changed, reset today's count
-            if row and row[0] != today:
-                await db.execute("""
-                    UPDATE token_stats
-                    SET video_count = video_count + 1,
-                        today_video_count = 1,
-                        today_date = ?
-                    WHERE token_id = ?
-                """, (today, token_id))
-            else:
-                # Same day, just increment both
-                await db.execute("""
-                    UPDATE token_stats
-                    SET video_count = video_count + 1,
-                        today_video_count = today_video_count + 1,
-                        today_date = ?
-                    WHERE token_id = ?
-                """, (today, token_id))
-            await db.commit()
-    
-    async def increment_error_count(self, token_id: int, increment_consecutive: bool = True):
-        """Increment error count
+    async def apply_token_stats_deltas(self, deltas: List[dict]):
+        """Apply aggregated usage/stats counter deltas in one transaction
 
-        Args:
-            token_id: Token ID
-            increment_consecutive: Whether to increment consecutive error count (False for overload errors)
+        Each delta is a dict with token_id, use_count, last_used_at, image_count,
+        video_count, error_count, last_error_at, today_date, today_*_count,
+        consecutive_delta and consecutive_reset (see TokenStatsBuffer).
+        today_* counters restart when the stored today_date differs from the
+        delta's date. Missing token_stats rows are created (upsert).
         """
-        from datetime import date
-        async with aiosqlite.connect(self.db_path) as db:
-            today = str(date.today())
-            # Get current stats
-            cursor = await db.execute("SELECT today_date FROM token_stats WHERE token_id = ?", (token_id,))
-            row = await cursor.fetchone()
-
-            # If date changed, reset today's error count
-            if row and row[0] != today:
-                if increment_consecutive:
-                    await db.execute("""
-                        UPDATE token_stats
-                        SET error_count = error_count + 1,
-                            consecutive_error_count = consecutive_error_count + 1,
-                            today_error_count = 1,
-                            today_date = ?,
-                            last_error_at = CURRENT_TIMESTAMP
-                        WHERE token_id = ?
-                    """, (today, token_id))
-                else:
-                    await db.execute("""
-                        UPDATE token_stats
-                        SET error_count = error_count + 1,
-                            today_error_count = 1,
-                            today_date = ?,
-                            last_error_at = CURRENT_TIMESTAMP
-                        WHERE token_id = ?
-                    """, (today, token_id))
-            else:
-                # Same day, just increment counters
-                if increment_consecutive:
-                    await db.execute("""
-                        UPDATE token_stats
-                        SET error_count = error_count + 1,
-                            consecutive_error_count = consecutive_error_count + 1,
-                            today_error_count = today_error_count + 1,
-                            today_date = ?,
-                            last_error_at = CURRENT_TIMESTAMP
-                        WHERE token_id = ?
-                    """, (today, token_id))
-                else:
+        async with self._write() as db:
+            usage = [d for d in deltas if d["use_count"]]
+            if usage:
+                await db.executemany("""
+                    UPDATE tokens
+                    SET use_count = use_count + :use_count,
+                        last_used_at = COALESCE(:last_used_at, last_used_at)
+                    WHERE id = :token_id
+                """, usage)
+
+            for d in deltas:
+                cursor = await db.execute("""
+                    UPDATE token_stats
+                    SET image_count = image_count + :image_count,
+                        video_count = video_count + :video_count,
+                        error_count = error_count + :error_count,
+                        last_error_at = COALESCE(:last_error_at, last_error_at),
+                        today_image_count = CASE
+                            WHEN :today_date IS NULL THEN today_image_count
+                            WHEN today_date = :today_date THEN today_image_count + :today_image_count
+                            ELSE :today_image_count END,
+                        today_video_count = CASE
+                            WHEN :today_date IS NULL THEN today_video_count
+                            WHEN today_date = :today_date THEN today_video_count + :today_video_count
+                            ELSE :today_video_count END,
+                        today_error_count = CASE
+                            WHEN :today_date IS NULL THEN today_error_count
+                            WHEN today_date = :today_date THEN today_error_count + :today_error_count
+                            ELSE :today_error_count END,
+                        today_date = COALESCE(:today_date, today_date),
+                        consecutive_error_count = CASE
+                            WHEN :consecutive_reset THEN :consecutive_delta
+                            ELSE consecutive_error_count + :consecutive_delta END
+                    WHERE token_id = :token_id
+                """, d)
+                if cursor.rowcount == 0:
                     await db.execute("""
-                        UPDATE token_stats
-                        SET error_count = error_count + 1,
-                            today_error_count = today_error_count + 1,
-                            today_date = ?,
-                            last_error_at = CURRENT_TIMESTAMP
-                        WHERE token_id = ?
-                    """, (today, token_id))
-            await db.commit()
-    
-    async def reset_error_count(self, token_id: int):
-        """Reset consecutive error count (keep total error_count)"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                UPDATE token_stats SET consecutive_error_count = 0 WHERE token_id = ?
-            """, (token_id,))
+                        INSERT INTO token_stats (token_id, image_count, video_count, error_count, last_error_at,
+                                                 today_image_count, today_video_count, today_error_count, today_date,
+                                                 consecutive_error_count)
+                        SELECT :token_id, :image_count, :video_count, :error_count, :last_error_at,
+                               :today_image_count, :today_video_count, :today_error_count, :today_date,
+                               :consecutive_delta
+                        WHERE EXISTS (SELECT 1 FROM tokens WHERE id = :token_id)
+                    """, d)
             await db.commit()
-    
+
+            for d in usage:
+                await self._sync_token(db, d["token_id"])
+
     # Task operations
     async def create_task(self, task: Task) -> int:
-        """Create a new task"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Create a new task and start tracking its state in memory"""
+        created_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        async with self._write() as db:
             cursor = await db.execute("""
-                INSERT INTO tasks (task_id, token_id, model, prompt, status, progress)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (task.task_id, task.token_id, task.model, task.prompt, task.status, task.progress))
+                INSERT INTO tasks (task_id, token_id, model, prompt, status, progress, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (task.task_id, task.token_id, task.model, task.prompt, task.status, task.progress,
+                  created_at.strftime("%Y-%m-%d %H:%M:%S")))
             await db.commit()
+            if task.status == "processing":
+                self.task_state.track(task.model_copy(update={"id": cursor.lastrowid, "created_at": created_at}))
             return cursor.lastrowid
-    
+
     async def update_task(self, task_id: str, status: str, progress: float, 
                          result_urls: Optional[str] = None, error_message: Optional[str] = None):
-        """Update task status"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Update task status
+
+        Intermediate progress of tracked tasks only updates the in-memory state
+        and is persisted by flush_task_progress; everything else is committed
+        immediately.
+        """
+        if (status == "processing" and result_urls is None and error_message is None
+                and self.task_state.set_progress(task_id, progress)):
+            return
+
+        async with self._write() as db:
             completed_at = datetime.now() if status in ["completed", "failed"] else None
             await db.execute("""
                 UPDATE tasks 
@@ -962,21 +831,168 @@ class Database:
                 WHERE task_id = ?
             """, (status, progress, result_urls, error_message, completed_at, task_id))
             await db.commit()
-    
+        if status != "processing":
+            self.task_state.finish(task_id)
+
+    async def flush_task_progress(self) -> int:
+        """Persist buffered task progress in one batched statement
+
+        Returns:
+            Number of tasks written
+        """
+        items = self.task_state.take_dirty()
+        if not items:
+            return 0
+        start = time.monotonic()
+        try:
+            async with self._write() as db:
+                # Never let buffered progress overwrite a terminal state
+                await db.executemany(
+                    "UPDATE tasks SET progress = ? WHERE task_id = ? AND status = 'processing'",
+                    items
+                )
+                await db.commit()
+        except Exception:
+            self.task_state.flush_errors += 1
+            self.task_state.requeue(items)
+            raise
+        self.task_state.flush_count += 1
+        self.task_state.flushed_rows += len(items)
+        self.task_state.last_flush_at = time.time()
+        self.task_state.last_flush_duration = time.monotonic() - start
+        return len(items)
+
     async def get_task(self, task_id: str) -> Optional[Task]:
-        """Get task by ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        """Get task by ID (in-flight tasks are served from memory)"""
+        task = self.task_state.get(task_id)
+        if task:
+            return task
+        async with self._read() as db:
             cursor = await db.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
             row = await cursor.fetchone()
             if row:
                 return Task(**dict(row))
             return None
-    
+
+    # Background job operations
+    async def enqueue_job(self, job: BackgroundJob) -> int:
+        """Persist a queued background job (no-op if the task already has one)"""
+        async with self._write() as db:
+            cursor = await db.execute("""
+                INSERT OR IGNORE INTO background_jobs (task_id, token_id, model, prompt, log_id, submitted_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (job.task_id, job.token_id, job.model, job.prompt, job.log_id, job.submitted_at))
+            await db.commit()
+            return cursor.lastrowid
+
+    async def claim_job(self, owner: str, lease_seconds: float) -> Optional[BackgroundJob]:
+        """Lease the oldest queued job to owner"""
+        now = time.time()
+        async with self._write() as db:
+            cursor = await db.execute("""
+                UPDATE background_jobs
+                SET status = 'running', lease_owner = ?, lease_expires_at = ?, heartbeat_at = ?,
+                    attempts = attempts + 1
+                WHERE id = (SELECT id FROM background_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+                RETURNING *
+            """, (owner, now + lease_seconds, now))
+            row = await cursor.fetchone()
+            await db.commit()
+            return BackgroundJob(**dict(row)) if row else None
+
+    async def renew_job_leases(self, owner: str, job_ids: List[int], lease_seconds: float):
+        """Record a heartbeat for jobs still making progress and extend their leases"""
+        if not job_ids:
+            return
+        now = time.time()
+        async with self._write() as db:
+            await db.executemany(
+                "UPDATE background_jobs SET heartbeat_at = ?, lease_expires_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                [(now, now + lease_seconds, job_id, owner) for job_id in job_ids]
+            )
+            await db.commit()
+
+    async def finish_job(self, job_id: int, owner: str):
+        """Remove a job its owner has finished"""
+        async with self._write() as db:
+            await db.execute("DELETE FROM background_jobs WHERE id = ? AND lease_owner = ?", (job_id, owner))
+            await db.commit()
+
+    async def requeue_jobs(self, max_attempts: int, expired_only: bool = True) -> Tuple[int, List[str]]:
+        """Put running jobs back in the queue
+
+        Args:
+            max_attempts: Jobs leased this many times are dropped instead
+            expired_only: Only jobs whose lease has expired (False at startup,
+                when every running job belonged to a previous process)
+
+        Returns:
+            (requeued count, task IDs of jobs dropped after exhausting max attempts)
+        """
+        where = "status = 'running'" + (" AND lease_expires_at < ?" if expired_only else "")
+        params = (time.time(),) if expired_only else ()
+        async with self._write() as db:
+            cursor = await db.execute(
+                f"DELETE FROM background_jobs WHERE {where} AND attempts >= ? RETURNING task_id",
+                params + (max_attempts,)
+            )
+            exhausted = [row[0] for row in await cursor.fetchall()]
+            cursor = await db.execute(
+                f"UPDATE background_jobs SET status = 'queued', lease_owner = NULL, lease_expires_at = NULL "
+                f"WHERE {where}",
+                params
+            )
+            await db.commit()
+            return cursor.rowcount, exhausted
+
+    async def enqueue_orphaned_tasks(self) -> int:
+        """Queue a job for every processing task that has none (startup recovery)"""
+        async with self._write() as db:
+            cursor = await db.execute("""
+                INSERT OR IGNORE INTO background_jobs (task_id, token_id, model, prompt, log_id, submitted_at)
+                SELECT t.task_id, t.token_id, t.model, t.prompt,
+                       (SELECT MAX(l.id) FROM request_logs l WHERE l.task_id = t.task_id),
+                       CAST(strftime('%s', t.created_at) AS REAL)
+                FROM tasks t
+                WHERE t.status = 'processing'
+                  AND NOT EXISTS (SELECT 1 FROM background_jobs j WHERE j.task_id = t.task_id)
+            """)
+            await db.commit()
+            return cursor.rowcount
+
+    async def get_job_counts(self) -> dict:
+        """Count background jobs by status"""
+        async with self._read() as db:
+            cursor = await db.execute("SELECT status, COUNT(*) FROM background_jobs GROUP BY status")
+            return {row[0]: row[1] for row in await cursor.fetchall()}
+
+    # Media cache operations
+    async def get_media_urls(self) -> Dict[str, str]:
+        """Load the cached media URL map (url_key -> content path)"""
+        async with self._read() as db:
+            cursor = await db.execute("SELECT url_key, content FROM media_urls")
+            return {row[0]: row[1] for row in await cursor.fetchall()}
+
+    async def set_media_url(self, url_key: str, content: str):
+        """Record which cached file a URL downloaded to"""
+        async with self._write() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO media_urls (url_key, content, created_at) VALUES (?, ?, ?)",
+                (url_key, content, time.time())
+            )
+            await db.commit()
+
+    async def delete_media_urls(self, contents: List[str]):
+        """Drop every URL mapped to the given cached files"""
+        async with self._write() as db:
+            await db.executemany("DELETE FROM media_urls WHERE content = ?", [(c,) for c in contents])
+            await db.commit()
+
     # Request log operations
     async def log_request(self, log: RequestLog) -> int:
         """Log a request and return log ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             cursor = await db.execute("""
                 INSERT INTO request_logs (token_id, task_id, operation, request_body, response_body, status_code, duration)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -988,7 +1004,7 @@ class Database:
     async def update_request_log(self, log_id: int, response_body: Optional[str] = None,
                                  status_code: Optional[int] = None, duration: Optional[float] = None):
         """Update request log with completion data"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             updates = []
             params = []
 
@@ -1011,7 +1027,7 @@ class Database:
 
     async def update_request_log_task_id(self, log_id: int, task_id: str):
         """Update request log with task_id"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE request_logs
                 SET task_id = ?, updated_at = CURRENT_TIMESTAMP
@@ -1021,9 +1037,53 @@ class Database:
 
     async def get_recent_logs(self, limit: int = 100) -> List[dict]:
         """Get recent logs with token email"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
+        return await self.query_logs(limit=limit)
+
+    async def query_logs(self, limit: int = 100, cursor: Optional[int] = None,
+                         token_id: Optional[int] = None, operation: Optional[str] = None,
+                         status_code: Optional[int] = None, since: Optional[str] = None,
+                         until: Optional[str] = None, task_id: Optional[str] = None) -> List[dict]:
+        """Get logs newest first with token email and task progress, keyset paginated
+
+        Args:
+            limit: Maximum rows to return
+            cursor: ID of the last log from the previous page; rows strictly older
+                than that log (by created_at, then id) are returned
+            token_id, operation, status_code, task_id: Exact-match filters
+            since, until: UTC timestamps ("YYYY-MM-DD HH:MM:SS"), since inclusive, until exclusive
+        """
+        conditions = []
+        params = []
+
+        if cursor is not None:
+            conditions.append(
+                "(rl.created_at, rl.id) < (SELECT created_at, id FROM request_logs WHERE id = ?)"
+            )
+            params.append(cursor)
+        if token_id is not None:
+            conditions.append("rl.token_id = ?")
+            params.append(token_id)
+        if operation is not None:
+            conditions.append("rl.operation = ?")
+            params.append(operation)
+        if status_code is not None:
+            conditions.append("rl.status_code = ?")
+            params.append(status_code)
+        if since is not None:
+            conditions.append("rl.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("rl.created_at < ?")
+            params.append(until)
+        if task_id is not None:
+            conditions.append("rl.task_id = ?")
+            params.append(task_id)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+
+        async with self._read() as db:
+            result = await db.execute(f"""
                 SELECT
                     rl.id,
                     rl.token_id,
@@ -1035,37 +1095,198 @@ class Database:
                     rl.duration,
                     rl.created_at,
                     t.email as token_email,
-                    t.username as token_username
+                    t.username as token_username,
+                    tk.progress as progress,
+                    tk.status as task_status
                 FROM request_logs rl
                 LEFT JOIN tokens t ON rl.token_id = t.id
-                ORDER BY rl.created_at DESC
+                LEFT JOIN tasks tk ON rl.task_id IS NOT NULL AND tk.task_id = rl.task_id
+                {where}
+                ORDER BY rl.created_at DESC, rl.id DESC
                 LIMIT ?
-            """, (limit,))
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+            """, params)
+            rows = await result.fetchall()
+
+        logs = [dict(row) for row in rows]
+        # Buffered progress is newer than the joined tasks row
+        for log in logs:
+            if log["task_id"]:
+                task = self.task_state.get(log["task_id"])
+                if task:
+                    log["progress"] = task.progress
+                    log["task_status"] = task.status
+        return logs
+
+    async def get_processing_log_for_task(self, task_id: str) -> Optional[dict]:
+        """Get the newest still-processing (status_code -1) log for a task"""
+        async with self._read() as db:
+            cursor = await db.execute("""
+                SELECT id, created_at FROM request_logs
+                WHERE task_id = ? AND status_code = -1
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+            """, (task_id,))
+            row = await cursor.fetchone()
+            return dict(row) if row else None
 
     async def clear_all_logs(self):
         """Clear all request logs"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("DELETE FROM request_logs")
             await db.commit()
 
+    # Retention operations
+    # Tables that can be pruned, with the extra condition rows must meet to be deleted
+    _PRUNABLE_TABLES = {
+        "request_logs": "",
+        # Never delete tasks that are still being polled
+        "tasks": "AND status != 'processing'",
+    }
+
+    async def get_prune_threshold_id(self, table: str, max_rows: int) -> int:
+        """Get the highest id that falls outside the newest max_rows rows (0 if none)"""
+        if table not in self._PRUNABLE_TABLES:
+            raise ValueError(f"Table {table} is not prunable")
+        async with self._read() as db:
+            cursor = await db.execute(
+                f"SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET ?", (max_rows,)
+            )
+            row = await cursor.fetchone()
+            return row["id"] if row else 0
+
+    async def prune_batch(self, table: str, cutoff: Optional[str], max_id: int, batch_size: int) -> int:
+        """Delete up to batch_size rows older than cutoff or with id <= max_id
+
+        Each call is its own short write transaction so other writers can
+        interleave between batches. Returns the number of rows deleted.
+        """
+        if table not in self._PRUNABLE_TABLES:
+            raise ValueError(f"Table {table} is not prunable")
+        extra = self._PRUNABLE_TABLES[table]
+        async with self._write() as db:
+            cursor = await db.execute(f"""
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE (id <= ? OR created_at < ?) {extra}
+                    ORDER BY id
+                    LIMIT ?
+                )
+            """, (max_id, cutoff, batch_size))
+            await db.commit()
+            return cursor.rowcount
+
+    async def get_storage_info(self) -> dict:
+        """Get page size, page/freelist counts and auto_vacuum mode"""
+        async with self._read() as db:
+            info = {}
+            for pragma in ("page_size", "page_count", "freelist_count", "auto_vacuum"):
+                cursor = await db.execute(f"PRAGMA {pragma}")
+                info[pragma] = (await cursor.fetchone())[0]
+            info["size_bytes"] = info["page_size"] * info["page_count"]
+            return info
+
+    async def incremental_vacuum(self, max_pages: int = 0) -> int:
+        """Return free pages to the filesystem (max_pages=0 frees all); returns bytes reclaimed
+
+        Does nothing unless the database uses auto_vacuum=INCREMENTAL.
+        """
+        async with self._write() as db:
+            cursor = await db.execute("PRAGMA auto_vacuum")
+            if (await cursor.fetchone())[0] != 2:
+                return 0
+            cursor = await db.execute("PRAGMA page_size")
+            page_size = (await cursor.fetchone())[0]
+            cursor = await db.execute("PRAGMA page_count")
+            before = (await cursor.fetchone())[0]
+            # Run as a script: executed as a statement it only frees a single page
+            await db.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            cursor = await db.execute("PRAGMA page_count")
+            after = (await cursor.fetchone())[0]
+            return (before - after) * page_size
+
+    async def enable_incremental_vacuum(self):
+        """Switch an existing database to auto_vacuum=INCREMENTAL (runs a full VACUUM)"""
+        async with self._write() as db:
+            await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await db.execute("VACUUM")
+
+    # Config snapshot
+    _CONFIG_TABLES = {
+        "admin": "admin_config",
+        "proxy": "proxy_config",
+        "watermark_free": "watermark_free_config",
+        "cache": "cache_config",
+        "generation": "generation_config",
+        "token_refresh": "token_refresh_config",
+        "call_logic": "call_logic_config",
+        "pow_proxy": "pow_proxy_config",
+    }
+
+    async def _fetch_config(self, db, section: str):
+        """Read one config row, falling back to defaults if it is missing"""
+        cursor = await db.execute(f"SELECT * FROM {self._CONFIG_TABLES[section]} WHERE id = 1")
+        row = await cursor.fetchone()
+        data = dict(row) if row else None
+
+        # If no row exists, return a default config
+        # This should not happen in normal operation as _ensure_config_rows should create it
+        if section == "admin":
+            return AdminConfig(**data) if data else AdminConfig(admin_username="admin", admin_password="admin", api_key="han1234")
+        if section == "proxy":
+            return ProxyConfig(**data) if data else ProxyConfig(proxy_enabled=False)
+        if section == "watermark_free":
+            return WatermarkFreeConfig(**data) if data else WatermarkFreeConfig(watermark_free_enabled=False, parse_method="third_party")
+        if section == "cache":
+            return CacheConfig(**data) if data else CacheConfig(cache_enabled=False, cache_timeout=600)
+        if section == "generation":
+            return GenerationConfig(**data) if data else GenerationConfig(image_timeout=300, video_timeout=3000)
+        if section == "token_refresh":
+            return TokenRefreshConfig(**data) if data else TokenRefreshConfig(at_auto_refresh_enabled=False)
+        if section == "call_logic":
+            if not data:
+                return CallLogicConfig(call_mode="default", polling_mode_enabled=False)
+            if not data.get("call_mode"):
+                data["call_mode"] = "polling" if data.get("polling_mode_enabled") else "default"
+            return CallLogicConfig(**data)
+        if section == "pow_proxy":
+            return PowProxyConfig(**data) if data else PowProxyConfig(pow_proxy_enabled=False, pow_proxy_url=None)
+        raise ValueError(f"Unknown config section: {section}")
+
+    async def load_config_snapshot(self) -> ConfigSnapshot:
+        """Read every config table and publish a fresh snapshot"""
+        async with self._read() as db:
+            sections = {section: await self._fetch_config(db, section) for section in self._CONFIG_TABLES}
+        version = self._config_snapshot.version + 1 if self._config_snapshot else 1
+        self._config_snapshot = ConfigSnapshot(version=version, **sections)
+        return self._config_snapshot
+
+    async def get_config_snapshot(self) -> ConfigSnapshot:
+        """Current config snapshot (loaded on first use, no I/O afterwards)"""
+        snapshot = self._config_snapshot
+        if snapshot is None:
+            snapshot = await self.load_config_snapshot()
+        return snapshot
+
+    async def _refresh_config_snapshot(self, db, section: str):
+        """Re-read one committed config row and swap in a new snapshot"""
+        snapshot = self._config_snapshot
+        if snapshot is None:
+            return
+        value = await self._fetch_config(db, section)
+        self._config_snapshot = snapshot.model_copy(update={section: value, "version": snapshot.version + 1})
+
     # Admin config operations
     async def get_admin_config(self) -> AdminConfig:
         """Get admin configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM admin_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                return AdminConfig(**dict(row))
-            # If no row exists, return a default config with placeholder values
-            # This should not happen in normal operation as _ensure_config_rows should create it
-            return AdminConfig(admin_username="admin", admin_password="admin", api_key="han1234")
-    
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.admin.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "admin")
+
     async def update_admin_config(self, config: AdminConfig):
         """Update admin configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE admin_config
                 SET admin_username = ?, admin_password = ?, api_key = ?, error_ban_threshold = ?,
@@ -1075,48 +1296,42 @@ class Database:
             """, (config.admin_username, config.admin_password, config.api_key, config.error_ban_threshold,
                   config.task_retry_enabled, config.task_max_retries, config.auto_disable_on_401))
             await db.commit()
+            await self._refresh_config_snapshot(db, "admin")
     
     # Proxy config operations
     async def get_proxy_config(self) -> ProxyConfig:
         """Get proxy configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM proxy_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                return ProxyConfig(**dict(row))
-            # If no row exists, return a default config
-            # This should not happen in normal operation as _ensure_config_rows should create it
-            return ProxyConfig(proxy_enabled=False)
-    
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.proxy.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "proxy")
+
     async def update_proxy_config(self, enabled: bool, proxy_url: Optional[str]):
         """Update proxy configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE proxy_config
                 SET proxy_enabled = ?, proxy_url = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = 1
             """, (enabled, proxy_url))
             await db.commit()
+            await self._refresh_config_snapshot(db, "proxy")
 
     # Watermark-free config operations
     async def get_watermark_free_config(self) -> WatermarkFreeConfig:
         """Get watermark-free configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM watermark_free_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                return WatermarkFreeConfig(**dict(row))
-            # If no row exists, return a default config
-            # This should not happen in normal operation as _ensure_config_rows should create it
-            return WatermarkFreeConfig(watermark_free_enabled=False, parse_method="third_party")
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.watermark_free.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "watermark_free")
 
     async def update_watermark_free_config(self, enabled: bool, parse_method: str = None,
                                           custom_parse_url: str = None, custom_parse_token: str = None,
                                           fallback_on_failure: bool = None):
         """Update watermark-free configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             if parse_method is None and custom_parse_url is None and custom_parse_token is None and fallback_on_failure is None:
                 # Only update enabled status
                 await db.execute("""
@@ -1134,25 +1349,21 @@ class Database:
                 """, (enabled, parse_method or "third_party", custom_parse_url, custom_parse_token,
                       fallback_on_failure if fallback_on_failure is not None else True))
             await db.commit()
+            await self._refresh_config_snapshot(db, "watermark_free")
 
     # Cache config operations
     async def get_cache_config(self) -> CacheConfig:
         """Get cache configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM cache_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                return CacheConfig(**dict(row))
-            # If no row exists, return a default config
-            # This should not happen in normal operation as _ensure_config_rows should create it
-            return CacheConfig(cache_enabled=False, cache_timeout=600)
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.cache.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "cache")
 
     async def update_cache_config(self, enabled: bool = None, timeout: int = None, base_url: Optional[str] = None):
         """Update cache configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Get current config first
-            db.row_factory = aiosqlite.Row
             cursor = await db.execute("SELECT * FROM cache_config WHERE id = 1")
             row = await cursor.fetchone()
 
@@ -1176,25 +1387,21 @@ class Database:
                 WHERE id = 1
             """, (new_enabled, new_timeout, new_base_url))
             await db.commit()
+            await self._refresh_config_snapshot(db, "cache")
 
     # Generation config operations
     async def get_generation_config(self) -> GenerationConfig:
         """Get generation configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM generation_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                return GenerationConfig(**dict(row))
-            # If no row exists, return a default config
-            # This should not happen in normal operation as _ensure_config_rows should create it
-            return GenerationConfig(image_timeout=300, video_timeout=3000)
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.generation.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "generation")
 
     async def update_generation_config(self, image_timeout: int = None, video_timeout: int = None):
         """Update generation configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Get current config first
-            db.row_factory = aiosqlite.Row
             cursor = await db.execute("SELECT * FROM generation_config WHERE id = 1")
             row = await cursor.fetchone()
 
@@ -1213,76 +1420,67 @@ class Database:
                 WHERE id = 1
             """, (new_image_timeout, new_video_timeout))
             await db.commit()
+            await self._refresh_config_snapshot(db, "generation")
 
     # Token refresh config operations
     async def get_token_refresh_config(self) -> TokenRefreshConfig:
         """Get token refresh configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM token_refresh_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                return TokenRefreshConfig(**dict(row))
-            # If no row exists, return a default config
-            # This should not happen in normal operation as _ensure_config_rows should create it
-            return TokenRefreshConfig(at_auto_refresh_enabled=False)
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.token_refresh.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "token_refresh")
 
     async def update_token_refresh_config(self, at_auto_refresh_enabled: bool):
         """Update token refresh configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             await db.execute("""
                 UPDATE token_refresh_config
                 SET at_auto_refresh_enabled = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = 1
             """, (at_auto_refresh_enabled,))
             await db.commit()
+            await self._refresh_config_snapshot(db, "token_refresh")
 
     # Call logic config operations
-    async def get_call_logic_config(self) -> "CallLogicConfig":
+    async def get_call_logic_config(self) -> CallLogicConfig:
         """Get call logic configuration"""
-        from .models import CallLogicConfig
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM call_logic_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                row_dict = dict(row)
-                if not row_dict.get("call_mode"):
-                    row_dict["call_mode"] = "polling" if row_dict.get("polling_mode_enabled") else "default"
-                return CallLogicConfig(**row_dict)
-            return CallLogicConfig(call_mode="default", polling_mode_enabled=False)
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.call_logic.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "call_logic")
 
     async def update_call_logic_config(self, call_mode: str):
         """Update call logic configuration"""
         normalized = "polling" if call_mode == "polling" else "default"
         polling_mode_enabled = normalized == "polling"
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Use INSERT OR REPLACE to ensure the row exists
             await db.execute("""
                 INSERT OR REPLACE INTO call_logic_config (id, call_mode, polling_mode_enabled, updated_at)
                 VALUES (1, ?, ?, CURRENT_TIMESTAMP)
             """, (normalized, polling_mode_enabled))
             await db.commit()
+            await self._refresh_config_snapshot(db, "call_logic")
 
     # POW proxy config operations
-    async def get_pow_proxy_config(self) -> "PowProxyConfig":
+    async def get_pow_proxy_config(self) -> PowProxyConfig:
         """Get POW proxy configuration"""
-        from .models import PowProxyConfig
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM pow_proxy_config WHERE id = 1")
-            row = await cursor.fetchone()
-            if row:
-                return PowProxyConfig(**dict(row))
-            return PowProxyConfig(pow_proxy_enabled=False, pow_proxy_url=None)
+        snapshot = self._config_snapshot
+        if snapshot is not None:
+            return snapshot.pow_proxy.model_copy()
+        async with self._read() as db:
+            return await self._fetch_config(db, "pow_proxy")
 
     async def update_pow_proxy_config(self, pow_proxy_enabled: bool, pow_proxy_url: Optional[str] = None):
         """Update POW proxy configuration"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._write() as db:
             # Use INSERT OR REPLACE to ensure the row exists
             await db.execute("""
                 INSERT OR REPLACE INTO pow_proxy_config (id, pow_proxy_enabled, pow_proxy_url, updated_at)
                 VALUES (1, ?, ?, CURRENT_TIMESTAMP)
             """, (pow_proxy_enabled, pow_proxy_url))
             await db.commit()
+            await self._refresh_config_snapshot(db, "pow_proxy")
 
@@ -0,0 +1,337 @@
+"""Versioned schema migrations
+
+Each migration brings the schema from ``version - 1`` to ``version``. The
+applied version is stored in ``PRAGMA user_version``, so startup only runs
+the steps a database has not seen yet. Append new migrations to the end of
+``MIGRATIONS``; never edit or reorder one that has shipped.
+"""
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List
+
+import aiosqlite
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A single schema step"""
+    version: int
+    description: str
+    apply: Callable[[aiosqlite.Connection], Awaitable[None]]
+
+
+async def _columns(db: aiosqlite.Connection, table_name: str) -> set:
+    cursor = await db.execute(f"PRAGMA table_info({table_name})")
+    return {row[1] for row in await cursor.fetchall()}
+
+
+async def _add_missing_columns(db: aiosqlite.Connection, table_name: str, columns: list):
+    """Add columns that databases created by older releases may lack"""
+    existing = await _columns(db, table_name)
+    for col_name, col_type in columns:
+        if col_name not in existing:
+            await db.execute(f"ALTER TABLE {table_name} ADD COLUMN {col_name} {col_type}")
+            print(f"  ✓ Added column '{col_name}' to {table_name} table")
+
+
+async def _v1_base_schema(db: aiosqlite.Connection):
+    """Create all tables (no-op for tables that already exist)"""
+    # Tokens table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token TEXT UNIQUE NOT NULL,
+            email TEXT NOT NULL,
+            username TEXT NOT NULL,
+            name TEXT NOT NULL,
+            st TEXT,
+            rt TEXT,
+            client_id TEXT,
+            proxy_url TEXT,
+            remark TEXT,
+            expiry_time TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            cooled_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP,
+            use_count INTEGER DEFAULT 0,
+            plan_type TEXT,
+            plan_title TEXT,
+            subscription_end TIMESTAMP,
+            sora2_supported BOOLEAN,
+            sora2_invite_code TEXT,
+            sora2_redeemed_count INTEGER DEFAULT 0,
+            sora2_total_count INTEGER DEFAULT 0,
+            sora2_remaining_count INTEGER DEFAULT 0,
+            sora2_cooldown_until TIMESTAMP,
+            image_enabled BOOLEAN DEFAULT 1,
+            video_enabled BOOLEAN DEFAULT 1,
+            image_concurrency INTEGER DEFAULT -1,
+            video_concurrency INTEGER DEFAULT -1,
+            is_expired BOOLEAN DEFAULT 0
+        )
+    """)
+
+    # Token stats table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS token_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_id INTEGER NOT NULL,
+            image_count INTEGER DEFAULT 0,
+            video_count INTEGER DEFAULT 0,
+            error_count INTEGER DEFAULT 0,
+            last_error_at TIMESTAMP,
+            today_image_count INTEGER DEFAULT 0,
+            today_video_count INTEGER DEFAULT 0,
+            today_error_count INTEGER DEFAULT 0,
+            today_date DATE,
+            consecutive_error_count INTEGER DEFAULT 0,
+            FOREIGN KEY (token_id) REFERENCES tokens(id)
+        )
+    """)
+
+    # Tasks table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id TEXT UNIQUE NOT NULL,
+            token_id INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'processing',
+            progress FLOAT DEFAULT 0,
+            result_urls TEXT,
+            error_message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            retry_count INTEGER DEFAULT 0,
+            FOREIGN KEY (token_id) REFERENCES tokens(id)
+        )
+    """)
+
+    # Request logs table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS request_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_id INTEGER,
+            task_id TEXT,
+            operation TEXT NOT NULL,
+            request_body TEXT,
+            response_body TEXT,
+            status_code INTEGER NOT NULL,
+            duration FLOAT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (token_id) REFERENCES tokens(id)
+        )
+    """)
+
+    # Admin config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS admin_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            admin_username TEXT DEFAULT 'admin',
+            admin_password TEXT DEFAULT 'admin',
+            api_key TEXT DEFAULT 'han1234',
+            error_ban_threshold INTEGER DEFAULT 3,
+            task_retry_enabled BOOLEAN DEFAULT 1,
+            task_max_retries INTEGER DEFAULT 3,
+            auto_disable_on_401 BOOLEAN DEFAULT 1,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Proxy config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS proxy_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            proxy_enabled BOOLEAN DEFAULT 0,
+            proxy_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Watermark-free config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS watermark_free_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            watermark_free_enabled BOOLEAN DEFAULT 0,
+            parse_method TEXT DEFAULT 'third_party',
+            custom_parse_url TEXT,
+            custom_parse_token TEXT,
+            fallback_on_failure BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Cache config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS cache_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            cache_enabled BOOLEAN DEFAULT 0,
+            cache_timeout INTEGER DEFAULT 600,
+            cache_base_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Generation config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS generation_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            image_timeout INTEGER DEFAULT 300,
+            video_timeout INTEGER DEFAULT 3000,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Token refresh config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS token_refresh_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            at_auto_refresh_enabled BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Call logic config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS call_logic_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            call_mode TEXT DEFAULT 'default',
+            polling_mode_enabled BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # POW proxy config table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS pow_proxy_config (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            pow_proxy_enabled BOOLEAN DEFAULT 0,
+            pow_proxy_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+async def _v2_legacy_columns(db: aiosqlite.Connection):
+    """Add columns introduced after the first releases
+
+    Unversioned databases may predate any of these, so each one is checked;
+    databases created by v1 already have them all.
+    """
+    await _add_missing_columns(db, "tokens", [
+        ("sora2_supported", "BOOLEAN"),
+        ("sora2_invite_code", "TEXT"),
+        ("sora2_redeemed_count", "INTEGER DEFAULT 0"),
+        ("sora2_total_count", "INTEGER DEFAULT 0"),
+        ("sora2_remaining_count", "INTEGER DEFAULT 0"),
+        ("sora2_cooldown_until", "TIMESTAMP"),
+        ("image_enabled", "BOOLEAN DEFAULT 1"),
+        ("video_enabled", "BOOLEAN DEFAULT 1"),
+        ("image_concurrency", "INTEGER DEFAULT -1"),
+        ("video_concurrency", "INTEGER DEFAULT -1"),
+        ("client_id", "TEXT"),
+        ("proxy_url", "TEXT"),
+        ("is_expired", "BOOLEAN DEFAULT 0"),
+    ])
+    await _add_missing_columns(db, "token_stats", [
+        ("today_image_count", "INTEGER DEFAULT 0"),
+        ("today_video_count", "INTEGER DEFAULT 0"),
+        ("today_error_count", "INTEGER DEFAULT 0"),
+        ("today_date", "DATE"),
+        ("consecutive_error_count", "INTEGER DEFAULT 0"),
+    ])
+    await _add_missing_columns(db, "tasks", [
+        ("retry_count", "INTEGER DEFAULT 0"),
+    ])
+    await _add_missing_columns(db, "admin_config", [
+        ("admin_username", "TEXT DEFAULT 'admin'"),
+        ("admin_password", "TEXT DEFAULT 'admin'"),
+        ("api_key", "TEXT DEFAULT 'han1234'"),
+        ("task_retry_enabled", "BOOLEAN DEFAULT 1"),
+        ("task_max_retries", "INTEGER DEFAULT 3"),
+        ("auto_disable_on_401", "BOOLEAN DEFAULT 1"),
+    ])
+    await _add_missing_columns(db, "watermark_free_config", [
+        ("parse_method", "TEXT DEFAULT 'third_party'"),
+        ("custom_parse_url", "TEXT"),
+        ("custom_parse_token", "TEXT"),
+        ("fallback_on_failure", "BOOLEAN DEFAULT 1"),
+    ])
+    await _add_missing_columns(db, "request_logs", [
+        ("task_id", "TEXT"),
+        ("updated_at", "TIMESTAMP"),
+    ])
+
+
+async def _v3_indexes(db: aiosqlite.Connection):
+    """Create lookup indexes"""
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_task_id ON tasks(task_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_task_status ON tasks(status)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_task_created_at ON tasks(created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_token_active ON tokens(is_active)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_token_stats_token_id ON token_stats(token_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_request_logs_created_at ON request_logs(created_at)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_request_logs_task_id ON request_logs(task_id)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_request_logs_token_created ON request_logs(token_id, created_at)")
+
+
+async def _v4_background_jobs(db: aiosqlite.Connection):
+    """Create the durable background job queue
+
+    Rows exist only while a job is queued or running; times are Unix epoch
+    seconds. Tasks left processing without a job are enqueued at startup.
+    """
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS background_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id TEXT UNIQUE NOT NULL,
+            token_id INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            log_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            heartbeat_at REAL,
+            submitted_at REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_background_jobs_status ON background_jobs(status, id)")
+
+
+async def _v5_media_urls(db: aiosqlite.Connection):
+    """Map cached media URLs to their content-addressed files
+
+    url_key is the MD5 of the source URL and content the file's path below
+    the cache directory; rows are dropped when that file leaves the cache.
+    """
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS media_urls (
+            url_key TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_media_urls_content ON media_urls(content)")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Base schema", _v1_base_schema),
+    Migration(2, "Columns added by earlier releases", _v2_legacy_columns),
+    Migration(3, "Lookup indexes", _v3_indexes),
+    Migration(4, "Durable background job queue", _v4_background_jobs),
+    Migration(5, "Cached media URL map", _v5_media_urls),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
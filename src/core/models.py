@@ -1,7 +1,7 @@
 """Data models"""
 from datetime import datetime
 from typing import Optional, List, Union
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class Token(BaseModel):
     """Token model"""
@@ -70,6 +70,22 @@ class Task(BaseModel):
     created_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
+class BackgroundJob(BaseModel):
+    """Durable background polling job for a task"""
+    id: Optional[int] = None
+    task_id: str
+    token_id: int
+    model: str
+    prompt: str
+    log_id: Optional[int] = None
+    status: str = "queued"  # queued/running
+    attempts: int = 0
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[float] = None  # Unix time
+    heartbeat_at: Optional[float] = None  # Unix time
+    submitted_at: float  # Unix time the generation was submitted
+    created_at: Optional[datetime] = None
+
 class RequestLog(BaseModel):
     """Request log model"""
     id: Optional[int] = None
@@ -154,6 +170,25 @@ class PowProxyConfig(BaseModel):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+class ConfigSnapshot(BaseModel):
+    """Immutable view of all config tables
+
+    Replaced as a whole (new object, higher version) whenever a config
+    table is written; readers hold a reference and never need a lock.
+    Treat the nested configs as read-only.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    version: int = 0
+    admin: AdminConfig
+    proxy: ProxyConfig
+    watermark_free: WatermarkFreeConfig
+    cache: CacheConfig
+    generation: GenerationConfig
+    token_refresh: TokenRefreshConfig
+    call_logic: CallLogicConfig
+    pow_proxy: PowProxyConfig
+
 # API Request/Response models
 class ChatMessage(BaseModel):
     role: str
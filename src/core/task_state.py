@@ -0,0 +1,91 @@
+"""In-memory state of in-flight tasks"""
+from typing import Dict, List, Optional, Set, Tuple
+from .models import Task
+
+
+class TaskStateTable:
+    """Latest status and progress of tasks created by this process
+
+    Database.create_task starts tracking a task and Database.update_task
+    records intermediate progress here instead of committing it. Dirty
+    progress is written in one batch by Database.flush_task_progress;
+    terminal transitions are committed immediately and end tracking. All
+    access happens on the event loop, so plain dict operations are enough.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, Task] = {}
+        self._dirty: Set[str] = set()
+        # Metrics
+        self.progress_updates = 0
+        self.coalesced_updates = 0
+        self.flush_count = 0
+        self.flushed_rows = 0
+        self.flush_errors = 0
+        self.last_flush_at: Optional[float] = None
+        self.last_flush_duration = 0.0
+
+    def track(self, task: Task):
+        """Start tracking a task"""
+        self._tasks[task.task_id] = task
+
+    def get(self, task_id: str) -> Optional[Task]:
+        """Get a copy of the in-memory task"""
+        task = self._tasks.get(task_id)
+        return task.model_copy() if task else None
+
+    def set_progress(self, task_id: str, progress: float) -> bool:
+        """Record intermediate progress
+
+        Returns:
+            False if the task is not tracked (caller must write it through)
+        """
+        task = self._tasks.get(task_id)
+        if task is None:
+            return False
+        progress = float(progress)
+        self.progress_updates += 1
+        if task.status == "processing" and task.progress == progress:
+            self.coalesced_updates += 1
+            return True
+        if task_id in self._dirty:
+            # Overwrites a value that was never written
+            self.coalesced_updates += 1
+        task.status = "processing"
+        task.progress = progress
+        self._dirty.add(task_id)
+        return True
+
+    def finish(self, task_id: str):
+        """Stop tracking a task after its terminal state was committed"""
+        self._tasks.pop(task_id, None)
+        self._dirty.discard(task_id)
+
+    def take_dirty(self) -> List[Tuple[float, str]]:
+        """Return (progress, task_id) pairs to persist and clear the dirty set"""
+        items = [(self._tasks[task_id].progress, task_id) for task_id in self._dirty if task_id in self._tasks]
+        self._dirty.clear()
+        return items
+
+    def requeue(self, items: List[Tuple[float, str]]):
+        """Mark tasks dirty again after a failed flush"""
+        for _, task_id in items:
+            if task_id in self._tasks:
+                self._dirty.add(task_id)
+
+    def get_stats(self) -> dict:
+        """Get buffer metrics"""
+        return {
+            "tracked_tasks": len(self._tasks),
+            "pending_writes": len(self._dirty),
+            "progress_updates": self.progress_updates,
+            "coalesced_updates": self.coalesced_updates,
+            "flush_count": self.flush_count,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+            "last_flush_at": self.last_flush_at,
+            "last_flush_duration_ms": round(self.last_flush_duration * 1000, 2),
+        }
+
+    def __len__(self) -> int:
+        return len(self._tasks)
@@ -0,0 +1,67 @@
+"""In-memory token registry"""
+from datetime import datetime
+from typing import Dict, List, Optional
+from .models import Token
+
+
+def _is_past(value: Optional[datetime], now: datetime) -> bool:
+    """Compare a stored timestamp with now, tolerating timezone-aware values"""
+    if value.tzinfo is not None:
+        return value <= datetime.now(value.tzinfo)
+    return value <= now
+
+
+class TokenRegistry:
+    """Authoritative in-memory copy of the tokens table
+
+    Loaded once at startup and kept current by Database, which writes every
+    committed token row through to the registry. Token selection reads it
+    instead of querying SQLite. All access happens on the event loop, so
+    plain dict operations are enough.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[int, Token] = {}
+        self.loaded = False
+        # Bumped on every change; useful for cheap "has anything changed" checks
+        self.version = 0
+
+    def load(self, tokens: List[Token]):
+        """Replace registry contents"""
+        self._tokens = {token.id: token for token in tokens}
+        self.loaded = True
+        self.version += 1
+
+    def put(self, token: Token):
+        """Insert or replace a token"""
+        self._tokens[token.id] = token
+        self.version += 1
+
+    def remove(self, token_id: int):
+        """Remove a token"""
+        if self._tokens.pop(token_id, None) is not None:
+            self.version += 1
+
+    def get(self, token_id: int) -> Optional[Token]:
+        """Get token by ID"""
+        return self._tokens.get(token_id)
+
+    def get_all(self) -> List[Token]:
+        """Get all tokens"""
+        return list(self._tokens.values())
+
+    def get_active(self) -> List[Token]:
+        """Get active tokens (enabled, not cooled down, not expired)
+
+        Same rules as Database.get_active_tokens.
+        """
+        now = datetime.now()
+        return [
+            token for token in self._tokens.values()
+            if token.is_active
+            and (token.cooled_until is None or _is_past(token.cooled_until, now))
+            and token.expiry_time is not None and not _is_past(token.expiry_time, now)
+        ]
+
+    def __len__(self) -> int:
+        return len(self._tokens)
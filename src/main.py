@@ -18,8 +18,13 @@ from .services.load_balancer import LoadBalancer
 from .services.sora_client import SoraClient
 from .services.generation_handler import GenerationHandler
 from .services.concurrency_manager import ConcurrencyManager
+from .services.retention import RetentionManager
+from .services.task_progress import TaskProgressFlusher
+from .services.http_pool import http_pool
 from .api import routes as api_routes
 from .api import admin as admin_routes
+from .api import media as media_routes
+from .services.media_server import MediaServer
 
 # Initialize scheduler (uses system local timezone by default)
 scheduler = AsyncIOScheduler()
@@ -48,25 +53,26 @@ concurrency_manager = ConcurrencyManager()
 load_balancer = LoadBalancer(token_manager, concurrency_manager)
 sora_client = SoraClient(proxy_manager)
 generation_handler = GenerationHandler(sora_client, token_manager, load_balancer, db, proxy_manager, concurrency_manager)
+retention_manager = RetentionManager(db)
+task_progress_flusher = TaskProgressFlusher(db)
+media_server = MediaServer(generation_handler.file_cache)
 
 # Set dependencies for route modules
 api_routes.set_generation_handler(generation_handler)
-admin_routes.set_dependencies(token_manager, proxy_manager, db, generation_handler, concurrency_manager, scheduler)
+media_routes.set_media_server(media_server)
+admin_routes.set_dependencies(token_manager, proxy_manager, db, generation_handler, concurrency_manager, scheduler, retention_manager,
+                             task_progress_flusher, media_server)
 
 # Include routers
 app.include_router(api_routes.router)
 app.include_router(admin_routes.router)
+app.include_router(media_routes.router)  # Cached files under /tmp, looked up in the file cache index
 
 # Static files
 static_dir = Path(__file__).parent.parent / "static"
 static_dir.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
-# Cache files (tmp directory)
-tmp_dir = Path(__file__).parent.parent / "tmp"
-tmp_dir.mkdir(exist_ok=True)
-app.mount("/tmp", StaticFiles(directory=str(tmp_dir)), name="tmp")
-
 # Frontend routes
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -102,8 +108,10 @@ async def startup_event():
     # Check if database exists
     is_first_startup = not db.db_exists()
 
-    # Initialize database tables
-    await db.init_db()
+    # Create tables / apply pending schema migrations (tracked in PRAGMA user_version)
+    applied = await db.init_db()
+    if applied:
+        print(f"✓ Database schema migrated to v{applied[-1]} ({len(applied)} step(s))")
 
     # Handle database initialization based on startup type
     if is_first_startup:
@@ -111,18 +119,20 @@ async def startup_event():
         await db.init_config_from_toml(config_dict, is_first_startup=True)
         print("✓ Database and configuration initialized successfully.")
     else:
-        print("🔄 Existing database detected. Checking for missing tables and columns...")
         await db.check_and_migrate_db(config_dict)
-        print("✓ Database migration check completed.")
+        print(f"✓ Existing database ready (schema v{await db.get_schema_version()})")
+
+    # Load all config tables into the in-memory snapshot (swapped on every config write)
+    snapshot = await db.load_config_snapshot()
 
     # Load admin credentials and API key from database
-    admin_config = await db.get_admin_config()
+    admin_config = snapshot.admin
     config.set_admin_username_from_db(admin_config.admin_username)
     config.set_admin_password_from_db(admin_config.admin_password)
     config.api_key = admin_config.api_key
 
     # Load cache configuration from database
-    cache_config = await db.get_cache_config()
+    cache_config = snapshot.cache
     config.set_cache_enabled(cache_config.cache_enabled)
     config.set_cache_timeout(cache_config.cache_timeout)
     config.set_cache_base_url(cache_config.cache_base_url or "")
@@ -131,27 +141,48 @@ async def startup_event():
     generation_handler.file_cache.set_timeout(cache_config.cache_timeout)
 
     # Load generation configuration from database
-    generation_config = await db.get_generation_config()
+    generation_config = snapshot.generation
     config.set_image_timeout(generation_config.image_timeout)
     config.set_video_timeout(generation_config.video_timeout)
 
     # Load token refresh configuration from database
-    token_refresh_config = await db.get_token_refresh_config()
+    token_refresh_config = snapshot.token_refresh
     config.set_at_auto_refresh_enabled(token_refresh_config.at_auto_refresh_enabled)
 
     # Load call logic configuration from database
-    call_logic_config = await db.get_call_logic_config()
+    call_logic_config = snapshot.call_logic
     config.set_call_logic_mode(call_logic_config.call_mode)
     print(f"✓ Call logic mode: {call_logic_config.call_mode}")
 
+    # Load tokens into the in-memory registry (kept current by Database writes)
+    token_count = await db.load_token_registry()
+    print(f"✓ Token registry loaded with {token_count} tokens")
+
     # Initialize concurrency manager with all tokens
-    all_tokens = await db.get_all_tokens()
+    all_tokens = db.token_registry.get_all()
     await concurrency_manager.initialize(all_tokens)
     print(f"✓ Concurrency manager initialized with {len(all_tokens)} tokens")
 
-    # Start file cache cleanup task
+    # Start background job workers, resuming tasks left in flight by the previous run
+    recovered = await generation_handler.job_queue.start()
+    print(f"✓ Background job queue started ({recovered} task(s) resumed)")
+
+    # Load cached media URLs and start file cache cleanup task
+    cached_urls = await generation_handler.file_cache.load_url_map()
+    print(f"✓ File cache loaded ({cached_urls} cached URL(s))")
     await generation_handler.file_cache.start_cleanup_task()
 
+    # Start token stats write-behind flusher
+    await token_manager.stats_buffer.start()
+
+    # Start coalesced task progress flusher
+    await task_progress_flusher.start()
+
+    # Start request_logs/tasks retention job
+    if config.retention_enabled:
+        await retention_manager.start()
+        print(f"✓ Retention job started (every {retention_manager.interval}s)")
+
     # Start token refresh scheduler if enabled
     if token_refresh_config.at_auto_refresh_enabled:
         scheduler.add_job(
@@ -169,9 +200,21 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    # Running jobs stay leased in the database and resume on the next start
+    await generation_handler.job_queue.stop()
     await generation_handler.file_cache.stop_cleanup_task()
+    await generation_handler.upstream_poller.stop()
+    await retention_manager.stop()
+    await sora_client.sentinel_cache.stop()
+    await sora_client.browser_pool.stop()
+    sora_client.pow_solver.shutdown()
+    await http_pool.stop()
     if scheduler.running:
         scheduler.shutdown()
+    # Flush buffered token stats before closing the database
+    await token_manager.stats_buffer.stop()
+    await task_progress_flusher.stop()
+    await db.close()
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,377 @@
+"""Warm Playwright browser pool for sentinel token acquisition"""
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, Optional, Set
+from uuid import uuid4
+from ..core.config import config
+from ..core.logger import debug_logger
+
+try:
+    from playwright.async_api import async_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+
+SDK_READY_JS = "() => typeof window.SentinelSDK !== 'undefined'"
+SDK_TOKEN_JS = "([flow, deviceId]) => window.SentinelSDK.token(flow, deviceId)"
+# Chromium only; returns 0 elsewhere
+JS_HEAP_JS = "() => (performance.memory && performance.memory.usedJSHeapSize) || 0"
+
+
+class WarmContext:
+    """A browser context with the target page loaded and SentinelSDK ready"""
+
+    def __init__(self, proxy_url: Optional[str], context, page, device_id: str):
+        self.proxy_url = proxy_url
+        self.context = context
+        self.page = page
+        self.device_id = device_id
+        self.active = 0
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.baseline_heap = 0
+        self.heap = 0
+        # Set when the context must be closed once idle (use limit, memory, errors)
+        self.retire_reason: Optional[str] = None
+
+    async def close(self):
+        try:
+            await self.context.close()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """Bounded pool of long-lived browser contexts, one per proxy
+
+    A single Chromium process hosts up to ``max_contexts`` contexts. Each
+    context keeps the target page open with SentinelSDK loaded and serves
+    up to ``max_concurrent_per_context`` token calls at once. When every
+    context is busy (or the pool is full and nothing is idle) callers queue
+    until a slot frees or ``acquire_timeout`` passes. Contexts are retired
+    after ``max_uses`` tokens, when the page's JS heap grows by more than
+    ``max_heap_growth_mb``, or when a health check or token call fails.
+
+    ``target_url`` can point at a local stub page that defines
+    ``window.SentinelSDK`` to exercise the pool without network access.
+    """
+
+    def __init__(self, target_url: Optional[str] = None, user_agent: str = DEFAULT_USER_AGENT,
+                 max_contexts: Optional[int] = None, max_concurrent_per_context: Optional[int] = None,
+                 max_uses: Optional[int] = None, max_heap_growth_mb: Optional[int] = None,
+                 acquire_timeout: Optional[float] = None, sdk_timeout: Optional[float] = None,
+                 health_check_interval: Optional[float] = None):
+        self.target_url = target_url or config.browser_pool_target_url
+        self.user_agent = user_agent
+        self.max_contexts = max_contexts or config.browser_pool_max_contexts
+        self.max_concurrent_per_context = max_concurrent_per_context or config.browser_pool_max_concurrent_per_context
+        self.max_uses = max_uses or config.browser_pool_max_uses
+        self.max_heap_growth = (max_heap_growth_mb or config.browser_pool_max_heap_growth_mb) * 1024 * 1024
+        self.acquire_timeout = acquire_timeout or config.browser_pool_acquire_timeout
+        self.sdk_timeout = sdk_timeout or config.browser_pool_sdk_timeout
+        self.health_check_interval = health_check_interval or config.browser_pool_health_check_interval
+
+        self._playwright = None
+        self._browser = None
+        self._contexts: Dict[Optional[str], WarmContext] = {}
+        # Proxies whose context is being created, so concurrent callers wait instead of duplicating it
+        self._warming: Set[Optional[str]] = set()
+        self._closing: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        self._changed = asyncio.Condition(self._lock)
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+        # Metrics
+        self._tokens_served = 0
+        self._token_failures = 0
+        self._contexts_created = 0
+        self._contexts_retired: Dict[str, int] = {}
+        self._queued = 0
+        self._max_queued = 0
+        self._acquire_timeouts = 0
+        self._total_wait = 0.0
+        self._total_warmup = 0.0
+
+    # Lifecycle
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        launch_args = {
+            "headless": True,
+            "args": ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
+        }
+        if sys.platform == "win32":
+            # Chromium on Windows needs a global proxy for per-context proxies to apply
+            launch_args["proxy"] = {"server": "http://per-context"}
+        self._browser = await self._playwright.chromium.launch(**launch_args)
+        # Contexts belong to the old process; drop them
+        self._contexts.clear()
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        """Close all contexts and the browser"""
+        self._closed = True
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        async with self._lock:
+            contexts = list(self._contexts.values())
+            self._contexts.clear()
+            self._changed.notify_all()
+        for ctx in contexts:
+            await ctx.close()
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _create_context(self, proxy_url: Optional[str]) -> WarmContext:
+        """Open a context, load the target page and wait for SentinelSDK"""
+        start = time.monotonic()
+        options = {"user_agent": self.user_agent}
+        if proxy_url:
+            options["proxy"] = {"server": proxy_url}
+        context = await self._browser.new_context(**options)
+        try:
+            page = await context.new_page()
+            debug_logger.log_info(f"[BrowserPool] Warming context for proxy={proxy_url or 'direct'}...")
+            await page.goto(self.target_url, wait_until="domcontentloaded", timeout=self.sdk_timeout * 1000)
+            await page.wait_for_function(SDK_READY_JS, timeout=self.sdk_timeout * 1000, polling=500)
+
+            device_id = None
+            for cookie in await context.cookies():
+                if cookie.get("name") == "oai-did":
+                    device_id = cookie.get("value")
+                    break
+            ctx = WarmContext(proxy_url, context, page, device_id or str(uuid4()))
+            ctx.baseline_heap = ctx.heap = await page.evaluate(JS_HEAP_JS)
+        except Exception:
+            await context.close()
+            raise
+        self._contexts_created += 1
+        self._total_warmup += time.monotonic() - start
+        debug_logger.log_info(f"[BrowserPool] Context ready in {time.monotonic() - start:.1f}s (device_id={ctx.device_id})")
+        return ctx
+
+    def _retire(self, ctx: WarmContext, reason: str):
+        if ctx.retire_reason is None:
+            ctx.retire_reason = reason
+            self._contexts_retired[reason] = self._contexts_retired.get(reason, 0) + 1
+            debug_logger.log_info(f"[BrowserPool] Retiring context for proxy={ctx.proxy_url or 'direct'}: {reason}")
+
+    def _discard(self, ctx: WarmContext):
+        """Remove a context from the pool (lock held) and close it in the background"""
+        if self._contexts.get(ctx.proxy_url) is ctx:
+            del self._contexts[ctx.proxy_url]
+            self._changed.notify_all()
+        task = asyncio.create_task(ctx.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    # Acquire / release
+    async def _acquire(self, proxy_url: Optional[str]) -> WarmContext:
+        """Get a context for proxy_url with a free slot, creating or queueing as needed"""
+        deadline = time.monotonic() + self.acquire_timeout
+        queued = False
+        try:
+            while True:
+                async with self._lock:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is closed")
+                    await self._ensure_browser()
+
+                    ctx = self._contexts.get(proxy_url)
+                    if ctx and ctx.retire_reason and ctx.active == 0:
+                        self._discard(ctx)
+                        ctx = None
+                    if ctx and not ctx.retire_reason and ctx.active < self.max_concurrent_per_context:
+                        ctx.active += 1
+                        return ctx
+
+                    can_create = ctx is None and proxy_url not in self._warming
+                    if can_create and len(self._contexts) + len(self._warming) >= self.max_contexts:
+                        # Make room by dropping the least recently used idle context
+                        idle = [c for c in self._contexts.values() if c.active == 0]
+                        if idle:
+                            self._discard(min(idle, key=lambda c: c.last_used_at))
+                        else:
+                            can_create = False
+
+                    if can_create:
+                        self._warming.add(proxy_url)
+                    else:
+                        if not queued:
+                            queued = True
+                            self._queued += 1
+                            self._max_queued = max(self._max_queued, self._queued)
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._acquire_timeouts += 1
+                            raise asyncio.TimeoutError("Timed out waiting for a browser context")
+                        try:
+                            await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+
+                # Warm up outside the lock so other proxies are not blocked
+                try:
+                    ctx = await self._create_context(proxy_url)
+                except BaseException:
+                    async with self._lock:
+                        self._warming.discard(proxy_url)
+                        self._changed.notify_all()
+                    raise
+                async with self._lock:
+                    self._warming.discard(proxy_url)
+                    self._contexts[proxy_url] = ctx
+                    ctx.active += 1
+                    self._changed.notify_all()
+                    return ctx
+        finally:
+            if queued:
+                self._queued -= 1
+
+    async def _release(self, ctx: WarmContext):
+        async with self._lock:
+            ctx.active -= 1
+            ctx.last_used_at = time.monotonic()
+            if ctx.retire_reason and ctx.active == 0:
+                self._discard(ctx)
+            self._changed.notify_all()
+
+    async def _check_limits(self, ctx: WarmContext):
+        if ctx.uses >= self.max_uses:
+            self._retire(ctx, "max_uses")
+            return
+        try:
+            ctx.heap = await ctx.page.evaluate(JS_HEAP_JS)
+        except Exception:
+            return
+        if self.max_heap_growth and ctx.heap - ctx.baseline_heap > self.max_heap_growth:
+            self._retire(ctx, "memory_growth")
+
+    # Public API
+    async def get_token(self, flow: str, proxy_url: Optional[str] = None, attempts: int = 3) -> Optional[str]:
+        """Get a sentinel token from a warm context
+
+        Returns:
+            Sentinel token JSON (with ``id`` set to the context's device id), or
+            None if Playwright is unavailable or every attempt failed
+        """
+        if not PLAYWRIGHT_AVAILABLE:
+            debug_logger.log_info("[Warning] Playwright not available, cannot use browser fallback")
+            return None
+
+        for attempt in range(attempts):
+            wait_start = time.monotonic()
+            try:
+                ctx = await self._acquire(proxy_url)
+            except Exception as e:
+                self._token_failures += 1
+                debug_logger.log_error(
+                    error_message=f"Browser pool acquire failed: {str(e)}",
+                    status_code=0,
+                    response_text=str(e),
+                    source="Server"
+                )
+                return None
+            self._total_wait += time.monotonic() - wait_start
+
+            try:
+                token = await asyncio.wait_for(
+                    ctx.page.evaluate(SDK_TOKEN_JS, [flow, ctx.device_id]),
+                    timeout=self.sdk_timeout
+                )
+                ctx.uses += 1
+                await self._check_limits(ctx)
+                if token:
+                    token_data = json.loads(token) if isinstance(token, str) else token
+                    if not token_data.get("id"):
+                        token_data["id"] = ctx.device_id
+                    self._tokens_served += 1
+                    return json.dumps(token_data, ensure_ascii=False, separators=(",", ":"))
+                debug_logger.log_info(f"[BrowserPool] Token is empty (attempt {attempt + 1}/{attempts})")
+            except Exception as e:
+                debug_logger.log_info(f"[BrowserPool] Token exception (attempt {attempt + 1}/{attempts}): {str(e)}")
+                self._retire(ctx, "token_error")
+            finally:
+                await self._release(ctx)
+
+        self._token_failures += 1
+        return None
+
+    async def _health_loop(self):
+        """Periodically verify idle contexts still have SentinelSDK loaded"""
+        while True:
+            try:
+                await asyncio.sleep(self.health_check_interval)
+                async with self._lock:
+                    idle = [c for c in self._contexts.values() if c.active == 0 and not c.retire_reason]
+                for ctx in idle:
+                    try:
+                        ready = await asyncio.wait_for(ctx.page.evaluate(SDK_READY_JS), timeout=10)
+                    except Exception:
+                        ready = False
+                    if not ready:
+                        self._retire(ctx, "health_check")
+                    else:
+                        await self._check_limits(ctx)
+                    if ctx.retire_reason:
+                        async with self._lock:
+                            if ctx.active == 0:
+                                self._discard(ctx)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Browser pool health check error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+
+    def get_stats(self) -> dict:
+        """Get pool metrics"""
+        return {
+            "available": PLAYWRIGHT_AVAILABLE,
+            "browser_running": self._browser is not None,
+            "max_contexts": self.max_contexts,
+            "contexts": [
+                {
+                    "proxy_url": ctx.proxy_url,
+                    "active": ctx.active,
+                    "uses": ctx.uses,
+                    "age_seconds": round(time.monotonic() - ctx.created_at, 1),
+                    "js_heap_mb": round(ctx.heap / 1024 / 1024, 1),
+                    "retiring": ctx.retire_reason,
+                }
+                for ctx in self._contexts.values()
+            ],
+            "warming": len(self._warming),
+            "queued": self._queued,
+            "max_queued": self._max_queued,
+            "tokens_served": self._tokens_served,
+            "token_failures": self._token_failures,
+            "acquire_timeouts": self._acquire_timeouts,
+            "contexts_created": self._contexts_created,
+            "contexts_retired": dict(self._contexts_retired),
+            "avg_warmup_seconds": round(self._total_warmup / self._contexts_created, 2) if self._contexts_created else 0,
+            "avg_wait_ms": round(self._total_wait / max(self._tokens_served + self._token_failures, 1) * 1000, 2),
+        }
@@ -0,0 +1,204 @@
+"""In-memory index of cached media files with a byte budget and expiry heap"""
+import heapq
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_CONTENT_NAME = re.compile(r"[0-9a-f]{64}")
+
+
+def entry_etag(filename: str, size: int, mtime: float) -> str:
+    """Strong ETag of a cached file: its SHA-256 for content-addressed files, else size and mtime"""
+    stem = filename.rsplit("/", 1)[-1].split(".", 1)[0]
+    if _CONTENT_NAME.fullmatch(stem):
+        return f'"{stem}"'
+    return f'"{size:x}-{int(mtime * 1e6):x}"'
+
+
+class CacheEntry:
+    """One cached file"""
+
+    __slots__ = ("filename", "size", "created_at", "last_access", "expires_at", "etag")
+
+    def __init__(self, filename: str, size: int, created_at: float, last_access: float, expires_at: float):
+        self.filename = filename
+        self.size = size
+        self.created_at = created_at
+        self.last_access = last_access
+        self.expires_at = expires_at
+        self.etag = entry_etag(filename, size, created_at)
+
+
+class CacheIndex:
+    """Size, last access and expiry of every file in the cache directory
+
+    Entries are kept in least-recently-used order; adding a file evicts the
+    least recently used others while the total exceeds ``max_bytes`` (0
+    disables the budget). Expiry is ``ttl`` seconds after creation (-1
+    never expires) and is tracked in a min-heap, so finding expired files
+    never scans the directory. Heap items are invalidated lazily: an item
+    whose file was removed or re-added is skipped when popped.
+    """
+
+    def __init__(self, max_bytes: int = 0, ttl: float = -1):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._heap: List[Tuple[float, str]] = []
+        self.total_bytes = 0
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.expirations = 0
+
+    def _expires_at(self, created_at: float) -> float:
+        return float("inf") if self.ttl < 0 else created_at + self.ttl
+
+    def rebuild(self, directory: Path):
+        """Index every file below directory (once, at startup); filenames are relative paths"""
+        self._entries.clear()
+        self._heap.clear()
+        self.total_bytes = 0
+        found = []
+        self._scan(str(directory), "", found)
+        for last_access, created_at, filename, size in sorted(found):
+            self._insert(CacheEntry(filename, size, created_at, last_access, self._expires_at(created_at)))
+
+    def _scan(self, path: str, prefix: str, found: list):
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    self._scan(entry.path, f"{prefix}{entry.name}/", found)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    found.append((max(stat.st_atime, stat.st_mtime), stat.st_mtime, prefix + entry.name, stat.st_size))
+
+    def _insert(self, entry: CacheEntry):
+        self._entries[entry.filename] = entry
+        self.total_bytes += entry.size
+        if entry.expires_at != float("inf"):
+            heapq.heappush(self._heap, (entry.expires_at, entry.filename))
+
+    def get(self, filename: str, now: Optional[float] = None) -> Optional[CacheEntry]:
+        """Entry for filename if cached and not expired; counts a hit and marks it recently used"""
+        entry = self._entries.get(filename)
+        now = now or time.time()
+        if entry is None or entry.expires_at <= now:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry.last_access = now
+        self._entries.move_to_end(filename)
+        return entry
+
+    def touch(self, filename: str) -> bool:
+        """Mark filename recently used; False if it is not in the index"""
+        entry = self._entries.get(filename)
+        if entry is None:
+            return False
+        entry.last_access = time.time()
+        self._entries.move_to_end(filename)
+        return True
+
+    def add(self, filename: str, size: int) -> List[str]:
+        """Record a new file and enforce the byte budget
+
+        Returns:
+            Filenames evicted to make room; the caller deletes them
+        """
+        now = time.time()
+        self.remove(filename)
+        self._insert(CacheEntry(filename, size, now, now, self._expires_at(now)))
+        return self._evict(keep=filename)
+
+    def _evict(self, keep: Optional[str] = None) -> List[str]:
+        evicted = []
+        if self.max_bytes <= 0:
+            return evicted
+        while self.total_bytes > self.max_bytes and self._entries:
+            filename = next(iter(self._entries))
+            if filename == keep:
+                break  # keep was added last, so everything else is gone
+            self.evicted_bytes += self._entries[filename].size
+            self.remove(filename)
+            self.evictions += 1
+            evicted.append(filename)
+        return evicted
+
+    def remove(self, filename: str) -> Optional[CacheEntry]:
+        """Drop filename from the index (its heap item becomes stale)"""
+        entry = self._entries.pop(filename, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+        return entry
+
+    def pop_expired(self, now: Optional[float] = None) -> List[str]:
+        """Remove and return every expired filename"""
+        now = now or time.time()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, filename = heapq.heappop(self._heap)
+            entry = self._entries.get(filename)
+            if entry is not None and entry.expires_at == expires_at:
+                self.remove(filename)
+                self.expirations += 1
+                expired.append(filename)
+        return expired
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest pending expiry time (may belong to a stale heap item)"""
+        return self._heap[0][0] if self._heap else None
+
+    def set_ttl(self, ttl: float):
+        """Change the expiry of every entry and rebuild the heap"""
+        self.ttl = ttl
+        self._heap = []
+        for entry in self._entries.values():
+            entry.expires_at = self._expires_at(entry.created_at)
+            if entry.expires_at != float("inf"):
+                self._heap.append((entry.expires_at, entry.filename))
+        heapq.heapify(self._heap)
+
+    def set_max_bytes(self, max_bytes: int) -> List[str]:
+        """Change the byte budget; returns filenames evicted to meet it"""
+        self.max_bytes = max_bytes
+        return self._evict()
+
+    def clear(self) -> List[str]:
+        """Forget every entry; returns their filenames"""
+        filenames = list(self._entries)
+        self._entries.clear()
+        self._heap.clear()
+        self.total_bytes = 0
+        return filenames
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict:
+        """Get usage metrics"""
+        oldest = next(iter(self._entries.values()), None)
+        lookups = self.hits + self.misses
+        return {
+            "files": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "usage": round(self.total_bytes / self.max_bytes, 4) if self.max_bytes > 0 else None,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "expirations": self.expirations,
+            "lru_idle_seconds": round(time.time() - oldest.last_access, 1) if oldest else 0,
+            "pending_heap_items": len(self._heap),
+        }
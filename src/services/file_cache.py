@@ -2,40 +2,134 @@
 import os
 import asyncio
 import hashlib
+import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
-from curl_cffi.requests import AsyncSession
+from functools import partial
+from uuid import uuid4
 from ..core.config import config
 from ..core.logger import debug_logger
+from .cache_index import CacheIndex
+from .range_downloader import DownloadResult, RangeDownloader
+
+# Bytes kept from the start of each download to detect its real type
+SNIFF_BYTES = 64
+
+
+def sniff_extension(head: bytes, media_type: str) -> str:
+    """
+    File extension for media from its leading bytes
+
+    Args:
+        head: First bytes of the file
+        media_type: 'image' or 'video', used when the format is not recognised
+
+    Returns:
+        Extension including the dot
+    """
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return ".webm"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return ".mov"
+        if brand in (b"avif", b"avis"):
+            return ".avif"
+        if brand in (b"heic", b"heix", b"mif1"):
+            return ".heic"
+        return ".mp4"
+    return ".mp4" if media_type == "video" else ".png"
 
 
 class FileCache:
     """File caching service for images and videos"""
 
-    def __init__(self, cache_dir: str = "tmp", default_timeout: int = 7200, proxy_manager=None):
+    def __init__(self, cache_dir: str = "tmp", default_timeout: int = 7200, proxy_manager=None, db=None):
         """
         Initialize file cache
 
+        Files are stored once per content, as ab/cd/<sha256><ext> below
+        cache_dir; a URL maps to the content it downloaded to.
+
         Args:
             cache_dir: Cache directory path
             default_timeout: Default cache timeout in seconds (default: 2 hours)
             proxy_manager: ProxyManager instance for downloading files
+            db: Database persisting the URL -> content map (optional)
         """
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
+        # Downloads in progress, outside the served cache_dir; renamed into it once complete
+        self.partial_dir = self.cache_dir.parent / f".{self.cache_dir.name}.partial"
+        self.partial_dir.mkdir(exist_ok=True)
         self.default_timeout = default_timeout
         self.proxy_manager = proxy_manager
+        self.db = db
         self._cleanup_task = None
+        self._download_executor: Optional[ThreadPoolExecutor] = None
+        # URL key -> download in progress, shared by concurrent callers
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # URL key -> cached content path, and the reverse
+        self._urls: Dict[str, str] = {}
+        self._urls_by_content: Dict[str, Set[str]] = {}
+        # Size, last access and expiry of every cached file, scanned from disk only here
+        self.index = CacheIndex(max_bytes=config.cache_max_bytes, ttl=default_timeout)
+        self.index.rebuild(self.cache_dir)
+        # Metrics
+        self.cache_hits = 0
+        self.downloads = 0
+        self.dedup_hits = 0
+        self.failed = 0
+        self.content_dedup = 0
+        self.resumed = 0
+        self.segmented = 0
         
+    async def load_url_map(self) -> int:
+        """Load the URL -> content map saved by previous runs, dropping entries for files no longer cached
+
+        Returns:
+            Number of URLs mapped
+        """
+        if self.db is None:
+            return 0
+        stale = []
+        for url_key, content in (await self.db.get_media_urls()).items():
+            if content in self.index:
+                self._map_url(url_key, content)
+            else:
+                stale.append(content)
+        if stale:
+            await self.db.delete_media_urls(stale)
+        return len(self._urls)
+
+    def _map_url(self, url_key: str, content: str):
+        previous = self._urls.get(url_key)
+        if previous is not None and previous != content:
+            self._urls_by_content.get(previous, set()).discard(url_key)
+        self._urls[url_key] = content
+        self._urls_by_content.setdefault(content, set()).add(url_key)
+
     async def start_cleanup_task(self):
         """Start background cleanup task"""
         if self._cleanup_task is None:
             self._cleanup_task = asyncio.create_task(self._cleanup_loop())
     
     async def stop_cleanup_task(self):
-        """Stop background cleanup task"""
+        """Stop background cleanup task and download threads"""
+        if self._download_executor:
+            self._download_executor.shutdown(wait=False, cancel_futures=True)
+            self._download_executor = None
         if self._cleanup_task:
             self._cleanup_task.cancel()
             try:
@@ -48,7 +142,10 @@ class FileCache:
         """Background task to clean up expired files"""
         while True:
             try:
-                await asyncio.sleep(300)  # Check every 5 minutes
+                # Wake at the next expiry, and at least every 5 minutes for stale partial files
+                next_expiry = self.index.next_expiry()
+                delay = 300 if next_expiry is None else min(max(next_expiry - time.time(), 1), 300)
+                await asyncio.sleep(delay)
                 await self._cleanup_expired_files()
             except asyncio.CancelledError:
                 break
@@ -65,58 +162,52 @@ class FileCache:
             # Skip cleanup if timeout is -1 (never delete)
             if self.default_timeout == -1:
                 return
-            
+
+            removed_count = await self._remove_files(self.index.pop_expired())
+
+            # Partial files this old were left by a crashed download
             current_time = time.time()
-            removed_count = 0
-            
-            for file_path in self.cache_dir.iterdir():
-                if file_path.is_file():
-                    # Check file age
-                    file_age = current_time - file_path.stat().st_mtime
-                    if file_age > self.default_timeout:
-                        try:
-                            file_path.unlink()
-                            removed_count += 1
-                            debug_logger.log_info(f"Removed expired cache file: {file_path.name}")
-                        except Exception as e:
-                            debug_logger.log_error(
-                                error_message=f"Failed to remove file {file_path.name}: {str(e)}",
-                                status_code=0,
-                                response_text=""
-                            )
-            
+            for file_path in self.partial_dir.iterdir():
+                if file_path.is_file() and current_time - file_path.stat().st_mtime > self.default_timeout:
+                    file_path.unlink(missing_ok=True)
+
             if removed_count > 0:
                 debug_logger.log_info(f"Cleanup completed: removed {removed_count} expired files")
-                
+
         except Exception as e:
             debug_logger.log_error(
                 error_message=f"Cleanup error: {str(e)}",
                 status_code=0,
                 response_text=""
             )
-    
-    def _generate_cache_filename(self, url: str, media_type: str) -> str:
-        """
-        Generate cache filename from URL
-        
-        Args:
-            url: Original URL
-            media_type: 'image' or 'video'
-            
-        Returns:
-            Cache filename
-        """
-        # Use URL hash as filename
-        url_hash = hashlib.md5(url.encode()).hexdigest()
-        
-        # Determine extension
-        if media_type == "video":
-            ext = ".mp4"
-        else:
-            ext = ".png"
-        
-        return f"{url_hash}{ext}"
-    
+
+    async def _remove_files(self, filenames: List[str], reason: str = "expired") -> int:
+        """Delete cache files already dropped from the index, and the URLs mapped to them"""
+        if not filenames:
+            return 0
+        for filename in filenames:
+            for url_key in self._urls_by_content.pop(filename, ()):
+                self._urls.pop(url_key, None)
+        if self.db is not None:
+            await self.db.delete_media_urls(filenames)
+        removed_count = 0
+        for filename in filenames:
+            try:
+                (self.cache_dir / filename).unlink(missing_ok=True)
+                removed_count += 1
+                debug_logger.log_info(f"Removed {reason} cache file: {filename}")
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Failed to remove file {filename}: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+        return removed_count
+
+    def _url_key(self, url: str) -> str:
+        """Key of a source URL in the URL -> content map"""
+        return hashlib.md5(url.encode()).hexdigest()
+
     async def download_and_cache(self, url: str, media_type: str, token_id: Optional[int] = None) -> str:
         """
         Download file from URL and cache it locally
@@ -127,25 +218,41 @@ class FileCache:
             token_id: Token ID for getting token-specific proxy (optional)
 
         Returns:
-            Local cache filename
+            Local cache filename (a path below the cache directory)
         """
-        filename = self._generate_cache_filename(url, media_type)
-        file_path = self.cache_dir / filename
+        url_key = self._url_key(url)
+        filename = self._urls.get(url_key)
 
         # Check if already cached and not expired
-        if file_path.exists():
-            file_age = time.time() - file_path.stat().st_mtime
-            if file_age < self.default_timeout:
+        if filename is not None:
+            if self.index.get(filename) and (self.cache_dir / filename).exists():
                 debug_logger.log_info(f"Cache hit: {filename}")
+                self.cache_hits += 1
                 return filename
-            else:
-                # Remove expired file
-                try:
-                    file_path.unlink()
-                except Exception:
-                    pass
+            if self.index.remove(filename):
+                # Remove expired (or externally deleted) file
+                await self._remove_files([filename])
+
+        # Join a download of the same URL already in progress
+        task = self._inflight.get(url_key)
+        if task is not None:
+            self.dedup_hits += 1
+            debug_logger.log_info(f"Joining in-progress download: {url}")
+        else:
+            self.downloads += 1
+            task = self._inflight[url_key] = asyncio.create_task(self._download(url, url_key, media_type, token_id))
+            task.add_done_callback(partial(self._download_done, url_key))
+        # Shielded so one caller being cancelled does not cancel the others' download
+        return await asyncio.shield(task)
 
-        # Download file
+    def _download_done(self, url_key: str, task: asyncio.Task):
+        if self._inflight.get(url_key) is task:
+            del self._inflight[url_key]
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+
+    async def _download(self, url: str, url_key: str, media_type: str, token_id: Optional[int]) -> str:
+        """Download url into the content store (one per URL at a time)"""
         debug_logger.log_info(f"Downloading file from: {url}")
 
         try:
@@ -154,23 +261,26 @@ class FileCache:
             if self.proxy_manager:
                 proxy_url = await self.proxy_manager.get_proxy_url(token_id)
 
-            # Download with proxy support
-            async with AsyncSession() as session:
-                kwargs = {"timeout": 60, "impersonate": "chrome"}
-                if proxy_url:
-                    kwargs["proxy"] = proxy_url
-                response = await session.get(url, **kwargs)
-
-                if response.status_code != 200:
-                    raise Exception(f"Download failed: HTTP {response.status_code}")
-                
-                # Save to cache
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
-                
-                debug_logger.log_info(f"File cached: {filename} ({len(response.content)} bytes)")
-                return filename
-                
+            # Download in a worker thread, streaming straight to disk
+            filename, result = await asyncio.get_running_loop().run_in_executor(
+                self._executor(), self._download_to_file, url, media_type, proxy_url
+            )
+            size = result.size
+            self.resumed += result.resumes
+            if result.segments > 1:
+                self.segmented += 1
+            if filename in self.index:
+                self.content_dedup += 1
+                debug_logger.log_info(f"File cached: {filename} ({size} bytes, same content as an earlier URL)")
+            else:
+                debug_logger.log_info(f"File cached: {filename} ({size} bytes)")
+            self._map_url(url_key, filename)
+            if self.db is not None:
+                await self.db.set_media_url(url_key, filename)
+            # Make room within the byte budget, least recently used first
+            await self._remove_files(self.index.add(filename, size), reason="evicted")
+            return filename
+
         except Exception as e:
             debug_logger.log_error(
                 error_message=f"Failed to download file: {str(e)}",
@@ -178,14 +288,67 @@ class FileCache:
                 response_text=str(e)
             )
             raise Exception(f"Failed to cache file: {str(e)}")
-    
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._download_executor is None:
+            self._download_executor = ThreadPoolExecutor(
+                max_workers=config.cache_download_workers, thread_name_prefix="file-cache"
+            )
+        return self._download_executor
+
+    def _download_to_file(self, url: str, media_type: str,
+                          proxy_url: Optional[str]) -> Tuple[str, DownloadResult]:
+        """
+        Download url into the content store (runs in a download thread)
+
+        RangeDownloader writes the body to a temp file in chunks of
+        cache_download_chunk_size, over several connections when the
+        origin supports ranges, resuming failed requests where they stopped,
+        and hashes it. The file is then renamed to ab/cd/<sha256><ext>, so
+        a cached file is always complete and identical content from any URL
+        lands on the same file.
+
+        Returns:
+            (filename below the cache directory, download result)
+        """
+        tmp_path = self.partial_dir / uuid4().hex
+        try:
+            result = RangeDownloader(proxy_url=proxy_url).download(url, tmp_path)
+            with open(tmp_path, "rb") as f:
+                head = f.read(SNIFF_BYTES)
+            filename = f"{result.sha256[:2]}/{result.sha256[2:4]}/{result.sha256}{sniff_extension(head, media_type)}"
+            file_path = self.cache_dir / filename
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            # Replacing an existing copy of the same content is harmless and refreshes its mtime
+            os.replace(tmp_path, file_path)
+            return filename, result
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
     def get_cache_path(self, filename: str) -> Path:
-        """Get full path to cached file"""
+        """Get full path to cached file (and mark it recently used)"""
+        self.index.touch(filename)
         return self.cache_dir / filename
     
+    def get_stats(self) -> dict:
+        """Get download metrics"""
+        return {
+            "cache_hits": self.cache_hits,
+            "downloads": self.downloads,
+            "dedup_hits": self.dedup_hits,
+            "failed": self.failed,
+            "in_progress": len(self._inflight),
+            "content_dedup": self.content_dedup,
+            "segmented_downloads": self.segmented,
+            "resumed_requests": self.resumed,
+            "urls": len(self._urls),
+            "index": self.index.get_stats(),
+        }
+
     def set_timeout(self, timeout: int):
         """Set cache timeout in seconds"""
         self.default_timeout = timeout
+        self.index.set_ttl(timeout)
         debug_logger.log_info(f"Cache timeout updated to {timeout} seconds")
     
     def get_timeout(self) -> int:
@@ -195,14 +358,17 @@ class FileCache:
     async def clear_all(self):
         """Clear all cached files"""
         try:
-            removed_count = 0
+            removed_count = await self._remove_files(self.index.clear(), reason="cleared")
+            # Unindexed leftovers and the shard directories
             for file_path in self.cache_dir.iterdir():
-                if file_path.is_file():
-                    try:
+                try:
+                    if file_path.is_dir():
+                        shutil.rmtree(file_path)
+                    else:
                         file_path.unlink()
                         removed_count += 1
-                    except Exception:
-                        pass
+                except Exception:
+                    pass
             
             debug_logger.log_info(f"Cache cleared: removed {removed_count} files")
             return removed_count
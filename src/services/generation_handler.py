@@ -5,15 +5,19 @@ import base64
 import time
 import random
 import re
-from typing import Optional, AsyncGenerator, Dict, Any
+from typing import Optional, AsyncGenerator, Callable, Dict, Any
 from datetime import datetime
 from .sora_client import SoraClient
 from .token_manager import TokenManager
 from .load_balancer import LoadBalancer
 from .file_cache import FileCache
 from .concurrency_manager import ConcurrencyManager
+from .http_pool import http_pool
+from .upstream_poller import UpstreamPoller, TaskWatch
+from .poll_scheduler import is_throttle_error
+from .job_queue import JobQueue
 from ..core.database import Database
-from ..core.models import Task, RequestLog
+from ..core.models import Task, BackgroundJob, RequestLog
 from ..core.config import config
 from ..core.logger import debug_logger
 
@@ -221,10 +225,13 @@ class GenerationHandler:
         self.load_balancer = load_balancer
         self.db = db
         self.concurrency_manager = concurrency_manager
+        self.upstream_poller = UpstreamPoller(sora_client)
+        self.job_queue = JobQueue(db, self.run_background_job)
         self.file_cache = FileCache(
             cache_dir="tmp",
             default_timeout=config.cache_timeout,
-            proxy_manager=proxy_manager
+            proxy_manager=proxy_manager,
+            db=db
         )
 
     def _get_base_url(self) -> str:
@@ -372,8 +379,6 @@ class GenerationHandler:
         Returns:
             File bytes
         """
-        from curl_cffi.requests import AsyncSession
-
         proxy_url = await self.load_balancer.proxy_manager.get_proxy_url()
 
         kwargs = {
@@ -384,7 +389,7 @@ class GenerationHandler:
         if proxy_url:
             kwargs["proxy"] = proxy_url
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             response = await session.get(url, **kwargs)
             if response.status_code != 200:
                 raise Exception(f"Failed to download file: {response.status_code}")
@@ -519,17 +524,14 @@ class GenerationHandler:
             # Record usage
             await self.token_manager.record_usage(token_obj.id, is_video=is_video)
 
-            # Start background polling
-            asyncio.create_task(self.handle_background_generation(
+            # Queue background polling (persisted, so it survives a restart)
+            await self.job_queue.enqueue(BackgroundJob(
                 task_id=task_id,
-                token=token_obj.token,
                 token_id=token_obj.id,
-                is_video=is_video,
-                is_image=is_image,
-                prompt=prompt,
                 model=model,
+                prompt=prompt,
                 log_id=log_id,
-                start_time=start_time
+                submitted_at=start_time
             ))
 
             return task_id
@@ -544,27 +546,98 @@ class GenerationHandler:
                 await self.concurrency_manager.release_video(token_obj.id)
             raise e
 
+    async def run_background_job(self, job: BackgroundJob, resumed: bool, heartbeat: Callable[[], None]):
+        """Job queue runner: poll one background task to completion
+
+        Resumed jobs (after a restart or a stuck-job sweep) re-acquire the
+        token's concurrency slots where possible; a task that is no longer
+        processing is skipped.
+        """
+        task = await self.db.get_task(job.task_id)
+        if task is None or task.status != "processing":
+            return
+        model_config = MODEL_CONFIG.get(job.model)
+        token_obj = await self.db.get_token(job.token_id)
+        if model_config is None or token_obj is None:
+            await self.db.update_task(job.task_id, "failed", 0,
+                                      error_message="Cannot resume task: its model or token no longer exists")
+            return
+        is_video = model_config["type"] == "video"
+        is_image = model_config["type"] == "image"
+
+        release_resources = True
+        if resumed:
+            debug_logger.log_info(f"Resuming background task {job.task_id} on token {job.token_id}")
+            # Keep progress buffered in memory like any other in-flight task
+            self.db.task_state.track(task)
+            release_resources = await self._reacquire_slots(job.token_id, is_video, is_image)
+
+        await self.handle_background_generation(
+            task_id=job.task_id,
+            token=token_obj.token,
+            token_id=job.token_id,
+            is_video=is_video,
+            is_image=is_image,
+            prompt=job.prompt,
+            model=job.model,
+            log_id=job.log_id,
+            start_time=job.submitted_at,
+            heartbeat=heartbeat,
+            release_resources=release_resources
+        )
+
+    async def _reacquire_slots(self, token_id: int, is_video: bool, is_image: bool) -> bool:
+        """Take the lock/concurrency slots a resumed task held before; False if any was unavailable"""
+        if is_image:
+            if not await self.load_balancer.token_lock.acquire_lock(token_id):
+                return False
+            if self.concurrency_manager and not await self.concurrency_manager.acquire_image(token_id):
+                await self.load_balancer.token_lock.release_lock(token_id)
+                return False
+        if is_video and self.concurrency_manager:
+            return await self.concurrency_manager.acquire_video(token_id)
+        return True
+
     async def handle_background_generation(self, task_id: str, token: str, token_id: int,
                                            is_video: bool, is_image: bool, prompt: str, model: str,
-                                           log_id: int, start_time: float):
-        """Handle background generation polling and result processing"""
+                                           log_id: int, start_time: float,
+                                           heartbeat: Optional[Callable[[], None]] = None,
+                                           release_resources: bool = True):
+        """Handle background generation polling and result processing
+
+        Args:
+            heartbeat: Called on every poll update, so the job queue sees progress
+            release_resources: Release the token lock/concurrency slot when done
+        """
+        watch = self.upstream_poller.watch(token, token_id, task_id, is_video, model)
         try:
             timeout = config.video_timeout if is_video else config.image_timeout
-            poll_interval = config.poll_interval
-            max_attempts = int(timeout / poll_interval)
 
-            for attempt in range(max_attempts):
+            # Bounded by wall-clock time: a tick shared with other tasks of the token may
+            # deliver more than one update per interval
+            attempt = 0
+            while True:
                 elapsed_time = time.time() - start_time
-                if elapsed_time > timeout:
+                # A task resumed after its timeout still gets one poll to collect its result
+                if attempt > 0 and elapsed_time > timeout:
                     await self.db.update_task(task_id, "failed", 0, 
                                               error_message=f"Generation timeout after {elapsed_time:.1f} seconds")
                     break
-
-                await asyncio.sleep(poll_interval)
+                attempt += 1
 
                 try:
+                    # Never wait past the timeout, even while the token is paused; a resumed task
+                    # already past it waits up to one max interval for its single poll
+                    remaining = timeout - elapsed_time
+                    if attempt == 1:
+                        remaining = max(remaining, self.upstream_poller.schedule.max_interval)
+                    update = await watch.next_update(remaining)
+                    if heartbeat:
+                        heartbeat()
+                    if update.throttled:
+                        continue
                     if is_video:
-                        pending_tasks = await self.sora_client.get_pending_tasks(token, token_id=token_id)
+                        pending_tasks = update.pending_tasks
                         task_found = False
                         
                         for task in pending_tasks:
@@ -576,8 +649,8 @@ class GenerationHandler:
                                 break
 
                         if not task_found:
-                            # Task completed - fetch from drafts
-                            result = await self.sora_client.get_video_drafts(token, token_id=token_id)
+                            # Task completed - look it up in drafts
+                            result = update.drafts or {}
                             items = result.get("items", [])
 
                             for item in items:
@@ -596,22 +669,28 @@ class GenerationHandler:
                             break
                     else:
                         # Image generation
-                        status = await self.sora_client.get_task_status(task_id, token, token_id=token_id)
-                        if status.get("status") == "complete":
-                            url = status.get("result", {}).get("url")
-                            if url:
-                                result_urls = json.dumps([url])
+                        result = update.recent_tasks or {}
+                        task_resp = next((t for t in result.get("task_responses", []) if t.get("id") == task_id), None)
+                        if task_resp is None:
+                            continue
+                        status = task_resp.get("status")
+                        if status == "succeeded":
+                            urls = [gen.get("url") for gen in task_resp.get("generations", []) if gen.get("url")]
+                            if urls:
+                                result_urls = json.dumps(urls)
                                 await self.db.update_task(task_id, "completed", 100, result_urls=result_urls)
                                 await self.token_manager.record_success(token_id, is_video=False)
                             break
-                        elif status.get("status") == "failed":
+                        elif status == "failed":
                             await self.db.update_task(task_id, "failed", 0, 
-                                                      error_message=status.get("error", "Generation failed"))
+                                                      error_message=task_resp.get("error_message", "Generation failed"))
                             break
                         else:
-                            progress = status.get("progress", 0)
+                            progress = task_resp.get("progress_pct") or 0
                             await self.db.update_task(task_id, "processing", int(progress * 100))
 
+                except asyncio.TimeoutError:
+                    continue  # Timed out waiting for a tick; failed at the top of the loop
                 except Exception as e:
                     debug_logger.log_error(error_message=f"Background poll error: {e}", status_code=500, response_text=str(e))
                     continue
@@ -620,18 +699,19 @@ class GenerationHandler:
             debug_logger.log_error(error_message=f"Background generation error: {e}", status_code=500, response_text=str(e))
             await self.db.update_task(task_id, "failed", 0, error_message=str(e))
         finally:
+            watch.close()
             # Release resources
-            if is_image:
+            if release_resources and is_image:
                 await self.load_balancer.token_lock.release_lock(token_id)
                 if self.concurrency_manager:
                     await self.concurrency_manager.release_image(token_id)
-            if is_video and self.concurrency_manager:
+            if release_resources and is_video and self.concurrency_manager:
                 await self.concurrency_manager.release_video(token_id)
 
-            # Update log
+            # Update log (not for a task interrupted by shutdown; it resumes on the next start)
             duration = time.time() - start_time
             task_info = await self.db.get_task(task_id)
-            if log_id and task_info:
+            if log_id and task_info and task_info.status != "processing":
                 response_data = {
                     "task_id": task_id,
                     "status": task_info.status,
@@ -1027,8 +1107,8 @@ class GenerationHandler:
             remix_target_id: Sora share link video ID for remix
             stream: Whether to stream response
         """
-        # Get admin config for retry settings
-        admin_config = await self.db.get_admin_config()
+        # Get admin config for retry settings (lock-free snapshot read)
+        admin_config = (await self.db.get_config_snapshot()).admin
         retry_enabled = admin_config.task_retry_enabled
         max_retries = admin_config.task_max_retries if retry_enabled else 0
         auto_disable_on_401 = admin_config.auto_disable_on_401
@@ -1105,10 +1185,21 @@ class GenerationHandler:
                                 stream: bool, prompt: str, token_id: int = None,
                                 log_id: int = None, start_time: float = None) -> AsyncGenerator[str, None]:
         """Poll for task result with timeout"""
+        task = self.db.task_state.get(task_id)
+        watch = self.upstream_poller.watch(token, token_id, task_id, is_video, task.model if task else None)
+        try:
+            async for chunk in self._poll_task_updates(watch, task_id, token, is_video, stream, prompt,
+                                                       token_id, log_id, start_time):
+                yield chunk
+        finally:
+            watch.close()
+
+    async def _poll_task_updates(self, watch: TaskWatch, task_id: str, token: str, is_video: bool,
+                                 stream: bool, prompt: str, token_id: int = None,
+                                 log_id: int = None, start_time: float = None) -> AsyncGenerator[str, None]:
+        """Consume shared poll ticks for one task until it completes, fails or times out"""
         # Get timeout from config
         timeout = config.video_timeout if is_video else config.image_timeout
-        poll_interval = config.poll_interval
-        max_attempts = int(timeout / poll_interval)  # Calculate max attempts based on timeout
         last_progress = 0
         start_time = time.time()
         last_heartbeat_time = start_time  # Track last heartbeat for image generation
@@ -1116,14 +1207,16 @@ class GenerationHandler:
         last_status_output_time = start_time  # Track last status output time for video generation
         video_status_interval = 30  # Output status every 30 seconds for video generation
 
-        debug_logger.log_info(f"Starting task polling: task_id={task_id}, is_video={is_video}, timeout={timeout}s, max_attempts={max_attempts}")
+        debug_logger.log_info(f"Starting task polling: task_id={task_id}, is_video={is_video}, timeout={timeout}s")
 
         # Check and log watermark-free mode status at the beginning
         if is_video:
-            watermark_free_config = await self.db.get_watermark_free_config()
+            watermark_free_config = (await self.db.get_config_snapshot()).watermark_free
             debug_logger.log_info(f"Watermark-free mode: {'ENABLED' if watermark_free_config.watermark_free_enabled else 'DISABLED'}")
 
-        for attempt in range(max_attempts):
+        # Bounded by wall-clock time: a tick shared with other tasks of the token may
+        # deliver more than one update per interval
+        while True:
             # Check if timeout exceeded
             elapsed_time = time.time() - start_time
             if elapsed_time > timeout:
@@ -1162,12 +1255,18 @@ class GenerationHandler:
                 raise Exception(f"Upstream API timeout: Generation exceeded {timeout} seconds limit")
 
 
-            await asyncio.sleep(poll_interval)
-
             try:
+                # Never wait past the timeout, even while the token is paused
+                update = await watch.next_update(timeout - elapsed_time)
+                if update.throttled:
+                    if stream:
+                        yield self._format_stream_chunk(
+                            reasoning_content="**Waiting**\n\nUpstream is rate limiting this account, polling paused...\n"
+                        )
+                    continue
                 if is_video:
-                    # Get pending tasks to check progress
-                    pending_tasks = await self.sora_client.get_pending_tasks(token, token_id=token_id)
+                    # Pending tasks of this token from the shared poll tick
+                    pending_tasks = update.pending_tasks
 
                     # Find matching task in pending tasks
                     task_found = False
@@ -1201,8 +1300,8 @@ class GenerationHandler:
 
                     # If task not found in pending tasks, it's completed - fetch from drafts
                     if not task_found:
-                        debug_logger.log_info(f"Task {task_id} not found in pending tasks, fetching from drafts...")
-                        result = await self.sora_client.get_video_drafts(token, token_id=token_id)
+                        debug_logger.log_info(f"Task {task_id} not found in pending tasks, checking drafts...")
+                        result = update.drafts or {}
                         items = result.get("items", [])
 
                         # Find matching task in drafts
@@ -1254,7 +1353,7 @@ class GenerationHandler:
                                     return
 
                                 # Check if watermark-free mode is enabled
-                                watermark_free_config = await self.db.get_watermark_free_config()
+                                watermark_free_config = (await self.db.get_config_snapshot()).watermark_free
                                 watermark_free_enabled = watermark_free_config.watermark_free_enabled
 
                                 # Initialize variables
@@ -1275,7 +1374,7 @@ class GenerationHandler:
                                         )
 
                                     # Get watermark-free config to determine parse method
-                                    watermark_config = await self.db.get_watermark_free_config()
+                                    watermark_config = watermark_free_config
                                     parse_method = watermark_config.parse_method or "third_party"
 
                                     # Post video to get watermark-free version
@@ -1455,7 +1554,7 @@ class GenerationHandler:
                                     yield "data: [DONE]\n\n"
                                 return
                 else:
-                    result = await self.sora_client.get_image_tasks(token, token_id=token_id)
+                    result = update.recent_tasks or {}
                     task_responses = result.get("task_responses", [])
 
                     # Find matching task
@@ -1564,90 +1663,21 @@ class GenerationHandler:
                             )
 
                 # Progress update for stream mode (fallback if no status from API)
-                if stream and attempt % 10 == 0:  # Update every 10 attempts (roughly 20% intervals)
-                    estimated_progress = min(90, (attempt / max_attempts) * 100)
+                if stream:
+                    estimated_progress = min(90, (time.time() - start_time) / timeout * 100)
                     if estimated_progress > last_progress + 20:  # Update every 20%
                         last_progress = estimated_progress
                         yield self._format_stream_chunk(
                             reasoning_content=f"**Processing**\n\nGeneration in progress: {estimated_progress:.0f}% completed (estimated)...\n"
                         )
             
+            except asyncio.TimeoutError:
+                continue  # Timed out waiting for a tick; failed at the top of the loop
             except Exception as e:
-                # Check for CF shield/429 error - don't retry these
-                error_str = str(e)
-                is_cf_or_429 = False
-                try:
-                    error_response = json.loads(error_str)
-                    if isinstance(error_response, dict):
-                        error_info = error_response.get("error", {})
-                        if error_info.get("code") == "cf_shield_429":
-                            is_cf_or_429 = True
-                except (json.JSONDecodeError, ValueError):
-                    pass
-
-                # CF shield/429 detected - fail immediately
-                if is_cf_or_429:
-                    debug_logger.log_error(
-                        error_message="CF Shield/429 detected during polling, failing task immediately",
-                        status_code=429,
-                        response_text=error_str
-                    )
-                    # Update task status to failed
-                    await self.db.update_task(task_id, "failed", 0, error_message="Cloudflare challenge or rate limit (429) triggered")
-
-                    # Update request log with CF/429 error
-                    if log_id and start_time:
-                        duration = time.time() - start_time
-                        await self.db.update_request_log(
-                            log_id,
-                            response_body=json.dumps({"error": "Cloudflare challenge or rate limit (429) triggered"}),
-                            status_code=429,
-                            duration=duration
-                        )
-
-                    # Release resources
-                    if not is_video and token_id:
-                        await self.load_balancer.token_lock.release_lock(token_id)
-                        if self.concurrency_manager:
-                            await self.concurrency_manager.release_image(token_id)
-                    if is_video and token_id and self.concurrency_manager:
-                        await self.concurrency_manager.release_video(token_id)
-
-                    # Send error message to client if streaming
-                    if stream:
-                        yield self._format_stream_chunk(
-                            reasoning_content="**CF Shield/429 Error**\\n\\nCloudflare challenge or rate limit (429) triggered\\n"
-                        )
-                        yield self._format_stream_chunk(
-                            content="❌ Generation failed: Cloudflare challenge or rate limit (429) triggered. Please change proxy or reduce request frequency.",
-                            finish_reason="STOP"
-                        )
-                        yield "data: [DONE]\\n\\n"
-
-                    # Exit polling immediately
-                    return
-
-                # For other errors, retry if not last attempt
-                if attempt >= max_attempts - 1:
-                    raise e
+                # 429/Cloudflare never reaches here: the poller pauses the token and this task
+                # keeps waiting. Other errors are retried on the next tick until the timeout above
+                debug_logger.log_info(f"Poll error for task {task_id}, retrying on the next tick: {str(e)[:200]}")
                 continue
-
-        # Timeout - release lock if image generation
-        if not is_video and token_id:
-            await self.load_balancer.token_lock.release_lock(token_id)
-            debug_logger.log_info(f"Released lock for token {token_id} due to max attempts reached")
-            # Release concurrency slot for image generation
-            if self.concurrency_manager:
-                await self.concurrency_manager.release_image(token_id)
-                debug_logger.log_info(f"Released concurrency slot for token {token_id} due to max attempts reached")
-
-        # Release concurrency slot for video generation
-        if is_video and token_id and self.concurrency_manager:
-            await self.concurrency_manager.release_video(token_id)
-            debug_logger.log_info(f"Released concurrency slot for token {token_id} due to max attempts reached")
-
-        await self.db.update_task(task_id, "failed", 0, error_message=f"Generation timeout after {timeout} seconds")
-        raise Exception(f"Upstream API timeout: Generation exceeded {timeout} seconds limit")
     
     def _format_stream_chunk(self, content: str = None, reasoning_content: str = None,
                             finish_reason: str = None, is_first: bool = False) -> str:
@@ -1855,7 +1885,7 @@ class GenerationHandler:
             yield self._format_stream_chunk(
                 reasoning_content="Processing video to extract character...\n"
             )
-            cameo_status = await self._poll_cameo_status(cameo_id, token_obj.token)
+            cameo_status = await self._poll_cameo_status(cameo_id, token_obj.token, token_id=token_obj.id)
             debug_logger.log_info(f"Cameo status: {cameo_status}")
 
             # Extract character info immediately after polling completes
@@ -2036,7 +2066,7 @@ class GenerationHandler:
             yield self._format_stream_chunk(
                 reasoning_content="Processing video to extract character...\n"
             )
-            cameo_status = await self._poll_cameo_status(cameo_id, token_obj.token)
+            cameo_status = await self._poll_cameo_status(cameo_id, token_obj.token, token_id=token_obj.id)
             debug_logger.log_info(f"Cameo status: {cameo_status}")
 
             # Extract character info immediately after polling completes
@@ -2315,20 +2345,25 @@ class GenerationHandler:
             )
             raise
 
-    async def _poll_cameo_status(self, cameo_id: str, token: str, timeout: int = 600, poll_interval: int = 5) -> Dict[str, Any]:
+    async def _poll_cameo_status(self, cameo_id: str, token: str, timeout: int = 600,
+                                 poll_interval: Optional[float] = None, token_id: int = None) -> Dict[str, Any]:
         """Poll for cameo (character) processing status
 
         Args:
             cameo_id: The cameo ID
             token: Access token
             timeout: Maximum time to wait in seconds
-            poll_interval: Time between polls in seconds
+            poll_interval: Fixed time between polls in seconds (default: adaptive, from recent cameo durations)
+            token_id: Token ID, so 429/Cloudflare pauses are shared with the token's task polling
 
         Returns:
             Cameo status dictionary with display_name_hint, username_hint, profile_asset_url, instruction_set_hint
         """
+        schedule = self.upstream_poller.schedule
+        scheduler = self.upstream_poller.scheduler
+        pause_key = token_id if token_id is not None else token
         start_time = time.time()
-        max_attempts = int(timeout / poll_interval)
+        max_attempts = int(timeout / (poll_interval or schedule.min_interval))
         consecutive_errors = 0
         max_consecutive_errors = 3  # Allow up to 3 consecutive errors before failing
 
@@ -2337,10 +2372,13 @@ class GenerationHandler:
             if elapsed_time > timeout:
                 raise Exception(f"Cameo processing timeout after {elapsed_time:.1f} seconds")
 
-            await asyncio.sleep(poll_interval)
+            delay = poll_interval or schedule.next_interval("cameo", elapsed_time)
+            await scheduler.sleep(pause_key, delay)
 
             try:
-                status = await self.sora_client.get_cameo_status(cameo_id, token)
+                async with scheduler.slot():
+                    status = await self.sora_client.get_cameo_status(cameo_id, token)
+                scheduler.resume(pause_key)
                 current_status = status.get("status")
                 status_message = status.get("status_message", "")
 
@@ -2363,11 +2401,13 @@ class GenerationHandler:
                 # Primary condition: status_message == "Completed" means processing is done
                 if status_message == "Completed":
                     debug_logger.log_info(f"Cameo processing completed (status: {current_status}, message: {status_message})")
+                    schedule.history.record("cameo", time.time() - start_time)
                     return status
 
                 # Fallback condition: finalized status
                 if current_status == "finalized":
                     debug_logger.log_info(f"Cameo processing completed (status: {current_status}, message: {status_message})")
+                    schedule.history.record("cameo", time.time() - start_time)
                     return status
 
             except Exception as e:
@@ -2379,6 +2419,13 @@ class GenerationHandler:
                 if "角色创建失败" in error_msg:
                     raise
 
+                # 429/Cloudflare: pause the token's polling and keep waiting
+                if is_throttle_error(e):
+                    consecutive_errors -= 1
+                    seconds = scheduler.pause(pause_key)
+                    debug_logger.log_info(f"Cameo status polling throttled, pausing for {seconds:.0f}s")
+                    continue
+
                 # Log error with context
                 debug_logger.log_error(
                     error_message=f"Failed to get cameo status (attempt {attempt + 1}/{max_attempts}, consecutive errors: {consecutive_errors}): {error_msg}",
@@ -2391,7 +2438,7 @@ class GenerationHandler:
 
                 if is_tls_error:
                     # For TLS errors, use exponential backoff
-                    backoff_time = min(poll_interval * (2 ** (consecutive_errors - 1)), 30)
+                    backoff_time = min(delay * (2 ** (consecutive_errors - 1)), 30)
                     debug_logger.log_info(f"TLS error detected, using exponential backoff: {backoff_time}s")
                     await asyncio.sleep(backoff_time)
 
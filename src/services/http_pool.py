@@ -0,0 +1,159 @@
+"""Shared curl_cffi sessions keyed by proxy and impersonation profile"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+from curl_cffi import CurlInfo, CurlMOpt
+from curl_cffi.requests import AsyncSession
+from ..core.config import config
+from ..core.logger import debug_logger
+
+SessionKey = Tuple[Optional[str], Optional[str]]
+
+
+class _PooledSession(AsyncSession):
+    """AsyncSession that reports how many new connections each request opened"""
+
+    def __init__(self, pool: "HttpSessionPool", key: SessionKey, **kwargs):
+        super().__init__(**kwargs)
+        self._pool = pool
+        self.key = key
+        self.last_used = time.monotonic()
+        self.active = 0
+        self.requests = 0
+
+    async def request(self, *args, **kwargs):
+        response = await super().request(*args, **kwargs)
+        self.requests += 1
+        self._pool._record(response.infos.get(CurlInfo.NUM_CONNECTS, 0))
+        return response
+
+
+class HttpSessionPool:
+    """Long-lived AsyncSessions, one per (proxy_url, impersonate)
+
+    A session keeps its curl handles, and libcurl keeps their connections
+    alive, so repeated calls to the same upstream skip the TCP and TLS
+    handshake. Each session allows ``max_clients`` concurrent requests and
+    ``max_connections_per_host`` connections per host; sessions unused for
+    ``idle_seconds`` are closed. Cookies are never kept between requests, so
+    a shared session behaves like the per-call sessions it replaces.
+    """
+
+    def __init__(self, max_clients: Optional[int] = None, max_connections_per_host: Optional[int] = None,
+                 idle_seconds: Optional[float] = None):
+        self.max_clients = max_clients or config.http_pool_max_clients
+        self.max_connections_per_host = max_connections_per_host or config.http_pool_max_connections_per_host
+        self.idle_seconds = idle_seconds or config.http_pool_idle_seconds
+        self._sessions: Dict[SessionKey, _PooledSession] = {}
+        self._evict_task: Optional[asyncio.Task] = None
+        # Metrics
+        self._requests = 0
+        self._handshakes = 0
+        self._reused = 0
+        self._sessions_created = 0
+        self._sessions_evicted = 0
+
+    def _create(self, key: SessionKey) -> _PooledSession:
+        proxy_url, impersonate = key
+        session = _PooledSession(
+            self,
+            key,
+            max_clients=self.max_clients,
+            impersonate=impersonate,
+            proxy=proxy_url,
+            discard_cookies=True,
+            curl_infos=[CurlInfo.NUM_CONNECTS],
+        )
+        session.acurl.setopt(CurlMOpt.MAX_HOST_CONNECTIONS, self.max_connections_per_host)
+        self._sessions_created += 1
+        return session
+
+    @asynccontextmanager
+    async def session(self, proxy_url: Optional[str] = None, impersonate: Optional[str] = "chrome") -> AsyncIterator[AsyncSession]:
+        """Borrow the shared session for (proxy_url, impersonate)
+
+        Use like ``async with AsyncSession() as session``; the session stays
+        open afterwards. Per-request ``proxy``/``impersonate`` kwargs still apply.
+        """
+        key = (proxy_url or None, impersonate)
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = self._create(key)
+        if self._evict_task is None:
+            self._evict_task = asyncio.create_task(self._evict_loop())
+        session.active += 1
+        try:
+            yield session
+        finally:
+            session.active -= 1
+            session.last_used = time.monotonic()
+
+    def _record(self, new_connections: int):
+        self._requests += 1
+        if new_connections:
+            self._handshakes += new_connections
+        else:
+            self._reused += 1
+
+    async def _evict_loop(self):
+        """Close sessions (and their connections) that have been idle too long"""
+        while True:
+            try:
+                await asyncio.sleep(max(self.idle_seconds / 2, 1))
+                now = time.monotonic()
+                for key, session in list(self._sessions.items()):
+                    if session.active == 0 and now - session.last_used > self.idle_seconds:
+                        del self._sessions[key]
+                        self._sessions_evicted += 1
+                        await session.close()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"HTTP session pool eviction error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+
+    async def stop(self):
+        """Close all sessions"""
+        if self._evict_task:
+            self._evict_task.cancel()
+            try:
+                await self._evict_task
+            except asyncio.CancelledError:
+                pass
+            self._evict_task = None
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            try:
+                await session.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> dict:
+        """Get pool metrics"""
+        now = time.monotonic()
+        return {
+            "sessions": [
+                {
+                    "proxy_url": session.key[0],
+                    "impersonate": session.key[1],
+                    "active": session.active,
+                    "requests": session.requests,
+                    "idle_seconds": round(now - session.last_used, 1),
+                }
+                for session in self._sessions.values()
+            ],
+            "sessions_created": self._sessions_created,
+            "sessions_evicted": self._sessions_evicted,
+            "requests": self._requests,
+            "handshakes": self._handshakes,
+            "reused_connections": self._reused,
+            "reuse_ratio": round(self._reused / self._requests, 4) if self._requests else 0,
+        }
+
+
+http_pool = HttpSessionPool()
@@ -0,0 +1,223 @@
+"""Durable queue of background polling jobs"""
+import asyncio
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from uuid import uuid4
+from ..core.config import config
+from ..core.database import Database
+from ..core.logger import debug_logger
+from ..core.models import BackgroundJob
+
+# runner(job, resumed, heartbeat): resumed is True when the job did not come
+# straight from enqueue in this process; heartbeat is called on progress
+JobRunner = Callable[[BackgroundJob, bool, Callable[[], None]], Awaitable[None]]
+
+
+class _RunningJob:
+    """A job leased by this process"""
+
+    def __init__(self, job: BackgroundJob):
+        self.job = job
+        self.task: Optional[asyncio.Task] = None
+        self.last_beat = time.monotonic()
+        self.stuck = False
+
+    def beat(self):
+        self.last_beat = time.monotonic()
+
+
+class JobQueue:
+    """Background polling jobs persisted in SQLite and run by a worker pool
+
+    A job row exists from submission until its task reaches a terminal
+    state. One dispatcher leases the oldest queued job whenever one of the
+    ``workers`` slots is free (0 = no limit: polling is already shared per
+    token and rate-limited by the PollScheduler, and a queued job would hold
+    its token's concurrency slot while its timeout runs). Running jobs renew their lease every
+    ``heartbeat_seconds`` as long as they have reported progress within
+    ``lease_seconds``; a job that has not is cancelled as stuck, and any job
+    whose lease lapsed (stuck, or owned by a dead process) is put back in
+    the queue, up to ``max_attempts`` leases. On start, every job left
+    running by the previous process and every processing task without a
+    job is queued again, so paid generations are still collected.
+    """
+
+    def __init__(self, db: Database, runner: JobRunner, workers: Optional[int] = None,
+                 lease_seconds: Optional[float] = None, heartbeat_seconds: Optional[float] = None,
+                 sweep_seconds: Optional[float] = None, max_attempts: Optional[int] = None):
+        self.db = db
+        self.runner = runner
+        self.workers = config.job_queue_workers if workers is None else workers
+        self.lease_seconds = lease_seconds or config.job_queue_lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds or config.job_queue_heartbeat_seconds
+        self.sweep_seconds = sweep_seconds or config.job_queue_sweep_seconds
+        self.max_attempts = max_attempts or config.job_queue_max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._slots = asyncio.Semaphore(self.workers) if self.workers > 0 else None
+        self._wake = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._maintenance: Optional[asyncio.Task] = None
+        self._running: Dict[int, _RunningJob] = {}
+        # Tasks enqueued by this process whose job has not run yet (their slots are held)
+        self._fresh: Set[str] = set()
+        # Metrics
+        self.enqueued = 0
+        self.completed = 0
+        self.errors = 0
+        self.recovered = 0
+        self.swept = 0
+        self.requeued = 0
+        self.abandoned = 0
+
+    async def start(self) -> int:
+        """Recover jobs from the previous run and start the workers
+
+        Returns:
+            Number of jobs queued again for recovery
+        """
+        requeued, exhausted = await self.db.requeue_jobs(self.max_attempts, expired_only=False)
+        orphaned = await self.db.enqueue_orphaned_tasks()
+        await self._abandon(exhausted)
+        self.recovered = requeued + orphaned
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+            self._maintenance = asyncio.create_task(self._maintenance_loop())
+        return self.recovered
+
+    async def stop(self):
+        """Stop dispatching and cancel running jobs (they resume on the next start)"""
+        tasks = [t for t in (self._dispatcher, self._maintenance) if t is not None]
+        tasks += [r.task for r in self._running.values() if r.task is not None]
+        self._dispatcher = self._maintenance = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def enqueue(self, job: BackgroundJob):
+        """Persist a job and wake the dispatcher"""
+        await self.db.enqueue_job(job)
+        self._fresh.add(job.task_id)
+        self.enqueued += 1
+        self._wake.set()
+
+    async def _dispatch_loop(self):
+        """Lease queued jobs while worker slots are free"""
+        while True:
+            try:
+                if self._slots is not None:
+                    await self._slots.acquire()
+                self._wake.clear()
+                try:
+                    job = await self.db.claim_job(self.owner, self.lease_seconds)
+                except BaseException:
+                    self._release_slot()
+                    raise
+                if job is None:
+                    self._release_slot()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=self.sweep_seconds)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                running = self._running[job.id] = _RunningJob(job)
+                running.task = asyncio.create_task(self._run(running))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Job dispatch error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+                await asyncio.sleep(1)
+
+    async def _run(self, running: _RunningJob):
+        job = running.job
+        resumed = job.task_id not in self._fresh
+        self._fresh.discard(job.task_id)
+        try:
+            try:
+                await self.runner(job, resumed, running.beat)
+                self.completed += 1
+            except asyncio.CancelledError:
+                if running.stuck:
+                    return  # Requeued by the sweeper once its lease lapses
+                raise
+            except Exception as e:
+                self.errors += 1
+                debug_logger.log_error(
+                    error_message=f"Background job for task {job.task_id} failed: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+            await self.db.finish_job(job.id, self.owner)
+        finally:
+            self._running.pop(job.id, None)
+            self._release_slot()
+
+    def _release_slot(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    async def _maintenance_loop(self):
+        """Renew leases of live jobs and sweep stuck or expired ones"""
+        last_sweep = time.monotonic()
+        while True:
+            try:
+                await asyncio.sleep(self.heartbeat_seconds)
+                now = time.monotonic()
+                live = [job_id for job_id, r in self._running.items()
+                        if not r.stuck and now - r.last_beat < self.lease_seconds]
+                await self.db.renew_job_leases(self.owner, live, self.lease_seconds)
+                if now - last_sweep >= self.sweep_seconds:
+                    last_sweep = now
+                    await self._sweep(now)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Job queue maintenance error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+
+    async def _sweep(self, now: float):
+        for running in list(self._running.values()):
+            if not running.stuck and now - running.last_beat >= self.lease_seconds:
+                running.stuck = True
+                self.swept += 1
+                debug_logger.log_info(f"Background job for task {running.job.task_id} made no progress "
+                                      f"for {self.lease_seconds:.0f}s, cancelling it")
+                running.task.cancel()
+        requeued, exhausted = await self.db.requeue_jobs(self.max_attempts)
+        await self._abandon(exhausted)
+        if requeued:
+            self.requeued += requeued
+            self._wake.set()
+
+    async def _abandon(self, task_ids: List[str]):
+        """Fail tasks whose job ran out of attempts"""
+        for task_id in task_ids:
+            self.abandoned += 1
+            task = await self.db.get_task(task_id)
+            if task and task.status == "processing":
+                await self.db.update_task(task_id, "failed", 0,
+                                          error_message=f"Background polling abandoned after {self.max_attempts} attempts")
+
+    def get_stats(self) -> dict:
+        """Get queue metrics"""
+        return {
+            "owner": self.owner,
+            "workers": self.workers,
+            "running": len(self._running),
+            "lease_seconds": self.lease_seconds,
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "errors": self.errors,
+            "recovered_at_start": self.recovered,
+            "stuck_cancelled": self.swept,
+            "requeued": self.requeued,
+            "abandoned": self.abandoned,
+        }
@@ -85,7 +85,7 @@ class LoadBalancer:
                 if token.sora2_cooldown_until and token.sora2_cooldown_until <= datetime.now():
                     await self.token_manager.refresh_sora2_remaining_if_cooldown_expired(token.id)
                     # Reload token data after refresh
-                    token = await self.token_manager.db.get_token(token.id)
+                    token = await self.token_manager.get_token(token.id)
 
                 # Skip tokens that are in Sora2 cooldown (quota exhausted)
                 if token and token.sora2_cooldown_until and token.sora2_cooldown_until > datetime.now():
@@ -102,12 +102,14 @@ class LoadBalancer:
         # If for image generation, filter out locked tokens and tokens without image enabled
         if for_image_generation:
             available_tokens = []
+            # Only tokens holding a lock need the (expiry-aware) is_locked check
+            lock_holders = set(self.token_lock.get_locked_tokens())
             for token in active_tokens:
                 # Skip tokens that don't have image enabled
                 if not token.image_enabled:
                     continue
 
-                if not await self.token_lock.is_locked(token.id):
+                if token.id not in lock_holders or not await self.token_lock.is_locked(token.id):
                     # Check concurrency limit if concurrency manager is available
                     if self.concurrency_manager and not await self.concurrency_manager.can_use_image(token.id):
                         continue
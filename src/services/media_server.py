@@ -0,0 +1,203 @@
+"""Serving cached media files over HTTP with ETags, conditional requests and byte ranges"""
+import asyncio
+import mimetypes
+import os
+from email.utils import formatdate
+from typing import Dict, Optional, Tuple
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from ..core.config import config
+from .file_cache import FileCache
+
+CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+    ".mov": "video/quicktime",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".avif": "image/avif",
+    ".heic": "image/heic",
+}
+
+
+class RangeNotSatisfiable(Exception):
+    """The Range header selects no byte of the file"""
+
+
+def content_type(filename: str) -> str:
+    """Content type from the extension (the extension was chosen by sniffing the file)"""
+    ext = os.path.splitext(filename)[1].lower()
+    return CONTENT_TYPES.get(ext) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range
+
+    Args:
+        value: Range header
+        size: File size
+
+    Returns:
+        (first, last) byte offsets, inclusive; None when the header should be
+        ignored and the whole file sent (malformed, or several ranges)
+
+    Raises:
+        RangeNotSatisfiable: The range starts past the end of the file
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    if not sep or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def etag_matches(value: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison)"""
+    if value.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in value.split(","))
+
+
+class MediaResponse(Response):
+    """Bytes start..start+length of an open file
+
+    Uses the ASGI zero-copy send extension (sendfile) when the server
+    offers it, pathsend for whole files, otherwise reads ``chunk_size``
+    bytes per worker thread hop with pread. The file is closed once sent.
+    """
+
+    def __init__(self, file, start: int, length: int, status_code: int, headers: Dict[str, str],
+                 chunk_size: int, server: "MediaServer"):
+        super().__init__(status_code=status_code, headers=headers)
+        self.file = file
+        self.start = start
+        self.length = length
+        self.chunk_size = chunk_size
+        self.server = server
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        extensions = scope.get("extensions") or {}
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"] == "HEAD" or self.length == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            elif "http.response.zerocopysend" in extensions:
+                self.server.zero_copy += 1
+                await send({"type": "http.response.zerocopysend", "file": self.file, "offset": self.start,
+                            "count": self.length, "more_body": False})
+            elif "http.response.pathsend" in extensions and self.status_code == 200:
+                self.server.zero_copy += 1
+                await send({"type": "http.response.pathsend", "path": self.file.name})
+            else:
+                await self._send_chunks(send)
+            self.server.bytes_sent += self.length if scope["method"] != "HEAD" else 0
+        finally:
+            self.file.close()
+
+    async def _send_chunks(self, send: Send):
+        fd = self.file.fileno()
+        offset = self.start
+        end = self.start + self.length
+        while offset < end:
+            chunk = await asyncio.to_thread(os.pread, fd, min(self.chunk_size, end - offset), offset)
+            if not chunk:
+                raise RuntimeError(f"{self.file.name} shrank while being sent")
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+
+
+class MediaServer:
+    """Serves files of a FileCache by their cache filename
+
+    Files are looked up in the cache index, never on disk, so a request
+    costs no stat() and marks the file recently used for LRU eviction;
+    expired, evicted and unknown files are 404. The ETag is precomputed
+    per entry from the content hash, so revalidations (If-None-Match) get
+    a 304 without opening the file. Single byte ranges get a 206 (several
+    ranges get the whole file, as RFC 9110 allows). Content-addressed files
+    never change, so they are sent with ``cache.media_cache_control``
+    (long-lived and immutable by default) for browsers and CDNs.
+    """
+
+    def __init__(self, file_cache: FileCache, cache_control: Optional[str] = None,
+                 chunk_size: Optional[int] = None):
+        self.file_cache = file_cache
+        self.cache_control = cache_control or config.cache_media_cache_control
+        self.chunk_size = chunk_size or config.cache_media_chunk_size
+        # Metrics
+        self.responses = {200: 0, 206: 0, 304: 0, 404: 0, 416: 0}
+        self.bytes_sent = 0
+        self.zero_copy = 0
+
+    async def serve(self, filename: str, request: Request) -> Response:
+        """Response for GET/HEAD of a cached file"""
+        entry = self.file_cache.index.get(filename)
+        if entry is None:
+            return self._status(404)
+        headers = {
+            "accept-ranges": "bytes",
+            "cache-control": self.cache_control,
+            "etag": entry.etag,
+            "last-modified": formatdate(entry.created_at, usegmt=True),
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag):
+            return self._status(304, headers)
+
+        start, length, status = 0, entry.size, 200
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header is not None and (if_range is None or if_range in (entry.etag, headers["last-modified"])):
+            try:
+                byte_range = parse_range(range_header, entry.size)
+            except RangeNotSatisfiable:
+                headers["content-range"] = f"bytes */{entry.size}"
+                return self._status(416, headers)
+            if byte_range is not None:
+                start, length, status = byte_range[0], byte_range[1] - byte_range[0] + 1, 206
+                headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{entry.size}"
+
+        try:
+            file = await asyncio.to_thread(open, self.file_cache.cache_dir / filename, "rb")
+        except FileNotFoundError:
+            # Removed behind the index's back
+            self.file_cache.index.remove(filename)
+            return self._status(404)
+        headers["content-length"] = str(length)
+        headers["content-type"] = content_type(filename)
+        self.responses[status] += 1
+        return MediaResponse(file, start, length, status, headers, self.chunk_size, self)
+
+    def _status(self, status: int, headers: Optional[Dict[str, str]] = None) -> Response:
+        self.responses[status] += 1
+        if status == 404:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+        return Response(status_code=status, headers=headers)
+
+    def get_stats(self) -> dict:
+        """Get serving metrics"""
+        return {
+            "responses": {str(status): count for status, count in self.responses.items()},
+            "bytes_sent": self.bytes_sent,
+            "zero_copy_responses": self.zero_copy,
+            "cache_control": self.cache_control,
+            "chunk_size": self.chunk_size,
+        }
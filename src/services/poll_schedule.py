@@ -0,0 +1,109 @@
+"""ETA-driven poll intervals"""
+import random
+from collections import deque
+from typing import Deque, Dict, Optional
+from ..core.config import config
+
+# Weight of the newest progress delta in the smoothed progress rate
+RATE_SMOOTHING = 0.5
+
+
+class DurationHistory:
+    """Recent completion times per model (seconds from submit to done)"""
+
+    def __init__(self, max_samples: int = 200):
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.max_samples)
+        samples.append(seconds)
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        samples = self._samples.get(model)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def get_stats(self) -> dict:
+        return {
+            model: {
+                "samples": len(samples),
+                "p50_seconds": round(self.quantile(model, 0.5), 1),
+                "p90_seconds": round(self.quantile(model, 0.9), 1),
+            }
+            for model, samples in self._samples.items()
+        }
+
+
+class ProgressTracker:
+    """Smoothed progress rate of one job"""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.progress: Optional[float] = None
+        self.updated_at = started_at
+        self.rate: Optional[float] = None  # progress fraction per second
+
+    def observe(self, progress: Optional[float], now: float):
+        if progress is None:
+            return
+        if self.progress is not None and progress > self.progress:
+            rate = (progress - self.progress) / max(now - self.updated_at, 0.001)
+            self.rate = rate if self.rate is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rate
+        if self.progress is None or progress != self.progress:
+            self.progress = progress
+            self.updated_at = now
+
+
+class AdaptivePollSchedule:
+    """Picks the next poll delay from a job's estimated time to completion
+
+    The ETA comes from the smoothed progress rate when the job reports
+    progress, otherwise from the model's historical median (or p90 once the
+    median has passed). The delay is ``eta_fraction`` of the ETA, clamped to
+    [min_interval, max_interval], so jobs far from done back off and jobs near
+    their predicted finish are polled at the minimum interval. Jitter keeps
+    jobs started together from polling in lockstep.
+    """
+
+    def __init__(self, history: Optional[DurationHistory] = None, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, eta_fraction: Optional[float] = None,
+                 jitter: Optional[float] = None):
+        self.history = history or DurationHistory()
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self.eta_fraction = eta_fraction or config.poll_eta_fraction
+        self.jitter = config.poll_jitter if jitter is None else jitter
+
+    @property
+    def min_interval(self) -> float:
+        return self._min_interval or config.poll_min_interval or config.poll_interval
+
+    @property
+    def max_interval(self) -> float:
+        return max(self._max_interval or config.poll_max_interval, self.min_interval)
+
+    def estimate_eta(self, model: Optional[str], elapsed: float, tracker: Optional[ProgressTracker] = None) -> Optional[float]:
+        """Seconds until the job is expected to finish (None if nothing is known)"""
+        if tracker is not None and tracker.rate and tracker.progress is not None:
+            return max(1.0 - tracker.progress, 0.0) / tracker.rate
+        if model:
+            for q in (0.5, 0.9):
+                typical = self.history.quantile(model, q)
+                if typical is not None and typical > elapsed:
+                    return typical - elapsed
+            if self.history.quantile(model, 0.5) is not None:
+                return 0.0  # Overdue
+        return None
+
+    def next_interval(self, model: Optional[str], elapsed: float,
+                      tracker: Optional[ProgressTracker] = None) -> float:
+        eta = self.estimate_eta(model, elapsed, tracker)
+        base = self.min_interval if eta is None else eta * self.eta_fraction
+        base = min(max(base, self.min_interval), self.max_interval)
+        low = max(base * (1 - self.jitter), self.min_interval)
+        return random.uniform(low, max(base * (1 + self.jitter), low))
@@ -0,0 +1,248 @@
+"""Process-wide scheduling of upstream status polls"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+from .rate_limiter import throttle_kind
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """Whether an upstream error is a Cloudflare challenge or a 429
+
+    Classified by throttle_kind from the HTTP status the error carries
+    (UpstreamHTTPError); errors without one (network, parsing) never are.
+    """
+    status_code = getattr(error, "status_code", None)
+    if not isinstance(status_code, int):
+        return False
+    return throttle_kind(status_code, getattr(error, "response_text", "")) is not None
+
+
+class TimerHandle:
+    """A timer scheduled on a TimerWheel"""
+    __slots__ = ("when", "tick", "callback", "cancelled")
+
+    def __init__(self, when: float, tick: int, callback: Callable[[], Any]):
+        self.when = when
+        self.tick = tick
+        self.callback = callback
+        self.cancelled = False
+
+
+class TimerWheel:
+    """Hashed timer wheel driven by a single task
+
+    Timers land in slot ``tick % slots``; each tick the driver fires the
+    timers of one slot whose tick has come and leaves later rounds in place.
+    Scheduling and cancelling are O(1), so thousands of polling tasks cost
+    one sleeping task instead of one sleep each.
+    """
+
+    def __init__(self, resolution: float = 0.05, slots: int = 512):
+        self.resolution = resolution
+        self._slots: List[List[TimerHandle]] = [[] for _ in range(slots)]
+        self._origin = time.monotonic()
+        self._tick = 0  # Last tick processed
+        self._count = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        # Metrics
+        self.fired = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def call_at(self, when: float, callback: Callable[[], Any]) -> TimerHandle:
+        """Run callback at monotonic time ``when`` (rounded up to the resolution)"""
+        tick = max(math.ceil((when - self._origin) / self.resolution), self._tick + 1)
+        handle = TimerHandle(when, tick, callback)
+        self._slots[tick % len(self._slots)].append(handle)
+        self._count += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._wake.set()
+        return handle
+
+    def call_later(self, delay: float, callback: Callable[[], Any]) -> TimerHandle:
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def cancel(self, handle: TimerHandle):
+        # Removed lazily when its slot comes round
+        if not handle.cancelled:
+            handle.cancelled = True
+            self._count -= 1
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._count:
+                    self._wake.clear()
+                    await self._wake.wait()
+                    continue
+                delay = self._origin + (self._tick + 1) * self.resolution - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._advance(int((time.monotonic() - self._origin) / self.resolution))
+        except asyncio.CancelledError:
+            pass
+
+    def _advance(self, now_tick: int):
+        slots = len(self._slots)
+        # After a long stall every slot is visited once
+        for tick in range(max(self._tick + 1, now_tick - slots + 1), now_tick + 1):
+            slot = self._slots[tick % slots]
+            if not slot:
+                continue
+            due = [h for h in slot if not h.cancelled and h.tick <= now_tick]
+            slot[:] = [h for h in slot if not h.cancelled and h.tick > now_tick]
+            for handle in due:
+                self._fire(handle)
+        self._tick = max(self._tick, now_tick)
+
+    def _fire(self, handle: TimerHandle):
+        self._count -= 1
+        handle.cancelled = True
+        lag = max(time.monotonic() - handle.when, 0.0)
+        self.fired += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        try:
+            handle.callback()
+        except Exception as e:
+            debug_logger.log_error(
+                error_message=f"Poll timer callback error: {str(e)}",
+                status_code=0,
+                response_text=""
+            )
+
+    async def stop(self):
+        """Drop all timers and stop the driver task"""
+        for slot in self._slots:
+            slot.clear()
+        self._count = 0
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class PollScheduler:
+    """Owns every upstream status poll tick of the process
+
+    Ticks are timers on one TimerWheel; a tick takes one of
+    ``max_inflight`` global slots before calling upstream, so ticks that fall
+    due together queue instead of bursting. A token that draws a 429 or a
+    Cloudflare challenge is paused (doubling per repeat, up to
+    ``pause_max_seconds``) and its polls resume afterwards instead of
+    failing their tasks.
+    """
+
+    def __init__(self, max_inflight: Optional[int] = None, pause_seconds: Optional[float] = None,
+                 pause_max_seconds: Optional[float] = None, resolution: float = 0.05):
+        self.wheel = TimerWheel(resolution)
+        self.max_inflight = max_inflight or config.poll_max_inflight
+        self.pause_seconds = pause_seconds or config.poll_throttle_pause_seconds
+        self.pause_max_seconds = pause_max_seconds or config.poll_throttle_pause_max_seconds
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        # key -> (paused until, consecutive throttles)
+        self._paused: Dict[Any, Tuple[float, int]] = {}
+        # Metrics
+        self.inflight = 0
+        self.waiting = 0
+        self.ticks = 0
+        self.tick_lag_total = 0.0
+        self.tick_lag_max = 0.0
+        self.throttle_pauses = 0
+
+    def call_at(self, when: float, callback: Callable[[], Any]) -> TimerHandle:
+        return self.wheel.call_at(when, callback)
+
+    def cancel(self, handle: TimerHandle):
+        self.wheel.cancel(handle)
+
+    @asynccontextmanager
+    async def slot(self, due: Optional[float] = None):
+        """Hold one of the global in-flight upstream poll slots
+
+        Args:
+            due: When the tick was scheduled to run, for tick lag metrics
+        """
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        self.ticks += 1
+        if due is not None:
+            lag = max(time.monotonic() - due, 0.0)
+            self.tick_lag_total += lag
+            self.tick_lag_max = max(self.tick_lag_max, lag)
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._slots.release()
+
+    def paused_until(self, key) -> float:
+        """Monotonic time until which polling for key is paused (0 if not paused)"""
+        paused = self._paused.get(key)
+        return paused[0] if paused else 0.0
+
+    def pause(self, key) -> float:
+        """Pause polling for key after a throttle response; returns the pause length"""
+        _, strikes = self._paused.get(key, (0.0, 0))
+        seconds = min(self.pause_seconds * (2 ** strikes), self.pause_max_seconds)
+        self._paused[key] = (time.monotonic() + seconds, strikes + 1)
+        self.throttle_pauses += 1
+        return seconds
+
+    def resume(self, key):
+        """Reset the pause backoff of key after a successful poll"""
+        self._paused.pop(key, None)
+
+    async def sleep(self, key, delay: float):
+        """Sleep on the wheel for delay seconds, extended while key is paused"""
+        when = max(time.monotonic() + delay, self.paused_until(key))
+        while True:
+            future = asyncio.get_running_loop().create_future()
+            handle = self.wheel.call_at(when, lambda: future.done() or future.set_result(None))
+            try:
+                await future
+            except asyncio.CancelledError:
+                self.wheel.cancel(handle)
+                raise
+            when = self.paused_until(key)
+            if when <= time.monotonic():
+                return
+
+    async def stop(self):
+        await self.wheel.stop()
+
+    def get_stats(self) -> dict:
+        """Get scheduler metrics"""
+        now = time.monotonic()
+        wheel = self.wheel
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            # Timers not yet due plus due ticks waiting for an in-flight slot
+            "queue_depth": len(wheel) + self.waiting,
+            "scheduled_timers": len(wheel),
+            "waiting_for_slot": self.waiting,
+            "ticks": self.ticks,
+            "avg_tick_lag_ms": round(self.tick_lag_total / self.ticks * 1000, 1) if self.ticks else 0,
+            "max_tick_lag_ms": round(self.tick_lag_max * 1000, 1),
+            "avg_timer_lag_ms": round(wheel.lag_total / wheel.fired * 1000, 1) if wheel.fired else 0,
+            "max_timer_lag_ms": round(wheel.lag_max * 1000, 1),
+            "throttle_pauses": self.throttle_pauses,
+            "paused_tokens": sum(1 for until, _ in self._paused.values() if until > now),
+        }
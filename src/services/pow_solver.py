@@ -0,0 +1,178 @@
+"""Multi-process proof-of-work solver for sentinel tokens"""
+import asyncio
+import bisect
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+from ..utils import pow as pow_search
+
+# Maximum number of solves that can be in flight at once (one cancel flag each)
+CANCEL_SLOTS = 256
+
+LATENCY_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+ITERATION_BUCKETS = [100, 1000, 5000, 10000, 50000, 100000, 250000, 500000]
+
+
+class Histogram:
+    """Fixed-bucket histogram (bucket i counts values <= bounds[i]; the last bucket is overflow)"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2) if self.count else 0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class PowSolver:
+    """Runs the SHA3-512 nonce search in a ProcessPoolExecutor
+
+    The nonce space is interleaved across ``workers`` processes. The first
+    worker to find a solution wins and the others are told to stop through
+    a shared flag. Searches expected to take fewer than ``inline_max_expected``
+    hashes (e.g. the easy initial token) run inline, where process
+    round-trips would cost more than the hashing.
+    """
+
+    def __init__(self, max_iterations: int, workers: Optional[int] = None,
+                 inline_max_expected: Optional[int] = None):
+        self.max_iterations = max_iterations
+        self.workers = workers or config.pow_workers or os.cpu_count() or 1
+        self.inline_max_expected = inline_max_expected if inline_max_expected is not None else config.pow_inline_max_expected
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cancel_flags = None
+        self._free_slots: List[int] = list(range(CANCEL_SLOTS))
+        self._slot_available = asyncio.Event()
+        # Metrics
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.iterations = Histogram(ITERATION_BUCKETS)
+        self._solved = 0
+        self._failed = 0
+        self._inline = 0
+        self._pool_errors = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: never fork the event loop process with its threads and open connections
+            ctx = multiprocessing.get_context("spawn")
+            self._cancel_flags = ctx.Array("b", CANCEL_SLOTS, lock=False)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=pow_search.init_worker,
+                initargs=(self._cancel_flags,)
+            )
+        return self._executor
+
+    async def _acquire_slot(self) -> int:
+        while not self._free_slots:
+            self._slot_available.clear()
+            await self._slot_available.wait()
+        slot = self._free_slots.pop()
+        self._cancel_flags[slot] = 0
+        return slot
+
+    def _release_slot(self, slot: int):
+        self._free_slots.append(slot)
+        self._slot_available.set()
+
+    async def _search_pool(self, seed: str, difficulty: str, segments) -> Tuple[Optional[int], Optional[str], int]:
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        slot = await self._acquire_slot()
+        futures = [
+            loop.run_in_executor(executor, pow_search.search, seed, difficulty, segments, start, stop, step, slot)
+            for start, stop, step in pow_search.partition(self.max_iterations, self.workers)
+        ]
+        try:
+            pending = set(futures)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    nonce, solution, _ = future.result()
+                    if solution is not None:
+                        return nonce, solution, nonce + 1
+            return None, None, self.max_iterations
+        finally:
+            # Stop the losers; they notice within CANCEL_CHECK_INTERVAL iterations
+            self._cancel_flags[slot] = 1
+            if any(not f.done() for f in futures):
+                await asyncio.wait(futures)
+            self._release_slot(slot)
+
+    async def solve(self, seed: str, difficulty: str, config_list: list) -> Tuple[str, bool]:
+        """Find a nonce whose hash meets the difficulty
+
+        Returns:
+            (base64 solution, True) or (error token, False) if none was found
+        """
+        start = time.monotonic()
+        segments = pow_search.build_segments(config_list)
+
+        result = None
+        if pow_search.expected_iterations(difficulty) > self.inline_max_expected:
+            try:
+                result = await self._search_pool(seed, difficulty, segments)
+            except Exception as e:
+                # A broken pool (e.g. a worker was killed) is rebuilt on next use
+                self._pool_errors += 1
+                self._executor = None
+                debug_logger.log_error(
+                    error_message=f"PoW process pool failed, solving in a thread: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+                result = await asyncio.to_thread(
+                    pow_search.search, seed, difficulty, segments, 0, self.max_iterations
+                )
+        if result is None:
+            self._inline += 1
+            result = pow_search.search(seed, difficulty, segments, 0, self.max_iterations)
+
+        nonce, solution, iterations = result
+        if nonce is not None:
+            iterations = nonce + 1
+        self.latency_ms.observe((time.monotonic() - start) * 1000)
+        self.iterations.observe(iterations)
+
+        if solution is None:
+            self._failed += 1
+            return pow_search.error_token(seed), False
+        self._solved += 1
+        return solution, True
+
+    def shutdown(self):
+        """Stop worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> dict:
+        """Get solver metrics"""
+        return {
+            "workers": self.workers,
+            "pool_running": self._executor is not None,
+            "solved": self._solved,
+            "failed": self._failed,
+            "inline": self._inline,
+            "pool_errors": self._pool_errors,
+            "in_flight": CANCEL_SLOTS - len(self._free_slots),
+            "latency_ms": self.latency_ms.to_dict(),
+            "iterations": self.iterations.to_dict(),
+        }
@@ -26,12 +26,15 @@ class ProxyManager:
 
         # If token_id is provided, try to get token-specific proxy first
         if token_id is not None:
-            token = await self.db.get_token(token_id)
+            if self.db.token_registry.loaded:
+                token = self.db.token_registry.get(token_id)
+            else:
+                token = await self.db.get_token(token_id)
             if token and token.proxy_url:
                 return token.proxy_url
 
-        # Fall back to global proxy
-        config = await self.db.get_proxy_config()
+        # Fall back to global proxy (lock-free snapshot read)
+        config = (await self.db.get_config_snapshot()).proxy
         if config.proxy_enabled and config.proxy_url:
             return config.proxy_url
         return None
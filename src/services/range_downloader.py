@@ -0,0 +1,285 @@
+"""Resumable, segmented HTTP downloads into a file (runs in worker threads)"""
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from curl_cffi import Curl, CurlError, CurlOpt
+from curl_cffi.curl import CURL_WRITEFUNC_ERROR
+from ..core.config import config
+
+# Statuses worth retrying; anything else (403 expired signature, 404, ...) fails at once
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    """A request failed; retryable tells whether sending it again may help"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class RangeIgnored(DownloadError):
+    """The origin answered a ranged request with the whole body"""
+
+
+class DownloadResult:
+    """Outcome of RangeDownloader.download"""
+
+    def __init__(self, size: int, sha256: str, requests: int, resumes: int, segments: int):
+        self.size = size
+        self.sha256 = sha256
+        self.requests = requests
+        self.resumes = resumes
+        self.segments = segments
+
+
+class _Transfer:
+    """One request: checks the response before the first body byte, then writes at its offset"""
+
+    def __init__(self, fd: int, start: int, end: Optional[int], chunk_size: int, hasher=None):
+        self.fd = fd
+        self.start = start
+        self.end = end
+        self.chunk_size = chunk_size
+        self.hasher = hasher
+        self.status = 0
+        self.content_range: Optional[str] = None
+        self.content_length: Optional[int] = None
+        self.total: Optional[int] = None
+        self.ranged = False
+        self.written = 0
+        self.buffer = bytearray()
+        self.error: Optional[DownloadError] = None
+        self.checked = False
+
+    def on_header(self, line: bytes):
+        if line.startswith(b"HTTP/"):
+            # New response (after a redirect or proxy CONNECT): forget the previous headers
+            parts = line.split(None, 2)
+            self.status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+            self.content_range = None
+            self.content_length = None
+        else:
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-range":
+                self.content_range = value.strip().decode("latin-1")
+            elif name == b"content-length" and value.strip().isdigit():
+                self.content_length = int(value.strip())
+        return len(line)
+
+    def check(self) -> Optional[DownloadError]:
+        """Validate status and Content-Range against the requested range"""
+        self.checked = True
+        if self.status == 206:
+            match = _CONTENT_RANGE.match(self.content_range or "")
+            if not match or int(match.group(1)) != self.start:
+                return DownloadError(f"Unexpected Content-Range {self.content_range!r} for offset {self.start}",
+                                     retryable=False)
+            self.ranged = True
+            self.total = int(match.group(3)) if match.group(3) != "*" else None
+            return None
+        if self.status == 200:
+            if self.start > 0:
+                return RangeIgnored("Origin ignored the Range header")
+            self.total = self.content_length
+            return None
+        return DownloadError(f"Download failed: HTTP {self.status}", retryable=self.status in RETRY_STATUS)
+
+    def on_data(self, data: bytes):
+        if not self.checked:
+            self.error = self.check()
+        if self.error is not None:
+            return CURL_WRITEFUNC_ERROR
+        self.buffer.extend(data)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.hasher is not None:
+            self.hasher.update(self.buffer)
+        offset = self.start + self.written
+        done = 0
+        with memoryview(self.buffer) as view:
+            while done < len(view):
+                done += os.pwrite(self.fd, view[done:], offset + done)
+        self.written += len(self.buffer)
+        self.buffer.clear()
+
+    def expected(self) -> Optional[int]:
+        """Bytes this response should carry, if known"""
+        if self.ranged and self.end is not None:
+            last = self.end if self.total is None else min(self.end, self.total - 1)
+            return last - self.start + 1
+        return self.content_length
+
+
+class RangeDownloader:
+    """Download a URL into a file with HTTP Range requests
+
+    The first request asks for the first ``segment_size`` bytes. If the
+    origin answers 206 with the total size, the rest is fetched in
+    ``segment_size`` pieces over up to ``parallel_segments`` connections,
+    each written in place with pwrite; if it answers 200 the whole body is
+    streamed from that request. A request that fails (connection error,
+    stall, 429/5xx, short body) is sent again from the last byte written,
+    up to ``retries`` times per segment, so a download that dies at 90%
+    resumes at 90%; an origin without Range support restarts from zero.
+
+    A request is aborted when it moves less than 1 KB/s for
+    ``progress_timeout`` seconds; ranged segment requests are also limited
+    to ``segment_timeout`` seconds in total. The first request is bounded by
+    the progress timeout only, since it may turn out to carry the whole
+    body. Memory is bounded by ``chunk_size`` per connection.
+
+    The SHA-256 of the content is computed while writing when bytes arrive
+    in order (one connection), otherwise in one read pass at the end.
+    """
+
+    def __init__(self, proxy_url: Optional[str] = None, chunk_size: Optional[int] = None,
+                 segment_size: Optional[int] = None, parallel_segments: Optional[int] = None,
+                 retries: Optional[int] = None, progress_timeout: Optional[float] = None,
+                 segment_timeout: Optional[float] = None, impersonate: Optional[str] = "chrome"):
+        self.proxy_url = proxy_url
+        self.chunk_size = chunk_size or config.cache_download_chunk_size
+        self.segment_size = segment_size or config.cache_download_segment_size
+        self.parallel_segments = parallel_segments or config.cache_download_parallel_segments
+        self.retries = config.cache_download_retries if retries is None else retries
+        self.progress_timeout = progress_timeout or config.cache_download_progress_timeout
+        self.segment_timeout = segment_timeout or config.cache_download_segment_timeout
+        self.impersonate = impersonate
+        self._local = threading.local()
+        self._curls: List[Curl] = []
+        self._lock = threading.Lock()
+        self.hasher = hashlib.sha256()
+        self.requests = 0
+        self.resumes = 0
+
+    def _curl(self) -> Curl:
+        """Curl handle of the calling thread, kept for connection reuse across its segments"""
+        curl = getattr(self._local, "curl", None)
+        if curl is None:
+            curl = self._local.curl = Curl()
+            if self.impersonate:
+                curl.impersonate(self.impersonate)
+            with self._lock:
+                self._curls.append(curl)
+        return curl
+
+    def _perform(self, url: str, transfer: _Transfer, timeout: float):
+        curl = self._curl()
+        curl.setopt(CurlOpt.URL, url.encode())
+        curl.setopt(CurlOpt.HTTPHEADER, [b"Accept-Encoding: identity"])
+        curl.setopt(CurlOpt.RANGE, f"{transfer.start}-{'' if transfer.end is None else transfer.end}".encode())
+        curl.setopt(CurlOpt.FOLLOWLOCATION, 1)
+        curl.setopt(CurlOpt.MAXREDIRS, 5)
+        curl.setopt(CurlOpt.NOSIGNAL, 1)
+        curl.setopt(CurlOpt.CONNECTTIMEOUT, int(min(self.progress_timeout, 30)))
+        curl.setopt(CurlOpt.TIMEOUT, int(timeout))
+        curl.setopt(CurlOpt.LOW_SPEED_LIMIT, 1024)
+        curl.setopt(CurlOpt.LOW_SPEED_TIME, int(self.progress_timeout))
+        curl.setopt(CurlOpt.BUFFERSIZE, min(self.chunk_size, 512 * 1024))
+        if self.proxy_url:
+            curl.setopt(CurlOpt.PROXY, self.proxy_url.encode())
+        curl.setopt(CurlOpt.HEADERFUNCTION, transfer.on_header)
+        curl.setopt(CurlOpt.WRITEFUNCTION, transfer.on_data)
+        with self._lock:
+            self.requests += 1
+        try:
+            curl.perform()
+        except CurlError as e:
+            if transfer.error is not None:
+                raise transfer.error
+            raise DownloadError(f"Download interrupted: {str(e)}")
+        finally:
+            # Bytes received before an error are valid; keep them so a retry resumes after them
+            transfer.flush()
+        if not transfer.checked:
+            # Empty body: the callback never ran
+            error = transfer.check()
+            if error is not None:
+                raise error
+        expected = transfer.expected()
+        if expected is not None and transfer.written < expected:
+            raise DownloadError(f"Connection closed after {transfer.written} of {expected} bytes")
+
+    def _fetch(self, url: str, fd: int, start: int, end: Optional[int], sequential: bool,
+               timeout: float) -> _Transfer:
+        """Fetch bytes start..end (inclusive; None = to the end), resuming after failures
+
+        Returns:
+            The last transfer, describing the response
+        """
+        pos = start
+        attempt = 0
+        while True:
+            transfer = _Transfer(fd, pos, end, self.chunk_size, self.hasher if sequential else None)
+            try:
+                self._perform(url, transfer, timeout)
+                return transfer
+            except DownloadError as e:
+                pos += transfer.written
+                if not e.retryable or attempt >= self.retries:
+                    raise
+                attempt += 1
+                if transfer.status == 200 or isinstance(e, RangeIgnored):
+                    if start > 0 or not sequential:
+                        raise DownloadError("Origin stopped honouring Range requests", retryable=False)
+                    # No Range support: the only way to resume is from the start
+                    pos = 0
+                    os.ftruncate(fd, 0)
+                    self.hasher = hashlib.sha256()
+                else:
+                    with self._lock:
+                        self.resumes += 1
+                time.sleep(min(2 ** (attempt - 1), 10))
+
+    def download(self, url: str, path) -> DownloadResult:
+        """Download url into path (created or truncated); fsyncs before returning"""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # The first segment also tells whether the origin supports ranges, and the total size
+            first = self._fetch(url, fd, 0, self.segment_size - 1, sequential=True, timeout=0)
+            segments: List[Tuple[int, int]] = []
+            if first.ranged and first.total is not None:
+                segments = [(start, min(start + self.segment_size, first.total) - 1)
+                            for start in range(self.segment_size, first.total, self.segment_size)]
+            parallel = min(self.parallel_segments, len(segments))
+            if parallel > 1:
+                with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="range-segment") as pool:
+                    list(pool.map(lambda seg: self._fetch(url, fd, seg[0], seg[1], False, self.segment_timeout),
+                                  segments))
+                sha256 = self._hash_file(fd)
+            else:
+                for start, end in segments:
+                    self._fetch(url, fd, start, end, True, self.segment_timeout)
+                sha256 = self.hasher.hexdigest()
+            size = os.fstat(fd).st_size
+            if first.ranged and first.total is not None and size != first.total:
+                raise DownloadError(f"Downloaded {size} of {first.total} bytes", retryable=False)
+            os.fsync(fd)
+            return DownloadResult(size, sha256, self.requests, self.resumes, len(segments) + 1)
+        finally:
+            os.close(fd)
+            for curl in self._curls:
+                curl.close()
+            self._curls.clear()
+
+    def _hash_file(self, fd: int) -> str:
+        digest = hashlib.sha256()
+        offset = 0
+        while True:
+            block = os.pread(fd, self.chunk_size, offset)
+            if not block:
+                return digest.hexdigest()
+            digest.update(block)
+            offset += len(block)
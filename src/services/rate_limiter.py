@@ -0,0 +1,245 @@
+"""Token-bucket rate limiting of Sora API calls per access token"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from ..core.config import config
+
+# (requests per second, burst) per endpoint class and access token
+DEFAULT_CLASS_LIMITS: Dict[str, Tuple[float, float]] = {
+    "generate": (0.2, 3),
+    "poll": (2.0, 6),
+    "account": (0.5, 3),
+    "publish": (0.5, 3),
+    "upload": (0.5, 3),
+    "default": (1.0, 5),
+}
+
+# Path prefixes (below /backend) of each endpoint class, checked in order
+ENDPOINT_CLASSES = (
+    ("poll", ("/nf/pending", "/project_y/profile/drafts", "/v2/recent_tasks", "/project_y/cameos/in_progress")),
+    ("generate", ("/video_gen", "/nf/create", "/editor/enhance_prompt")),
+    ("upload", ("/uploads", "/characters/upload", "/project_y/file/upload")),
+    ("publish", ("/project_y/post", "/project_y/characters", "/characters/finalize", "/project_y/cameos")),
+    ("account", ("/me", "/m/bootstrap", "/billing", "/nf/check", "/project_y/invite", "/project_y/profile")),
+)
+
+# Buckets untouched this long are dropped
+IDLE_BUCKET_SECONDS = 600
+
+
+def classify_endpoint(endpoint: str) -> str:
+    """Endpoint class of an API path ("/nf/pending/v2") or full backend URL"""
+    path = urlsplit(endpoint).path
+    if path.startswith("/backend/"):
+        path = path[len("/backend"):]
+    for endpoint_class, prefixes in ENDPOINT_CLASSES:
+        if path.startswith(prefixes):
+            return endpoint_class
+    return "default"
+
+
+def throttle_kind(status_code: int, text: str = "") -> Optional[str]:
+    """"cloudflare" for a CF shield/challenge, "rate_limit" for a plain 429, else None"""
+    if status_code not in (403, 429):
+        return None
+    body = (text or "")[:2000].lower()
+    if "cf_shield" in body or "cloudflare" in body or "just a moment" in body:
+        return "cloudflare"
+    return "rate_limit" if status_code == 429 else None
+
+
+class TokenBucket:
+    """Token bucket whose refill rate backs off on throttling and recovers linearly
+
+    ``reserve`` always takes a token, letting the balance go negative, and
+    returns how long the caller must wait for it, so concurrent callers
+    queue in order without polling.
+    """
+
+    def __init__(self, rate: float, burst: float, min_fraction: float, recovery_seconds: float):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.min_fraction = min_fraction
+        self.recovery_seconds = recovery_seconds
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.throttled_at = 0.0
+        self.throttles = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed <= 0:
+            return
+        self.tokens = min(self.tokens + elapsed * self.rate, self.burst)
+        if self.rate < self.base_rate:
+            self.rate = min(self.rate + self.base_rate * elapsed / self.recovery_seconds, self.base_rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Take one token; returns seconds until it is actually available"""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def throttle(self, now: float):
+        """Halve the refill rate (down to min_fraction of the configured rate) and drop any burst
+
+        429s from requests already in flight at the last decrease do not
+        halve the rate again.
+        """
+        self._refill(now)
+        self.throttles += 1
+        if now - self.throttled_at < max(1 / self.rate, 1.0):
+            return
+        self.throttled_at = now
+        self.rate = max(self.rate / 2, self.base_rate * self.min_fraction)
+        self.tokens = min(self.tokens, 0)
+
+
+class UpstreamRateLimiter:
+    """Per-token, per-endpoint-class token buckets plus one global bucket
+
+    Every Sora API call reserves a token from its (access token, endpoint
+    class) bucket and, if ``global_rate`` is set, from the global bucket,
+    waiting for whichever is later. A 429 halves the refill rate of the
+    token's bucket; a Cloudflare challenge, which applies to the whole
+    egress IP, also halves the global one. Rates then recover linearly to the configured value over
+    ``recovery_seconds``.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self._enabled = enabled
+        self._global: Optional[TokenBucket] = None
+        self._buckets: Dict[Tuple[Any, str], TokenBucket] = {}
+        # Access token -> token_id, learned from calls that know it
+        self._token_ids: Dict[str, int] = {}
+        self._last_prune = time.monotonic()
+        # Metrics
+        self.requests = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.throttled: Dict[str, int] = {"rate_limit": 0, "cloudflare": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return config.rate_limit_enabled if self._enabled is None else self._enabled
+
+    def _new_bucket(self, rate: float, burst: float) -> TokenBucket:
+        return TokenBucket(rate, burst, config.rate_limit_min_fraction, config.rate_limit_recovery_seconds)
+
+    def _global_bucket(self) -> Optional[TokenBucket]:
+        """Bucket shared by all tokens; None when global_rate is 0 (disabled)"""
+        if self._global is None and config.rate_limit_global_rate > 0:
+            self._global = self._new_bucket(config.rate_limit_global_rate, config.rate_limit_global_burst)
+        return self._global
+
+    def _key(self, token: str, token_id: Optional[int]):
+        if token_id is not None:
+            self._token_ids[token] = token_id
+            return token_id
+        return self._token_ids.get(token, token)
+
+    def _bucket(self, key, endpoint_class: str) -> TokenBucket:
+        bucket = self._buckets.get((key, endpoint_class))
+        if bucket is None:
+            rate, burst = DEFAULT_CLASS_LIMITS.get(endpoint_class, DEFAULT_CLASS_LIMITS["default"])
+            overrides = config.rate_limit_classes.get(endpoint_class, {})
+            bucket = self._buckets[(key, endpoint_class)] = self._new_bucket(
+                overrides.get("rate", rate), overrides.get("burst", burst)
+            )
+        return bucket
+
+    def _prune(self, now: float):
+        self._last_prune = now
+        for bucket_key, bucket in list(self._buckets.items()):
+            if now - bucket.updated > IDLE_BUCKET_SECONDS:
+                del self._buckets[bucket_key]
+        live_keys = {key for key, _ in self._buckets}
+        for token, token_id in list(self._token_ids.items()):
+            if token_id not in live_keys:
+                del self._token_ids[token]
+
+    async def acquire(self, token: str, token_id: Optional[int], endpoint_class: str) -> float:
+        """Wait until a call of endpoint_class for this token may go out; returns the wait"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        if now - self._last_prune > IDLE_BUCKET_SECONDS:
+            self._prune(now)
+        key = self._key(token, token_id)
+        wait = self._bucket(key, endpoint_class).reserve(now)
+        global_bucket = self._global_bucket()
+        if global_bucket is not None:
+            wait = max(wait, global_bucket.reserve(now))
+        self.requests += 1
+        if wait > 0:
+            self.delayed += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            await asyncio.sleep(wait)
+        return wait
+
+    def record(self, token: str, token_id: Optional[int], endpoint_class: str, status_code: int, text: str = ""):
+        """Feed a response status back so throttling slows this token (and, for Cloudflare, everyone)"""
+        if not self.enabled:
+            return
+        kind = throttle_kind(status_code, text)
+        if kind is None:
+            return
+        now = time.monotonic()
+        self.throttled[kind] += 1
+        self._bucket(self._key(token, token_id), endpoint_class).throttle(now)
+        global_bucket = self._global_bucket()
+        if kind == "cloudflare" and global_bucket is not None:
+            global_bucket.throttle(now)
+
+    async def send(self, token: str, token_id: Optional[int], endpoint: str, request: Callable[[], Awaitable[Any]]):
+        """Rate-limit and send one request
+
+        Args:
+            token: Access token the call is made with
+            token_id: Token ID if known
+            endpoint: API path or full URL, used to pick the endpoint class
+            request: Sends the request and returns the curl_cffi response
+        """
+        endpoint_class = classify_endpoint(endpoint)
+        await self.acquire(token, token_id, endpoint_class)
+        response = await request()
+        self.record(token, token_id, endpoint_class, response.status_code, response.text)
+        return response
+
+    def get_stats(self) -> dict:
+        """Get limiter metrics"""
+        global_bucket = self._global_bucket()
+        throttled_buckets = [
+            {
+                "token_id": key if isinstance(key, int) else None,
+                "endpoint_class": endpoint_class,
+                "rate": round(bucket.rate, 3),
+                "configured_rate": bucket.base_rate,
+                "throttles": bucket.throttles,
+            }
+            for (key, endpoint_class), bucket in self._buckets.items()
+            if bucket.rate < bucket.base_rate
+        ]
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "avg_wait_ms": round(self.wait_total / self.delayed * 1000, 1) if self.delayed else 0,
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+            "throttled_responses": dict(self.throttled),
+            "global": {
+                "rate": round(global_bucket.rate, 3),
+                "configured_rate": global_bucket.base_rate,
+                "throttles": global_bucket.throttles,
+            } if global_bucket is not None else None,
+            "buckets": len(self._buckets),
+            "throttled_buckets": throttled_buckets,
+        }
+
+
+rate_limiter = UpstreamRateLimiter()
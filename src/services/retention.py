@@ -0,0 +1,136 @@
+"""Retention job for request_logs and tasks"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from ..core.config import config
+from ..core.database import Database
+from ..core.logger import debug_logger
+
+
+class RetentionManager:
+    """Prunes request_logs and tasks by age and row count, then vacuums
+
+    Rows are deleted in batches of ``batch_size``, each in its own short write
+    transaction, so the single writer is never held for long. Freed pages
+    are returned to the filesystem with ``PRAGMA incremental_vacuum``.
+    """
+
+    TABLES = ("request_logs", "tasks")
+
+    def __init__(self, db: Database, interval_seconds: Optional[int] = None,
+                 batch_size: Optional[int] = None):
+        self.db = db
+        self.interval = interval_seconds or config.retention_interval_seconds
+        self.batch_size = batch_size or config.retention_batch_size
+        self._run_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Metrics
+        self._runs = 0
+        self._errors = 0
+        self._rows_pruned: Dict[str, int] = {table: 0 for table in self.TABLES}
+        self._bytes_reclaimed = 0
+        self._time_spent = 0.0
+        self._last_run: Optional[dict] = None
+        self._last_error: Optional[str] = None
+
+    async def start(self):
+        """Start background retention task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._retention_loop())
+
+    async def stop(self):
+        """Stop background retention task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _retention_loop(self):
+        """Background task that enforces retention every interval"""
+        while True:
+            try:
+                await self.run_once()
+                await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self._errors += 1
+                self._last_error = str(e)
+                debug_logger.log_error(
+                    error_message=f"Retention job error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+                await asyncio.sleep(self.interval)
+
+    async def _prune_table(self, table: str) -> int:
+        policy = config.get_retention_policy(table)
+        cutoff = None
+        if policy["max_age_days"] > 0:
+            cutoff_dt = datetime.now(timezone.utc) - timedelta(days=policy["max_age_days"])
+            cutoff = cutoff_dt.strftime("%Y-%m-%d %H:%M:%S")
+        max_id = 0
+        if policy["max_rows"] > 0:
+            max_id = await self.db.get_prune_threshold_id(table, policy["max_rows"])
+        if cutoff is None and max_id == 0:
+            return 0
+
+        pruned = 0
+        while True:
+            deleted = await self.db.prune_batch(table, cutoff, max_id, self.batch_size)
+            pruned += deleted
+            if deleted < self.batch_size:
+                return pruned
+            # Let queued writers in before the next batch
+            await asyncio.sleep(0)
+
+    async def run_once(self) -> dict:
+        """Prune all tables and vacuum once; returns stats for this run"""
+        async with self._run_lock:
+            start = time.monotonic()
+            rows_pruned = {}
+            for table in self.TABLES:
+                rows_pruned[table] = await self._prune_table(table)
+                self._rows_pruned[table] += rows_pruned[table]
+
+            bytes_reclaimed = 0
+            if any(rows_pruned.values()):
+                bytes_reclaimed = await self.db.incremental_vacuum(config.retention_vacuum_pages)
+            elapsed = time.monotonic() - start
+
+            self._runs += 1
+            self._bytes_reclaimed += bytes_reclaimed
+            self._time_spent += elapsed
+            self._last_run = {
+                "finished_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "rows_pruned": rows_pruned,
+                "bytes_reclaimed": bytes_reclaimed,
+                "duration_ms": round(elapsed * 1000, 2),
+            }
+            if any(rows_pruned.values()):
+                debug_logger.log_info(
+                    f"Retention pruned {rows_pruned}, reclaimed {bytes_reclaimed} bytes "
+                    f"in {elapsed * 1000:.0f} ms"
+                )
+            return self._last_run
+
+    async def get_stats(self) -> dict:
+        """Get cumulative retention metrics and current database storage info"""
+        return {
+            "enabled": self._task is not None,
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "policies": {table: config.get_retention_policy(table) for table in self.TABLES},
+            "runs": self._runs,
+            "errors": self._errors,
+            "last_error": self._last_error,
+            "rows_pruned": dict(self._rows_pruned),
+            "bytes_reclaimed": self._bytes_reclaimed,
+            "time_spent_ms": round(self._time_spent * 1000, 2),
+            "last_run": self._last_run,
+            "storage": await self.db.get_storage_info(),
+        }
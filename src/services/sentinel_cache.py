@@ -0,0 +1,239 @@
+"""Prefetch cache for sentinel tokens"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+from ..core.config import config
+from ..core.logger import debug_logger
+from .pow_solver import Histogram
+
+# (proxy_url, user_agent, flow) - a token is only valid for the identity it was generated with
+SentinelKey = Tuple[Optional[str], str, str]
+SentinelGenerator = Callable[[], Awaitable[Optional[str]]]
+
+AGE_BUCKETS_SECONDS = [1, 5, 15, 30, 60, 120, 300, 600]
+
+# Weight of the newest inter-arrival gap in the demand estimate
+DEMAND_SMOOTHING = 0.3
+
+
+class _KeyState:
+    """Stock and demand estimate for one (proxy, user agent, flow)"""
+
+    def __init__(self, generator: SentinelGenerator):
+        self.generator = generator
+        self.stock: Deque[Tuple[float, str]] = deque()
+        self.refilling = 0
+        self.last_demand: Optional[float] = None
+        # Requests per second (exponentially smoothed)
+        self.rate = 0.0
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def record_demand(self, now: float):
+        if self.last_demand is not None:
+            gap = max(now - self.last_demand, 0.001)
+            self.rate = DEMAND_SMOOTHING * (1.0 / gap) + (1 - DEMAND_SMOOTHING) * self.rate
+        self.last_demand = now
+
+    def current_rate(self, now: float) -> float:
+        """Demand rate, decayed when no request arrived for longer than the usual gap"""
+        if self.last_demand is None:
+            return 0.0
+        return min(self.rate, 1.0 / max(now - self.last_demand, 0.001))
+
+
+class SentinelCache:
+    """Keeps a small stock of fresh sentinel tokens per (proxy, user agent, flow)
+
+    Callers pop a token with ``get``; on a miss the token is generated inline
+    and generator errors propagate to the caller.
+    Every request updates a smoothed demand rate for its key, and the stock
+    target is the number of tokens that demand consumes while one token is
+    being generated, bounded by ``max_stock`` and by what can be used within
+    ``ttl_seconds``. Tokens older than the TTL are dropped, and keys with no
+    demand for ``idle_seconds`` stop being refilled.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, ttl_seconds: Optional[float] = None,
+                 max_stock: Optional[int] = None, idle_seconds: Optional[float] = None,
+                 refill_concurrency: Optional[int] = None):
+        self.enabled = config.sentinel_cache_enabled if enabled is None else enabled
+        self.ttl_seconds = ttl_seconds or config.sentinel_cache_ttl_seconds
+        self.max_stock = max_stock or config.sentinel_cache_max_stock
+        self.idle_seconds = idle_seconds or config.sentinel_cache_idle_seconds
+        self._refill_semaphore = asyncio.Semaphore(refill_concurrency or config.sentinel_cache_refill_concurrency)
+        self._keys: Dict[SentinelKey, _KeyState] = {}
+        self._refill_tasks: Set[asyncio.Task] = set()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._generated = 0
+        self._generation_failures = 0
+        self._total_generation = 0.0
+        self.served_age = Histogram(AGE_BUCKETS_SECONDS)
+
+    async def get(self, key: SentinelKey, generator: SentinelGenerator) -> Optional[str]:
+        """Pop a fresh token for ``key``, or generate one with ``generator`` on a miss
+
+        ``generator`` is kept and used for background refills of this key.
+        """
+        if not self.enabled:
+            return await generator()
+
+        now = time.monotonic()
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState(generator)
+        state.generator = generator
+        state.record_demand(now)
+        self._ensure_maintenance()
+
+        token = self._pop_fresh(state, now)
+        self._schedule_refill(key, state)
+        if token is not None:
+            self._hits += 1
+            return token
+
+        self._misses += 1
+        return await self._generate(state, raise_errors=True)
+
+    def _pop_fresh(self, state: _KeyState, now: float) -> Optional[str]:
+        while state.stock:
+            created_at, token = state.stock.popleft()
+            age = now - created_at
+            if age < self.ttl_seconds:
+                self.served_age.observe(age)
+                return token
+            self._expired += 1
+        return None
+
+    def _target(self, state: _KeyState) -> int:
+        now = time.monotonic()
+        if now - state.last_demand > self.idle_seconds:
+            return 0
+        rate = state.current_rate(now)
+        avg_generation = self._total_generation / self._generated if self._generated else 1.0
+        wanted = math.ceil(rate * avg_generation) + 1
+        usable = max(1, math.ceil(rate * self.ttl_seconds))
+        return max(1, min(wanted, usable, self.max_stock))
+
+    async def _generate(self, state: _KeyState, raise_errors: bool = False) -> Optional[str]:
+        start = time.monotonic()
+        error = None
+        try:
+            token = await state.generator()
+        except Exception as e:
+            token = None
+            error = e
+        if token is None:
+            self._generation_failures += 1
+            state.failures += 1
+            # Back off refills for this key: 2s, 4s, ... up to a minute
+            state.retry_at = time.monotonic() + min(2 ** state.failures, 60)
+            if error is not None:
+                if raise_errors:
+                    raise error
+                debug_logger.log_error(
+                    error_message=f"Sentinel token prefetch failed: {str(error)}",
+                    status_code=0,
+                    response_text=""
+                )
+            return None
+        self._generated += 1
+        self._total_generation += time.monotonic() - start
+        state.failures = 0
+        return token
+
+    def _schedule_refill(self, key: SentinelKey, state: _KeyState):
+        if time.monotonic() < state.retry_at:
+            return
+        missing = self._target(state) - len(state.stock) - state.refilling
+        for _ in range(max(missing, 0)):
+            state.refilling += 1
+            task = asyncio.create_task(self._refill_one(key, state))
+            self._refill_tasks.add(task)
+            task.add_done_callback(self._refill_tasks.discard)
+
+    async def _refill_one(self, key: SentinelKey, state: _KeyState):
+        try:
+            async with self._refill_semaphore:
+                if time.monotonic() < state.retry_at:
+                    return
+                token = await self._generate(state)
+            if token is not None and self._keys.get(key) is state:
+                state.stock.append((time.monotonic(), token))
+        finally:
+            state.refilling -= 1
+
+    def _ensure_maintenance(self):
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def _maintenance_loop(self):
+        """Drop expired tokens, top up stock that expired, forget idle keys"""
+        while True:
+            try:
+                await asyncio.sleep(max(self.ttl_seconds / 4, 1))
+                now = time.monotonic()
+                for key, state in list(self._keys.items()):
+                    while state.stock and now - state.stock[0][0] >= self.ttl_seconds:
+                        state.stock.popleft()
+                        self._expired += 1
+                    if now - state.last_demand > self.idle_seconds:
+                        self._expired += len(state.stock)
+                        del self._keys[key]
+                    else:
+                        self._schedule_refill(key, state)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Sentinel cache maintenance error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+
+    async def stop(self):
+        """Cancel background refills and drop cached tokens"""
+        tasks = list(self._refill_tasks)
+        if self._maintenance_task:
+            tasks.append(self._maintenance_task)
+            self._maintenance_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._keys.clear()
+
+    def get_stats(self) -> dict:
+        """Get cache metrics"""
+        now = time.monotonic()
+        requests = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / requests, 4) if requests else 0,
+            "expired": self._expired,
+            "generated": self._generated,
+            "generation_failures": self._generation_failures,
+            "avg_generation_ms": round(self._total_generation / self._generated * 1000, 2) if self._generated else 0,
+            "served_age_seconds": self.served_age.to_dict(),
+            "keys": [
+                {
+                    "proxy_url": key[0],
+                    "user_agent": key[1],
+                    "flow": key[2],
+                    "stock": len(state.stock),
+                    "target": self._target(state),
+                    "refilling": state.refilling,
+                    "oldest_age_seconds": round(now - state.stock[0][0], 1) if state.stock else None,
+                    "demand_per_minute": round(state.current_rate(now) * 60, 2),
+                }
+                for key, state in self._keys.items()
+            ],
+        }
@@ -1,7 +1,4 @@
 """Sora API client module"""
-import asyncio
-import base64
-import hashlib
 import json
 import io
 import time
@@ -11,22 +8,19 @@ import re
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, Tuple
 from uuid import uuid4
-from urllib.request import Request, urlopen, build_opener, ProxyHandler
-from urllib.error import HTTPError, URLError
-from curl_cffi.requests import AsyncSession
-from curl_cffi import CurlMime
+from curl_cffi import CurlHttpVersion, CurlMime
 from .proxy_manager import ProxyManager
+from .browser_pool import BrowserPool, DEFAULT_USER_AGENT as BROWSER_USER_AGENT
+from .pow_solver import PowSolver
+from .sentinel_cache import SentinelCache
 from ..core.config import config
 from ..core.logger import debug_logger
-
-try:
-    from playwright.async_api import async_playwright
-    PLAYWRIGHT_AVAILABLE = True
-except ImportError:
-    PLAYWRIGHT_AVAILABLE = False
+from .http_pool import http_pool
+from .rate_limiter import rate_limiter
 
 # PoW related constants
 POW_MAX_ITERATION = 500000
+POW_USER_AGENT = "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Mobile Safari/537.36"
 POW_CORES = [4, 8, 12, 16, 24, 32]
 
 POW_SCREEN_SIZES = [1266, 1536, 1920, 2560, 3000, 3072, 3120, 3840]
@@ -104,6 +98,21 @@ MOBILE_USER_AGENTS = [
     "Sora/1.2026.007 (Android 15; OnePlus 12; build 2600700)",
 ]
 
+
+class UpstreamHTTPError(Exception):
+    """Non-success response from the Sora API
+
+    The message is unchanged from the plain Exception raised before;
+    status_code and response_text let callers classify the failure
+    (see rate_limiter.throttle_kind) without parsing it.
+    """
+
+    def __init__(self, message: str, status_code: int, response_text: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response_text = response_text
+
+
 class SoraClient:
     """Sora API client with proxy support"""
 
@@ -114,6 +123,9 @@ class SoraClient:
         self.proxy_manager = proxy_manager
         self.base_url = config.sora_base_url
         self.timeout = config.sora_timeout
+        self.browser_pool = BrowserPool()
+        self.pow_solver = PowSolver(max_iterations=POW_MAX_ITERATION)
+        self.sentinel_cache = SentinelCache()
 
     @staticmethod
     def _get_pow_parse_time() -> str:
@@ -163,45 +175,20 @@ class SoraClient:
             time.time() * 1000 - perf_time,  # [17] time origin
         ]
 
-    @staticmethod
-    def _solve_pow(seed: str, difficulty: str, config_list: list) -> Tuple[str, bool]:
-        """Execute PoW calculation using SHA3-512 hash collision"""
-        diff_len = len(difficulty) // 2
-        seed_encoded = seed.encode()
-        target_diff = bytes.fromhex(difficulty)
-
-        static_part1 = (json.dumps(config_list[:3], separators=(',', ':'), ensure_ascii=False)[:-1] + ',').encode()
-        static_part2 = (',' + json.dumps(config_list[4:9], separators=(',', ':'), ensure_ascii=False)[1:-1] + ',').encode()
-        static_part3 = (',' + json.dumps(config_list[10:], separators=(',', ':'), ensure_ascii=False)[1:]).encode()
-        initial_j = config_list[9]
-        
-        for i in range(POW_MAX_ITERATION):
-            dynamic_i = str(i).encode()
-
-            dynamic_j = str(initial_j + (i + 29) // 30).encode()
-
-            final_json = static_part1 + dynamic_i + static_part2 + dynamic_j + static_part3
-            b64_encoded = base64.b64encode(final_json)
-
-            hash_value = hashlib.sha3_512(seed_encoded + b64_encoded).digest()
-
-            if hash_value[:diff_len] <= target_diff:
-                return b64_encoded.decode(), True
+    async def _solve_pow(self, seed: str, difficulty: str, config_list: list) -> Tuple[str, bool]:
+        """Execute PoW calculation using SHA3-512 hash collision (off the event loop)"""
+        return await self.pow_solver.solve(seed, difficulty, config_list)
 
-        error_token = "wQ8Lk5FbGpA2NcR9dShT6gYjU7VxZ4D" + base64.b64encode(f'"{seed}"'.encode()).decode()
-        return error_token, False
-
-    @staticmethod
-    def _get_pow_token(user_agent: str) -> str:
+    async def _get_pow_token(self, user_agent: str) -> str:
         """Generate initial PoW token"""
         config_list = SoraClient._get_pow_config(user_agent)
         seed = format(random.random())
         difficulty = "0fffff"
-        solution, _ = SoraClient._solve_pow(seed, difficulty, config_list)
+        solution, _ = await self._solve_pow(seed, difficulty, config_list)
         return "gAAAAAC" + solution
 
-    @staticmethod
-    def _build_sentinel_token(
+    async def _build_sentinel_token(
+        self,
         flow: str,
         req_id: str,
         pow_token: str,
@@ -218,7 +205,7 @@ class SoraClient:
             difficulty = proofofwork.get("difficulty", "")
             if seed and difficulty:
                 config_list = SoraClient._get_pow_config(user_agent)
-                solution, success = SoraClient._solve_pow(seed, difficulty, config_list)
+                solution, success = await self._solve_pow(seed, difficulty, config_list)
                 final_pow_token = "gAAAAAB" + solution
                 if not success:
                     debug_logger.log_info("[Warning] PoW calculation failed, using error token")
@@ -235,127 +222,45 @@ class SoraClient:
         }
         return json.dumps(token_payload, ensure_ascii=False, separators=(",", ":"))
 
-    @staticmethod
-    def _post_json_sync(url: str, headers: dict, payload: dict, timeout: int, proxy: Optional[str]) -> Dict[str, Any]:
-        data = json.dumps(payload).encode("utf-8")
-        req = Request(url, data=data, headers=headers, method="POST")
+    async def _post_json(self, url: str, headers: dict, payload: dict, timeout: int,
+                         proxy: Optional[str], token: str, token_id: Optional[int] = None) -> Dict[str, Any]:
+        """POST JSON on a pooled connection, formatted the way urllib sent it
+
+        /nf/create has always been called without browser impersonation: header
+        names capitalized by urllib.request.Request, ``Accept-Encoding: identity``
+        and no ``Accept`` header, over HTTP/1.1, with the body from json.dumps.
+        The call is rate limited for ``token``.
+        """
+        wire_headers = {"Accept-Encoding": "identity"}
+        wire_headers.update((key.capitalize(), value) for key, value in headers.items())
+        wire_headers["Accept"] = None  # curl adds "Accept: */*" otherwise
 
         try:
-            if proxy:
-                opener = build_opener(ProxyHandler({"http": proxy, "https": proxy}))
-                resp = opener.open(req, timeout=timeout)
-            else:
-                resp = urlopen(req, timeout=timeout)
-
-            resp_text = resp.read().decode("utf-8")
-            if resp.status not in (200, 201):
-                raise Exception(f"Request failed: {resp.status} {resp_text}")
-            return json.loads(resp_text)
-        except HTTPError as exc:
-            body = exc.read().decode("utf-8", errors="ignore")
-            raise Exception(f"HTTP Error: {exc.code} {body}") from exc
-        except URLError as exc:
+            async with http_pool.session(proxy, None) as session:
+                response = await rate_limiter.send(token, token_id, url, lambda: session.post(
+                    url,
+                    headers=wire_headers,
+                    data=json.dumps(payload).encode("utf-8"),
+                    timeout=timeout,
+                    accept_encoding=None,
+                    http_version=CurlHttpVersion.V1_1,
+                ))
+        except Exception as exc:
             raise Exception(f"URL Error: {exc}") from exc
 
+        if response.status_code >= 400:
+            raise UpstreamHTTPError(f"HTTP Error: {response.status_code} {response.text}",
+                                    response.status_code, response.text)
+        if response.status_code not in (200, 201):
+            raise UpstreamHTTPError(f"Request failed: {response.status_code} {response.text}",
+                                    response.status_code, response.text)
+        return response.json()
+
     async def _get_sentinel_token_via_browser(self, proxy_url: Optional[str] = None) -> Optional[str]:
-        if not PLAYWRIGHT_AVAILABLE:
-            debug_logger.log_info("[Warning] Playwright not available, cannot use browser fallback")
-            return None
-        
-        try:
-            async with async_playwright() as p:
-                launch_args = {
-                    "headless": True,
-                    "args": ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
-                }
-                
-                if proxy_url:
-                    launch_args["proxy"] = {"server": proxy_url}
-                
-                browser = await p.chromium.launch(**launch_args)
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
-                )
-                
-                page = await context.new_page()
-                
-                debug_logger.log_info(f"[Browser] Navigating to sora.chatgpt.com...")
-                await page.goto("https://sora.chatgpt.com", wait_until="domcontentloaded", timeout=90000)
-                
-                cookies = await context.cookies()
-                device_id = None
-                for cookie in cookies:
-                    if cookie.get("name") == "oai-did":
-                        device_id = cookie.get("value")
-                        break
-                
-                if not device_id:
-                    device_id = str(uuid4())
-                    debug_logger.log_info(f"[Browser] No oai-did cookie, generated: {device_id}")
-                else:
-                    debug_logger.log_info(f"[Browser] Got oai-did from cookie: {device_id}")
-                
-                debug_logger.log_info(f"[Browser] Waiting for SentinelSDK...")
-                for _ in range(120):
-                    try:
-                        sdk_ready = await page.evaluate("() => typeof window.SentinelSDK !== 'undefined'")
-                        if sdk_ready:
-                            break
-                    except:
-                        pass
-                    await asyncio.sleep(0.5)
-                else:
-                    debug_logger.log_info("[Browser] SentinelSDK load timeout")
-                    await browser.close()
-                    return None
-                
-                debug_logger.log_info(f"[Browser] SentinelSDK ready, getting token...")
-                
-                # 尝试获取 token，最多重试 3 次
-                for attempt in range(3):
-                    debug_logger.log_info(f"[Browser] Getting token, attempt {attempt + 1}/3...")
-                    
-                    try:
-                        token = await page.evaluate(
-                            "(deviceId) => window.SentinelSDK.token('sora_2_create_task__auto', deviceId)",
-                            device_id
-                        )
-                        
-                        if token:
-                            debug_logger.log_info(f"[Browser] Token obtained successfully")
-                            await browser.close()
-                            
-                            if isinstance(token, str):
-                                token_data = json.loads(token)
-                            else:
-                                token_data = token
-                            
-                            if "id" not in token_data or not token_data.get("id"):
-                                token_data["id"] = device_id
-                            
-                            return json.dumps(token_data, ensure_ascii=False, separators=(",", ":"))
-                        else:
-                            debug_logger.log_info(f"[Browser] Token is empty")
-                            
-                    except Exception as e:
-                        debug_logger.log_info(f"[Browser] Token exception: {str(e)}")
-                    
-                    if attempt < 2:
-                        await asyncio.sleep(2)
-                
-                await browser.close()
-                return None
-                
-        except Exception as e:
-            debug_logger.log_error(
-                error_message=f"Browser sentinel token failed: {str(e)}",
-                status_code=0,
-                response_text=str(e),
-                source="Server"
-            )
-            return None
+        """Get a sentinel token from the warm browser pool (None if unavailable or failed)"""
+        return await self.browser_pool.get_token(self.SENTINEL_FLOW, proxy_url)
 
-    async def _nf_create_urllib(self, token: str, payload: dict, sentinel_token: str,
+    async def _nf_create(self, token: str, payload: dict, sentinel_token: str,
                                 proxy_url: Optional[str], token_id: Optional[int] = None,
                                 user_agent: Optional[str] = None) -> Dict[str, Any]:
         url = f"{self.base_url}/nf/create"
@@ -376,10 +281,7 @@ class SoraClient:
         }
 
         try:
-            result = await asyncio.to_thread(
-                self._post_json_sync, url, headers, payload, 30, proxy_url
-            )
-            return result
+            return await self._post_json(url, headers, payload, 30, proxy_url, token, token_id)
         except Exception as e:
             error_str = str(e)
             debug_logger.log_error(
@@ -403,42 +305,35 @@ class SoraClient:
                     headers["OpenAI-Sentinel-Token"] = browser_token
                     headers["OAI-Device-Id"] = browser_device_id
                     
-                    result = await asyncio.to_thread(
-                        self._post_json_sync, url, headers, payload, 30, proxy_url
-                    )
-                    return result
+                    return await self._post_json(url, headers, payload, 30, proxy_url, token, token_id)
             
             raise
 
-    @staticmethod
-    def _post_text_sync(url: str, headers: dict, body: str, timeout: int, proxy: Optional[str]) -> Dict[str, Any]:
-        data = body.encode("utf-8")
-        req = Request(url, data=data, headers=headers, method="POST")
+    async def _get_sentinel_token(self) -> Tuple[str, str]:
+        """Get a prefetched PoW sentinel token, generating one if the cache has none
 
-        try:
-            if proxy:
-                opener = build_opener(ProxyHandler({"http": proxy, "https": proxy}))
-                resp = opener.open(req, timeout=timeout)
-            else:
-                resp = urlopen(req, timeout=timeout)
-
-            resp_text = resp.read().decode("utf-8")
-            if resp.status not in (200, 201):
-                raise Exception(f"Request failed: {resp.status} {resp_text}")
-            return json.loads(resp_text)
-        except HTTPError as exc:
-            body_text = exc.read().decode("utf-8", errors="ignore")
-            raise Exception(f"HTTP Error: {exc.code} {body_text}") from exc
-        except URLError as exc:
-            raise Exception(f"URL Error: {exc}") from exc
+        Returns:
+            (sentinel token, user agent it was generated with)
+        """
+        proxy_url = await self.proxy_manager.get_proxy_url()
+        sentinel_token = await self.sentinel_cache.get(
+            (proxy_url, POW_USER_AGENT, self.SENTINEL_FLOW),
+            lambda: self._request_sentinel_token(POW_USER_AGENT, proxy_url)
+        )
+        return sentinel_token, POW_USER_AGENT
+
+    async def _get_browser_sentinel_token(self, proxy_url: Optional[str] = None) -> Optional[str]:
+        """Get a prefetched browser sentinel token (None if the browser is unavailable or failed)"""
+        return await self.sentinel_cache.get(
+            (proxy_url, BROWSER_USER_AGENT, self.SENTINEL_FLOW),
+            lambda: self._get_sentinel_token_via_browser(proxy_url)
+        )
 
-    async def _generate_sentinel_token(self, token: Optional[str] = None, user_agent: Optional[str] = None) -> Tuple[str, str]:
+    async def _request_sentinel_token(self, user_agent: str, proxy_url: Optional[str]) -> str:
         """Generate openai-sentinel-token by calling /backend-api/sentinel/req and solving PoW"""
         req_id = str(uuid4())
-        if not user_agent:
-            user_agent = "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Mobile Safari/537.36"
 
-        pow_token = self._get_pow_token(user_agent)
+        pow_token = await self._get_pow_token(user_agent)
         
         init_payload = {
             "p": pow_token,
@@ -447,8 +342,6 @@ class SoraClient:
         }
         ua_with_pow = f"{user_agent} {json.dumps(init_payload, separators=(',', ':'))}"
 
-        proxy_url = await self.proxy_manager.get_proxy_url()
-
         # Request sentinel/req endpoint
         url = f"{self.CHATGPT_BASE_URL}/backend-api/sentinel/req"
         request_payload = {
@@ -470,7 +363,7 @@ class SoraClient:
         }
 
         try:
-            async with AsyncSession(impersonate="chrome131") as session:
+            async with http_pool.session(proxy_url, "chrome131") as session:
                 response = await session.post(
                     url,
                     headers=headers,
@@ -493,7 +386,7 @@ class SoraClient:
             raise
 
         # Build final sentinel token
-        sentinel_token = self._build_sentinel_token(
+        sentinel_token = await self._build_sentinel_token(
             self.SENTINEL_FLOW, req_id, pow_token, resp, user_agent
         )
         
@@ -501,7 +394,7 @@ class SoraClient:
         parsed = json.loads(sentinel_token)
         debug_logger.log_info(f"Final sentinel: p_prefix={parsed['p'][:10]}, p_suffix={parsed['p'][-5:]}, t_len={len(parsed['t'])}, c_len={len(parsed['c'])}, flow={parsed['flow']}")
         
-        return sentinel_token, user_agent
+        return sentinel_token
 
     @staticmethod
     def is_storyboard_prompt(prompt: str) -> bool:
@@ -590,14 +483,14 @@ class SoraClient:
 
         # 只在生成请求时添加 sentinel token
         if add_sentinel_token:
-            sentinel_token, ua = await self._generate_sentinel_token(token)
+            sentinel_token, ua = await self._get_sentinel_token()
             headers["openai-sentinel-token"] = sentinel_token
             headers["User-Agent"] = ua
 
         if not multipart:
             headers["Content-Type"] = "application/json"
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             url = f"{self.base_url}{endpoint}"
 
             kwargs = {
@@ -631,9 +524,9 @@ class SoraClient:
 
             # Make request
             if method == "GET":
-                response = await session.get(url, **kwargs)
+                response = await rate_limiter.send(token, token_id, endpoint, lambda: session.get(url, **kwargs))
             elif method == "POST":
-                response = await session.post(url, **kwargs)
+                response = await rate_limiter.send(token, token_id, endpoint, lambda: session.post(url, **kwargs))
             else:
                 raise ValueError(f"Unsupported method: {method}")
 
@@ -678,7 +571,7 @@ class SoraClient:
                             source="Server"
                         )
                         # Raise exception with structured error data
-                        raise Exception(error_msg)
+                        raise UpstreamHTTPError(error_msg, response.status_code, response.text)
 
                 # Generic error handling
                 error_msg = f"API request failed: {response.status_code} - {response.text}"
@@ -688,7 +581,7 @@ class SoraClient:
                     response_text=response.text,
                     source="Server"
                 )
-                raise Exception(error_msg)
+                raise UpstreamHTTPError(error_msg, response.status_code, response.text)
 
             return response_json if response_json else response.json()
     
@@ -798,16 +691,16 @@ class SoraClient:
         if config.pow_proxy_enabled:
             pow_proxy_url = config.pow_proxy_url or None
 
-        sentinel_token = await self._get_sentinel_token_via_browser(pow_proxy_url)
+        sentinel_token = await self._get_browser_sentinel_token(pow_proxy_url)
 
         if not sentinel_token:
             # 如果浏览器方式失败，回退到手动 POW
             debug_logger.log_info("[Warning] Browser sentinel token failed, falling back to manual POW")
-            sentinel_token, user_agent = await self._generate_sentinel_token(token)
+            sentinel_token, user_agent = await self._get_sentinel_token()
         else:
-            user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+            user_agent = BROWSER_USER_AGENT
         
-        result = await self._nf_create_urllib(token, json_data, sentinel_token, proxy_url, token_id, user_agent)
+        result = await self._nf_create(token, json_data, sentinel_token, proxy_url, token_id, user_agent)
         return result["id"]
     
     async def get_image_tasks(self, token: str, limit: int = 20, token_id: Optional[int] = None) -> Dict[str, Any]:
@@ -871,7 +764,7 @@ class SoraClient:
             "Authorization": f"Bearer {token}"
         }
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             url = f"{self.base_url}/project_y/post/{post_id}"
 
             kwargs = {
@@ -897,7 +790,7 @@ class SoraClient:
             start_time = time.time()
 
             # Make DELETE request
-            response = await session.delete(url, **kwargs)
+            response = await rate_limiter.send(token, None, url, lambda: session.delete(url, **kwargs))
 
             # Calculate duration
             duration_ms = (time.time() - start_time) * 1000
@@ -959,7 +852,7 @@ class SoraClient:
             kwargs["proxy"] = proxy_url
 
         try:
-            async with AsyncSession() as session:
+            async with http_pool.session(proxy_url) as session:
                 # Record start time
                 start_time = time.time()
 
@@ -1078,7 +971,7 @@ class SoraClient:
         if proxy_url:
             kwargs["proxy"] = proxy_url
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             response = await session.get(image_url, **kwargs)
             if response.status_code != 200:
                 raise Exception(f"Failed to download image: {response.status_code}")
@@ -1169,7 +1062,7 @@ class SoraClient:
             "Authorization": f"Bearer {token}"
         }
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             url = f"{self.base_url}/project_y/characters/{character_id}"
 
             kwargs = {
@@ -1181,7 +1074,7 @@ class SoraClient:
             if proxy_url:
                 kwargs["proxy"] = proxy_url
 
-            response = await session.delete(url, **kwargs)
+            response = await rate_limiter.send(token, None, url, lambda: session.delete(url, **kwargs))
             if response.status_code not in [200, 204]:
                 raise Exception(f"Failed to delete character: {response.status_code}")
             return True
@@ -1214,10 +1107,10 @@ class SoraClient:
             "style_id": style_id
         }
 
-        # Generate sentinel token and call /nf/create using urllib
+        # Generate sentinel token and call /nf/create
         proxy_url = await self.proxy_manager.get_proxy_url()
-        sentinel_token, user_agent = await self._generate_sentinel_token(token)
-        result = await self._nf_create_urllib(token, json_data, sentinel_token, proxy_url, user_agent=user_agent)
+        sentinel_token, user_agent = await self._get_sentinel_token()
+        result = await self._nf_create(token, json_data, sentinel_token, proxy_url, user_agent=user_agent)
         return result.get("id")
 
     async def generate_storyboard(self, prompt: str, token: str, orientation: str = "landscape",
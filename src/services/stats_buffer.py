@@ -0,0 +1,267 @@
+"""Write-behind buffer for token usage and stats counters"""
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timezone
+from typing import Dict, Optional
+from ..core.config import config
+from ..core.database import Database
+from ..core.logger import debug_logger
+
+
+def _utc_timestamp() -> str:
+    """Timestamp in the same format as SQLite CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+@dataclass
+class TokenStatsDelta:
+    """Pending counter changes for a single token"""
+    token_id: int
+    use_count: int = 0
+    last_used_at: Optional[str] = None
+    image_count: int = 0
+    video_count: int = 0
+    error_count: int = 0
+    last_error_at: Optional[str] = None
+    # today_* counters belong to today_date; a day change mid-batch restarts them
+    today_date: Optional[str] = None
+    today_image_count: int = 0
+    today_video_count: int = 0
+    today_error_count: int = 0
+    # consecutive_error_count = (0 if consecutive_reset else current) + consecutive_delta
+    consecutive_delta: int = 0
+    consecutive_reset: bool = False
+    first_event_at: float = 0.0
+
+    def roll_date(self, today: str):
+        if self.today_date != today:
+            self.today_date = today
+            self.today_image_count = 0
+            self.today_video_count = 0
+            self.today_error_count = 0
+
+
+class TokenStatsBuffer:
+    """Aggregates per-token counter deltas and flushes them in one transaction
+
+    Flushes every ``flush_interval_ms`` or as soon as ``flush_max_events``
+    events are pending, and once more on shutdown. The consecutive error
+    count is also tracked in memory so the auto-ban check in
+    ``TokenManager.record_error`` sees pending errors.
+    """
+
+    def __init__(self, db: Database, flush_interval_ms: Optional[int] = None,
+                 flush_max_events: Optional[int] = None):
+        self.db = db
+        self.flush_interval = (flush_interval_ms or config.stats_flush_interval_ms) / 1000
+        self.flush_max_events = flush_max_events or config.stats_flush_max_events
+        self._pending: Dict[int, TokenStatsDelta] = {}
+        self._pending_events = 0
+        self._consecutive_errors: Dict[int, int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Metrics
+        self._flush_count = 0
+        self._flushed_events = 0
+        self._flush_errors = 0
+        self._last_flush_at: Optional[float] = None
+        self._last_flush_duration = 0.0
+        self._last_flush_lag = 0.0
+        self._max_flush_lag = 0.0
+
+    async def start(self):
+        """Start background flush task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop background flush task and flush everything still pending"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Background task that flushes on interval or when the batch is full"""
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Stats flush loop error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+
+    def _delta(self, token_id: int) -> TokenStatsDelta:
+        delta = self._pending.get(token_id)
+        if delta is None:
+            delta = TokenStatsDelta(token_id=token_id, first_event_at=time.monotonic())
+            self._pending[token_id] = delta
+        return delta
+
+    def _event_added(self):
+        self._pending_events += 1
+        if self._pending_events >= self.flush_max_events:
+            self._wakeup.set()
+
+    # Event recording
+    def record_usage(self, token_id: int, is_video: bool = False):
+        """Record one generation: use_count/last_used_at plus image or video count"""
+        delta = self._delta(token_id)
+        delta.use_count += 1
+        delta.last_used_at = _utc_timestamp()
+        delta.roll_date(str(date.today()))
+        if is_video:
+            delta.video_count += 1
+            delta.today_video_count += 1
+        else:
+            delta.image_count += 1
+            delta.today_image_count += 1
+        self._event_added()
+
+    async def record_error(self, token_id: int, increment_consecutive: bool = True) -> int:
+        """Record one error
+
+        Returns:
+            Consecutive error count including this error
+        """
+        consecutive = await self.get_consecutive_errors(token_id)
+        delta = self._delta(token_id)
+        delta.error_count += 1
+        delta.last_error_at = _utc_timestamp()
+        delta.roll_date(str(date.today()))
+        delta.today_error_count += 1
+        if increment_consecutive:
+            delta.consecutive_delta += 1
+            consecutive += 1
+            self._consecutive_errors[token_id] = consecutive
+        self._event_added()
+        return consecutive
+
+    def reset_consecutive_errors(self, token_id: int):
+        """Reset consecutive error count (keep total error_count)"""
+        delta = self._delta(token_id)
+        delta.consecutive_reset = True
+        delta.consecutive_delta = 0
+        self._consecutive_errors[token_id] = 0
+        self._event_added()
+
+    async def get_consecutive_errors(self, token_id: int) -> int:
+        """Current consecutive error count, including pending changes"""
+        if token_id not in self._consecutive_errors:
+            stats = await self.db.get_token_stats(token_id)
+            # Only updates made through this buffer touch the counter, so
+            # the persisted value plus whatever arrived meanwhile is current
+            self._consecutive_errors.setdefault(
+                token_id, stats.consecutive_error_count if stats else 0
+            )
+        return self._consecutive_errors[token_id]
+
+    def discard(self, token_id: int):
+        """Drop pending changes for a deleted token"""
+        self._pending.pop(token_id, None)
+        self._consecutive_errors.pop(token_id, None)
+
+    # Flushing
+    async def flush(self) -> int:
+        """Write all pending deltas in a single transaction
+
+        Returns:
+            Number of events flushed
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            events, self._pending_events = self._pending_events, 0
+            oldest = min(d.first_event_at for d in batch.values())
+            start = time.monotonic()
+            try:
+                await self.db.apply_token_stats_deltas([asdict(d) for d in batch.values()])
+            except Exception as e:
+                # Put the batch back so nothing is lost; merge with newer events
+                self._requeue(batch, events)
+                self._flush_errors += 1
+                debug_logger.log_error(
+                    error_message=f"Stats flush failed ({events} events requeued): {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+                return 0
+
+            now = time.monotonic()
+            self._flush_count += 1
+            self._flushed_events += events
+            self._last_flush_at = time.time()
+            self._last_flush_duration = now - start
+            self._last_flush_lag = now - oldest
+            self._max_flush_lag = max(self._max_flush_lag, self._last_flush_lag)
+            return events
+
+    def _requeue(self, batch: Dict[int, TokenStatsDelta], events: int):
+        for token_id, old in batch.items():
+            new = self._pending.get(token_id)
+            if new is None:
+                self._pending[token_id] = old
+                continue
+            merged = TokenStatsDelta(
+                token_id=token_id,
+                use_count=old.use_count + new.use_count,
+                last_used_at=new.last_used_at or old.last_used_at,
+                image_count=old.image_count + new.image_count,
+                video_count=old.video_count + new.video_count,
+                error_count=old.error_count + new.error_count,
+                last_error_at=new.last_error_at or old.last_error_at,
+                first_event_at=old.first_event_at,
+            )
+            if new.today_date is None or new.today_date == old.today_date:
+                merged.today_date = old.today_date
+                merged.today_image_count = old.today_image_count + new.today_image_count
+                merged.today_video_count = old.today_video_count + new.today_video_count
+                merged.today_error_count = old.today_error_count + new.today_error_count
+            else:
+                merged.today_date = new.today_date
+                merged.today_image_count = new.today_image_count
+                merged.today_video_count = new.today_video_count
+                merged.today_error_count = new.today_error_count
+            if new.consecutive_reset:
+                merged.consecutive_reset = True
+                merged.consecutive_delta = new.consecutive_delta
+            else:
+                merged.consecutive_reset = old.consecutive_reset
+                merged.consecutive_delta = old.consecutive_delta + new.consecutive_delta
+            self._pending[token_id] = merged
+        self._pending_events += events
+
+    def get_stats(self) -> dict:
+        """Flush metrics"""
+        now = time.monotonic()
+        oldest = min((d.first_event_at for d in self._pending.values()), default=None)
+        return {
+            "pending_tokens": len(self._pending),
+            "pending_events": self._pending_events,
+            "current_lag_ms": round((now - oldest) * 1000, 1) if oldest is not None else 0.0,
+            "flush_count": self._flush_count,
+            "flushed_events": self._flushed_events,
+            "flush_errors": self._flush_errors,
+            "last_flush_at": datetime.fromtimestamp(self._last_flush_at).isoformat() if self._last_flush_at else None,
+            "last_flush_duration_ms": round(self._last_flush_duration * 1000, 2),
+            "last_flush_lag_ms": round(self._last_flush_lag * 1000, 1),
+            "max_flush_lag_ms": round(self._max_flush_lag * 1000, 1),
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "flush_max_events": self.flush_max_events
+        }
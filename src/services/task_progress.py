@@ -0,0 +1,55 @@
+"""Periodic flusher for buffered task progress"""
+import asyncio
+from typing import Optional
+from ..core.config import config
+from ..core.database import Database
+from ..core.logger import debug_logger
+
+
+class TaskProgressFlusher:
+    """Writes coalesced task progress from Database.task_state every interval
+
+    Only the latest progress per task is written, in one batched statement.
+    Terminal states never wait for this loop; they are committed by
+    Database.update_task directly.
+    """
+
+    def __init__(self, db: Database, flush_interval_ms: Optional[int] = None):
+        self.db = db
+        self.flush_interval = (flush_interval_ms or config.task_progress_flush_interval_ms) / 1000
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start background flush task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop background flush task and flush everything still pending"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.db.flush_task_progress()
+
+    async def _flush_loop(self):
+        """Background task that flushes on interval"""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.db.flush_task_progress()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                debug_logger.log_error(
+                    error_message=f"Task progress flush error: {str(e)}",
+                    status_code=0,
+                    response_text=""
+                )
+
+    def get_stats(self) -> dict:
+        """Get flush metrics"""
+        return {"flush_interval_ms": int(self.flush_interval * 1000), **self.db.task_state.get_stats()}
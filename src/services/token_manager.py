@@ -4,13 +4,15 @@ import asyncio
 import random
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from curl_cffi.requests import AsyncSession
 from faker import Faker
 from ..core.database import Database
 from ..core.models import Token, TokenStats
 from ..core.config import config
 from .proxy_manager import ProxyManager
+from .stats_buffer import TokenStatsBuffer
 from ..core.logger import debug_logger
+from .http_pool import http_pool
+from .rate_limiter import rate_limiter
 
 class TokenManager:
     """Token lifecycle manager"""
@@ -19,6 +21,7 @@ class TokenManager:
         self.db = db
         self._lock = asyncio.Lock()
         self.proxy_manager = ProxyManager(db)
+        self.stats_buffer = TokenStatsBuffer(db)
         self.fake = Faker()
     
     async def decode_jwt(self, token: str) -> dict:
@@ -63,7 +66,7 @@ class TokenManager:
         """Get user info from Sora API"""
         proxy_url = await self.proxy_manager.get_proxy_url(token_id, proxy_url)
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Accept": "application/json",
@@ -80,10 +83,8 @@ class TokenManager:
             if proxy_url:
                 kwargs["proxy"] = proxy_url
 
-            response = await session.get(
-                f"{config.sora_base_url}/me",
-                **kwargs
-            )
+            url = f"{config.sora_base_url}/me"
+            response = await rate_limiter.send(access_token, token_id, url, lambda: session.get(url, **kwargs))
 
             if response.status_code != 200:
                 # Check for token_invalidated error
@@ -116,7 +117,7 @@ class TokenManager:
             "Authorization": f"Bearer {token}"
         }
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             url = "https://sora.chatgpt.com/backend/billing/subscriptions"
             print(f"📡 请求 URL: {url}")
             print(f"🔑 使用 Token: {token[:30]}...")
@@ -131,7 +132,7 @@ class TokenManager:
                 kwargs["proxy"] = proxy_url
                 print(f"🌐 使用代理: {proxy_url}")
 
-            response = await session.get(url, **kwargs)
+            response = await rate_limiter.send(token, token_id, url, lambda: session.get(url, **kwargs))
             print(f"📥 响应状态码: {response.status_code}")
 
             if response.status_code == 200:
@@ -178,7 +179,7 @@ class TokenManager:
 
         print(f"🔍 开始获取Sora2邀请码...")
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Accept": "application/json"
@@ -194,10 +195,8 @@ class TokenManager:
                 kwargs["proxy"] = proxy_url
                 print(f"🌐 使用代理: {proxy_url}")
 
-            response = await session.get(
-                "https://sora.chatgpt.com/backend/project_y/invite/mine",
-                **kwargs
-            )
+            url = "https://sora.chatgpt.com/backend/project_y/invite/mine"
+            response = await rate_limiter.send(access_token, token_id, url, lambda: session.get(url, **kwargs))
 
             print(f"📥 响应状态码: {response.status_code}")
 
@@ -230,18 +229,17 @@ class TokenManager:
 
                         # Try to activate Sora2
                         try:
-                            activate_response = await session.get(
-                                "https://sora.chatgpt.com/backend/m/bootstrap",
-                                **kwargs
+                            bootstrap_url = "https://sora.chatgpt.com/backend/m/bootstrap"
+                            activate_response = await rate_limiter.send(
+                                access_token, token_id, bootstrap_url, lambda: session.get(bootstrap_url, **kwargs)
                             )
 
                             if activate_response.status_code == 200:
                                 print(f"✅ Sora2激活请求成功，重新获取邀请码...")
 
                                 # Retry getting invite code
-                                retry_response = await session.get(
-                                    "https://sora.chatgpt.com/backend/project_y/invite/mine",
-                                    **kwargs
+                                retry_response = await rate_limiter.send(
+                                    access_token, token_id, url, lambda: session.get(url, **kwargs)
                                 )
 
                                 if retry_response.status_code == 200:
@@ -286,7 +284,7 @@ class TokenManager:
 
         print(f"🔍 开始获取Sora2剩余次数...")
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Accept": "application/json",
@@ -303,10 +301,8 @@ class TokenManager:
                 kwargs["proxy"] = proxy_url
                 print(f"🌐 使用代理: {proxy_url}")
 
-            response = await session.get(
-                "https://sora.chatgpt.com/backend/nf/check",
-                **kwargs
-            )
+            url = "https://sora.chatgpt.com/backend/nf/check"
+            response = await rate_limiter.send(access_token, token_id, url, lambda: session.get(url, **kwargs))
 
             print(f"📥 响应状态码: {response.status_code}")
 
@@ -344,7 +340,7 @@ class TokenManager:
 
         print(f"🔍 检查用户名是否可用: {username}")
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Content-Type": "application/json"
@@ -361,10 +357,8 @@ class TokenManager:
                 kwargs["proxy"] = proxy_url
                 print(f"🌐 使用代理: {proxy_url}")
 
-            response = await session.post(
-                "https://sora.chatgpt.com/backend/project_y/profile/username/check",
-                **kwargs
-            )
+            url = "https://sora.chatgpt.com/backend/project_y/profile/username/check"
+            response = await rate_limiter.send(access_token, None, url, lambda: session.post(url, **kwargs))
 
             print(f"📥 响应状态码: {response.status_code}")
 
@@ -392,7 +386,7 @@ class TokenManager:
 
         print(f"🔍 开始设置用户名: {username}")
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Content-Type": "application/json"
@@ -409,10 +403,8 @@ class TokenManager:
                 kwargs["proxy"] = proxy_url
                 print(f"🌐 使用代理: {proxy_url}")
 
-            response = await session.post(
-                "https://sora.chatgpt.com/backend/project_y/profile/username/set",
-                **kwargs
-            )
+            url = "https://sora.chatgpt.com/backend/project_y/profile/username/set"
+            response = await rate_limiter.send(access_token, None, url, lambda: session.post(url, **kwargs))
 
             print(f"📥 响应状态码: {response.status_code}")
 
@@ -433,7 +425,7 @@ class TokenManager:
         print(f"🔍 开始激活Sora2邀请码: {invite_code}")
         print(f"🔑 Access Token 前缀: {access_token[:50]}...")
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url, "chrome120") as session:
             # 生成设备ID
             device_id = str(uuid.uuid4())
 
@@ -457,10 +449,8 @@ class TokenManager:
                 kwargs["proxy"] = proxy_url
                 print(f"🌐 使用代理: {proxy_url}")
 
-            response = await session.post(
-                "https://sora.chatgpt.com/backend/project_y/invite/accept",
-                **kwargs
-            )
+            url = "https://sora.chatgpt.com/backend/project_y/invite/accept"
+            response = await rate_limiter.send(access_token, None, url, lambda: session.post(url, **kwargs))
 
             print(f"📥 响应状态码: {response.status_code}")
 
@@ -481,7 +471,7 @@ class TokenManager:
         debug_logger.log_info(f"[ST_TO_AT] 开始转换 Session Token 为 Access Token...")
         proxy_url = await self.proxy_manager.get_proxy_url(proxy_url=proxy_url)
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             headers = {
                 "Cookie": f"__Secure-next-auth.session-token={session_token}",
                 "Accept": "application/json",
@@ -571,7 +561,7 @@ class TokenManager:
         debug_logger.log_info(f"[RT_TO_AT] 使用 Client ID: {effective_client_id[:20]}...")
         proxy_url = await self.proxy_manager.get_proxy_url(proxy_url=proxy_url)
 
-        async with AsyncSession() as session:
+        async with http_pool.session(proxy_url) as session:
             headers = {
                 "Accept": "application/json",
                 "Content-Type": "application/json"
@@ -897,6 +887,7 @@ class TokenManager:
 
     async def delete_token(self, token_id: int):
         """Delete a token"""
+        self.stats_buffer.discard(token_id)
         await self.db.delete_token(token_id)
 
     async def update_token(self, token_id: int,
@@ -937,8 +928,16 @@ class TokenManager:
                 pass  # Ignore test errors during update
 
     async def get_active_tokens(self) -> List[Token]:
-        """Get all active tokens (not cooled down)"""
+        """Get all active tokens (not cooled down), from the in-memory registry once loaded"""
+        if self.db.token_registry.loaded:
+            return self.db.token_registry.get_active()
         return await self.db.get_active_tokens()
+
+    async def get_token(self, token_id: int) -> Optional[Token]:
+        """Get token by ID, from the in-memory registry once loaded"""
+        if self.db.token_registry.loaded:
+            return self.db.token_registry.get(token_id)
+        return await self.db.get_token(token_id)
     
     async def get_all_tokens(self) -> List[Token]:
         """Get all tokens"""
@@ -952,7 +951,7 @@ class TokenManager:
         """Enable a token and reset error count"""
         await self.db.update_token_status(token_id, True)
         # Reset error count when enabling (in token_stats table)
-        await self.db.reset_error_count(token_id)
+        self.stats_buffer.reset_consecutive_errors(token_id)
         # Clear expired flag when enabling
         await self.db.clear_token_expired(token_id)
 
@@ -1054,13 +1053,8 @@ class TokenManager:
             }
 
     async def record_usage(self, token_id: int, is_video: bool = False):
-        """Record token usage"""
-        await self.db.update_token_usage(token_id)
-        
-        if is_video:
-            await self.db.increment_video_count(token_id)
-        else:
-            await self.db.increment_image_count(token_id)
+        """Record token usage (buffered, flushed by stats_buffer)"""
+        self.stats_buffer.record_usage(token_id, is_video=is_video)
     
     async def record_error(self, token_id: int, is_overload: bool = False):
         """Record token error
@@ -1069,19 +1063,18 @@ class TokenManager:
             token_id: Token ID
             is_overload: Whether this is an overload error (heavy_load). If True, only increment total error count.
         """
-        await self.db.increment_error_count(token_id, increment_consecutive=not is_overload)
+        consecutive_errors = await self.stats_buffer.record_error(token_id, increment_consecutive=not is_overload)
 
         # Check if should ban (only if not overload error)
         if not is_overload:
-            stats = await self.db.get_token_stats(token_id)
-            admin_config = await self.db.get_admin_config()
+            admin_config = (await self.db.get_config_snapshot()).admin
 
-            if stats and stats.consecutive_error_count >= admin_config.error_ban_threshold:
+            if consecutive_errors >= admin_config.error_ban_threshold:
                 await self.db.update_token_status(token_id, False)
     
     async def record_success(self, token_id: int, is_video: bool = False):
         """Record successful request (reset error count)"""
-        await self.db.reset_error_count(token_id)
+        self.stats_buffer.reset_consecutive_errors(token_id)
 
         # Update Sora2 remaining count after video generation
         if is_video:
@@ -1110,7 +1103,7 @@ class TokenManager:
     async def refresh_sora2_remaining_if_cooldown_expired(self, token_id: int):
         """Refresh Sora2 remaining count if cooldown has expired"""
         try:
-            token_data = await self.db.get_token(token_id)
+            token_data = await self.get_token(token_id)
             if not token_data or not token_data.sora2_supported:
                 return
 
@@ -0,0 +1,311 @@
+"""Shared per-token polling of upstream task lists"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+from ..core.config import config
+from ..core.logger import debug_logger
+from .poll_schedule import AdaptivePollSchedule, ProgressTracker
+from .poll_scheduler import PollScheduler, TimerHandle, is_throttle_error
+
+# Upstream list sizes; raised when more tasks of one token are in flight
+DRAFTS_LIMIT = 15
+RECENT_TASKS_LIMIT = 20
+
+
+@dataclass
+class PollUpdate:
+    """Result of one poll tick, shared by every waiter of the token
+
+    For video tasks ``pending_tasks`` is the /nf/pending/v2 list and ``drafts``
+    the drafts response, fetched only when the task was no longer pending.
+    For image tasks ``recent_tasks`` is the /v2/recent_tasks response.
+    ``throttled`` means the tick drew a 429/Cloudflare challenge and the
+    token is paused: there is no data, the task should keep waiting.
+    """
+    pending_tasks: List[Dict[str, Any]] = field(default_factory=list)
+    drafts: Optional[Dict[str, Any]] = None
+    recent_tasks: Optional[Dict[str, Any]] = None
+    throttled: bool = False
+
+
+class TaskWatch:
+    """Registration of one task with its token's poller"""
+
+    def __init__(self, poller: "TokenPoller", task_id: str, is_video: bool, model: Optional[str] = None):
+        self.poller = poller
+        self.task_id = task_id
+        self.is_video = is_video
+        self.model = model
+        self.tracker = ProgressTracker(time.monotonic())
+        self.next_due = self.tracker.started_at + poller.owner.schedule.next_interval(model, 0.0)
+        self.polls = 0
+        self.finished = False
+        self._result: Optional[Union[PollUpdate, Exception]] = None
+        self._ready = asyncio.Event()
+
+    def _deliver(self, result: Union[PollUpdate, Exception]):
+        # Only the latest tick matters; a slow consumer skips older ones
+        if not (isinstance(result, PollUpdate) and result.throttled):
+            self.polls += 1
+        self._result = result
+        self._ready.set()
+
+    async def next_update(self, timeout: Optional[float] = None) -> PollUpdate:
+        """Wait for the next poll tick (raises the upstream error if the tick failed)
+
+        Raises:
+            asyncio.TimeoutError: No tick within timeout seconds (e.g. the token stays paused)
+        """
+        if timeout is None:
+            await self._ready.wait()
+        else:
+            await asyncio.wait_for(self._ready.wait(), max(timeout, 0))
+        self._ready.clear()
+        result = self._result
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        self.poller.unregister(self)
+
+
+class TokenPoller:
+    """Polls one token's pending/drafts/recent_tasks once per tick for all its tasks"""
+
+    def __init__(self, owner: "UpstreamPoller", key, token: str, token_id: Optional[int]):
+        self.owner = owner
+        self.key = key
+        self.token = token
+        self.token_id = token_id
+        self.watches: Dict[str, TaskWatch] = {}
+        self.task: Optional[asyncio.Task] = None  # Running tick
+        self.stopped = False
+        self._timer: Optional[TimerHandle] = None
+        # Metrics
+        self.ticks = 0
+        self.upstream_calls: Dict[str, int] = {"pending": 0, "drafts": 0, "recent_tasks": 0}
+
+    def register(self, watch: TaskWatch):
+        self.watches[watch.task_id] = watch
+        self._arm()
+
+    def unregister(self, watch: TaskWatch):
+        if self.watches.get(watch.task_id) is watch:
+            del self.watches[watch.task_id]
+            self.owner._record_done(watch)
+        if not self.watches:
+            self.owner._remove(self)
+
+    def _arm(self):
+        """Schedule the next tick for the earliest-due task (not before a throttle pause ends)"""
+        if self.stopped or self.task is not None or not self.watches:
+            return  # A running tick re-arms when it finishes
+        scheduler = self.owner.scheduler
+        due = max(min(w.next_due for w in self.watches.values()), scheduler.paused_until(self.key))
+        if self._timer is not None and not self._timer.cancelled:
+            if self._timer.when <= due:
+                return
+            scheduler.cancel(self._timer)
+        self._timer = scheduler.call_at(due, lambda: self._fire(due))
+
+    def _fire(self, due: float):
+        self._timer = None
+        if not self.stopped and self.watches:
+            self.task = asyncio.create_task(self._run_tick(due))
+
+    async def _run_tick(self, due: float):
+        try:
+            async with self.owner.scheduler.slot(due):
+                if self.watches:
+                    await self.tick()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.task = None
+            self._arm()
+
+    def cancel(self):
+        self.stopped = True
+        if self._timer is not None:
+            self.owner.scheduler.cancel(self._timer)
+            self._timer = None
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    async def tick(self):
+        """Fetch each upstream list once and hand the results to every waiting task"""
+        self.ticks += 1
+        self.owner.ticks += 1
+        watches = list(self.watches.values())
+        videos = [w for w in watches if w.is_video]
+        images = [w for w in watches if not w.is_video]
+        client = self.owner.sora_client
+
+        if videos:
+            try:
+                pending_tasks = await client.get_pending_tasks(self.token, token_id=self.token_id)
+                self._count("pending")
+                pending_ids = {task.get("id") for task in pending_tasks}
+                finished = [w for w in videos if w.task_id not in pending_ids]
+                drafts = None
+                if finished:
+                    drafts = await client.get_video_drafts(
+                        self.token, limit=max(DRAFTS_LIMIT, len(videos)), token_id=self.token_id
+                    )
+                    self._count("drafts")
+                progress = {task.get("id"): task.get("progress_pct") for task in pending_tasks}
+                done_ids = {item.get("task_id") for item in (drafts or {}).get("items", [])}
+                for watch in videos:
+                    self._observe(watch, progress.get(watch.task_id), watch.task_id in done_ids)
+                    watch._deliver(PollUpdate(
+                        pending_tasks=pending_tasks,
+                        drafts=drafts if watch.task_id not in pending_ids else None
+                    ))
+            except Exception as e:
+                throttled = self._throttled(e)
+                for watch in videos:
+                    watch._deliver(PollUpdate(throttled=True) if throttled else e)
+
+        if images:
+            try:
+                recent_tasks = await client.get_image_tasks(
+                    self.token, limit=max(RECENT_TASKS_LIMIT, len(images)), token_id=self.token_id
+                )
+                self._count("recent_tasks")
+                responses = {task.get("id"): task for task in recent_tasks.get("task_responses", [])}
+                for watch in images:
+                    task = responses.get(watch.task_id) or {}
+                    self._observe(watch, task.get("progress_pct"), task.get("status") in ("succeeded", "failed"))
+                    watch._deliver(PollUpdate(recent_tasks=recent_tasks))
+            except Exception as e:
+                throttled = self._throttled(e)
+                for watch in images:
+                    watch._deliver(PollUpdate(throttled=True) if throttled else e)
+
+        self.owner.deliveries += len(watches)
+        if self.owner.scheduler.paused_until(self.key) <= time.monotonic():
+            self.owner.scheduler.resume(self.key)
+        # Tasks whose tick failed are retried on their normal schedule. Every task due within
+        # one cadence is re-planned from this tick, so staggered tasks share it instead of
+        # each pulling the next tick forward
+        now = time.monotonic()
+        schedule = self.owner.schedule
+        horizon = now + schedule.min_interval
+        for watch in watches:
+            if watch.next_due <= horizon:
+                watch.next_due = now + schedule.next_interval(
+                    watch.model, now - watch.tracker.started_at, watch.tracker
+                )
+
+    def _throttled(self, error: Exception) -> bool:
+        """Pause this token on 429/Cloudflare; its tasks get a throttled update and keep waiting"""
+        if not is_throttle_error(error):
+            return False
+        seconds = self.owner.scheduler.pause(self.key)
+        debug_logger.log_info(f"Upstream throttled token {self.token_id}, pausing its polls for {seconds:.0f}s: {str(error)[:200]}")
+        return True
+
+    def _observe(self, watch: TaskWatch, progress: Optional[float], finished: bool):
+        now = time.monotonic()
+        watch.tracker.observe(progress, now)
+        if finished and not watch.finished:
+            watch.finished = True
+            if watch.model:
+                self.owner.schedule.history.record(watch.model, now - watch.tracker.started_at)
+
+    def _count(self, endpoint: str):
+        self.upstream_calls[endpoint] += 1
+        self.owner.upstream_calls[endpoint] += 1
+
+
+class UpstreamPoller:
+    """One polling actor per token, fanning each tick out to all of its tasks
+
+    Tasks call ``watch`` and then ``next_update`` in place of sleeping and
+    fetching on their own, so a token's upstream status GETs per tick stay
+    constant no matter how many of its jobs are in flight. Each task has its
+    own next-due time from ``schedule``; the token ticks when the earliest
+    one is due and every task receives the result.
+    """
+
+    def __init__(self, sora_client, schedule: Optional[AdaptivePollSchedule] = None,
+                 scheduler: Optional[PollScheduler] = None):
+        self.sora_client = sora_client
+        self.schedule = schedule or AdaptivePollSchedule()
+        self.scheduler = scheduler or PollScheduler()
+        self._pollers: Dict[Any, TokenPoller] = {}
+        # Metrics
+        self.ticks = 0
+        self.deliveries = 0
+        self.upstream_calls: Dict[str, int] = {"pending": 0, "drafts": 0, "recent_tasks": 0}
+        self.completed_jobs = 0
+        self.completed_job_polls = 0
+        self.completed_job_seconds = 0.0
+
+    def watch(self, token: str, token_id: Optional[int], task_id: str, is_video: bool,
+              model: Optional[str] = None) -> TaskWatch:
+        """Start receiving poll updates for task_id (call ``close`` when done)"""
+        key = token_id if token_id is not None else token
+        poller = self._pollers.get(key)
+        if poller is None:
+            poller = self._pollers[key] = TokenPoller(self, key, token, token_id)
+        poller.token = token
+        watch = TaskWatch(poller, task_id, is_video, model)
+        poller.register(watch)
+        return watch
+
+    def _record_done(self, watch: TaskWatch):
+        if watch.finished:
+            self.completed_jobs += 1
+            self.completed_job_polls += watch.polls
+            self.completed_job_seconds += time.monotonic() - watch.tracker.started_at
+
+    def _remove(self, poller: TokenPoller):
+        if self._pollers.get(poller.key) is poller:
+            del self._pollers[poller.key]
+        poller.cancel()
+
+    async def stop(self):
+        """Cancel all polling actors"""
+        pollers = list(self._pollers.values())
+        self._pollers.clear()
+        tasks = [p.task for p in pollers if p.task is not None]
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.scheduler.stop()
+
+    def get_stats(self) -> dict:
+        """Get poller metrics"""
+        calls = sum(self.upstream_calls.values())
+        jobs = self.completed_jobs
+        return {
+            "min_interval_seconds": self.schedule.min_interval,
+            "max_interval_seconds": self.schedule.max_interval,
+            "active_tokens": len(self._pollers),
+            "watched_tasks": sum(len(p.watches) for p in self._pollers.values()),
+            "ticks": self.ticks,
+            "deliveries": self.deliveries,
+            "upstream_calls": dict(self.upstream_calls),
+            "deliveries_per_upstream_call": round(self.deliveries / calls, 2) if calls else 0,
+            "completed_jobs": jobs,
+            # Polls each finished job received, vs. what a fixed poll_interval would have needed
+            "polls_per_completed_job": round(self.completed_job_polls / jobs, 1) if jobs else 0,
+            "fixed_interval_polls_per_completed_job": (
+                round(self.completed_job_seconds / config.poll_interval / jobs, 1) if jobs else 0
+            ),
+            "duration_history": self.schedule.history.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "tokens": [
+                {
+                    "token_id": p.token_id,
+                    "watched_tasks": len(p.watches),
+                    "ticks": p.ticks,
+                    "upstream_calls": dict(p.upstream_calls),
+                    "paused_seconds": round(max(self.scheduler.paused_until(p.key) - time.monotonic(), 0), 1),
+                }
+                for p in self._pollers.values()
+            ],
+        }
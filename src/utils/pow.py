@@ -0,0 +1,92 @@
+"""Proof-of-work search for sentinel tokens
+
+Pure functions with stdlib-only imports so they can run in worker processes
+without loading the application.
+"""
+
+import base64
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+# How often a worker checks whether another worker already found a solution
+CANCEL_CHECK_INTERVAL = 2048
+
+# Shared cancellation flags, one slot per in-flight solve; set by the worker initializer
+_cancel_flags = None
+
+
+def init_worker(cancel_flags):
+    """ProcessPoolExecutor initializer: keep a handle to the shared cancel flags"""
+    global _cancel_flags
+    _cancel_flags = cancel_flags
+
+
+def build_segments(config_list: list) -> Tuple[bytes, bytes, bytes, int]:
+    """Precompute the static JSON around the two dynamic config fields
+
+    The encoded config is ``part1 + str(i) + part2 + str(j) + part3`` where
+    ``i`` is the nonce (index 3) and ``j`` is derived from index 9.
+    """
+    part1 = (json.dumps(config_list[:3], separators=(',', ':'), ensure_ascii=False)[:-1] + ',').encode()
+    part2 = (',' + json.dumps(config_list[4:9], separators=(',', ':'), ensure_ascii=False)[1:-1] + ',').encode()
+    part3 = (',' + json.dumps(config_list[10:], separators=(',', ':'), ensure_ascii=False)[1:]).encode()
+    return part1, part2, part3, config_list[9]
+
+
+def expected_iterations(difficulty: str) -> float:
+    """Average number of hashes needed to meet the difficulty target"""
+    diff_len = len(difficulty) // 2
+    return 256 ** diff_len / (int(difficulty[:diff_len * 2], 16) + 1)
+
+
+def search(seed: str, difficulty: str, segments: Tuple[bytes, bytes, bytes, int],
+           start: int, stop: int, step: int = 1, slot: Optional[int] = None) -> Tuple[Optional[int], Optional[str], int]:
+    """Search nonces start, start + step, ... below stop
+
+    The hash state of ``seed`` plus the base64 of the longest 3-byte-aligned
+    prefix of the first static segment is computed once and copied for every
+    nonce, so each iteration only encodes and hashes the varying tail.
+
+    Returns:
+        (nonce, base64 solution, iterations) - nonce and solution are None if
+        nothing was found or the search was cancelled through ``slot``
+    """
+    part1, part2, part3, initial_j = segments
+    diff_len = len(difficulty) // 2
+    target = bytes.fromhex(difficulty)
+
+    aligned = len(part1) - len(part1) % 3
+    prefix_b64 = base64.b64encode(part1[:aligned])
+    tail1 = part1[aligned:]
+    base_hash = hashlib.sha3_512(seed.encode() + prefix_b64)
+
+    flags = _cancel_flags if slot is not None else None
+    b64encode = base64.b64encode
+    iterations = 0
+    for i in range(start, stop, step):
+        iterations += 1
+        if flags is not None and iterations % CANCEL_CHECK_INTERVAL == 1 and flags[slot]:
+            return None, None, iterations
+
+        tail_b64 = b64encode(tail1 + str(i).encode() + part2 + str(initial_j + (i + 29) // 30).encode() + part3)
+        h = base_hash.copy()
+        h.update(tail_b64)
+        if h.digest()[:diff_len] <= target:
+            return i, (prefix_b64 + tail_b64).decode(), iterations
+
+    return None, None, iterations
+
+
+def error_token(seed: str) -> str:
+    """Token sent when no solution was found"""
+    return "wQ8Lk5FbGpA2NcR9dShT6gYjU7VxZ4D" + base64.b64encode(f'"{seed}"'.encode()).decode()
+
+
+def partition(max_iterations: int, workers: int) -> List[Tuple[int, int, int]]:
+    """Interleave the nonce space across workers: (start, stop, step) per worker
+
+    Interleaving keeps every worker on low nonces, so a solution is found in
+    roughly 1/workers of the sequential time.
+    """
+    return [(k, max_iterations, workers) for k in range(workers)]
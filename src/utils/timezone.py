@@ -93,3 +93,21 @@ def format_local_time(dt: Optional[datetime], fmt: str = "%Y-%m-%d %H:%M:%S") ->
     except Exception as e:
         print(f"Warning: Failed to format datetime: {e}")
         return str(dt)
+
+
+def convert_to_utc_timestamp(dt: Optional[datetime]) -> Optional[str]:
+    """Convert datetime to the UTC timestamp string format SQLite stores
+
+    Args:
+        dt: Datetime object (naive values are treated as UTC)
+
+    Returns:
+        str: UTC timestamp string (e.g., "2024-01-24 10:30:45")
+        None: If dt is None
+    """
+    if dt is None:
+        return None
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")